@@ -0,0 +1,167 @@
+import init
+import heapq
+import itertools
+import numpy as np
+import constants as cn
+from basket_feature_cube import (FEATURES, UNDER_2, BETWEEN_2_AND_10, VERT_HORI_SUM,
+    VERT_HORI_COUNT, DISTANCE_SUM, DISTANCE_COUNT, CITYCENTER_SUM, CITYCENTER_COUNT)
+
+# Numerator and denominator sums of each feature
+FEATURE_SUMS = {FEATURES[0]: (UNDER_2, BETWEEN_2_AND_10),
+                FEATURES[1]: (VERT_HORI_SUM, VERT_HORI_COUNT),
+                FEATURES[2]: (DISTANCE_SUM, DISTANCE_COUNT),
+                FEATURES[3]: (CITYCENTER_SUM, CITYCENTER_COUNT)}
+
+# Classes left when the remaining combinations are evaluated in one batch
+LEAF_CLASSES = 3
+
+
+class BasketBranchAndBound(object):
+    """
+    Finds the basket combinations with the lowest MSE of one feature without
+    scoring every combination.
+
+    Counts are assigned class by class. The sums of the cube are cumulative
+    over rank, so they only grow with the count of a class: for a partial
+    assignment, every feature of a blockgroup lies between its value with the
+    smallest remaining counts in the numerator and the largest in the
+    denominator, and the reverse. The squared error of each blockgroup is at
+    least its distance to that interval, which bounds the best MSE of the whole
+    subtree. Subtrees whose bound is worse than the current N-th best are
+    skipped. The last classes are scored in one vectorized batch.
+
+    Ties are broken by the order of the combinations in cn.BASKET_COMBOS, so
+    the results are those of the exhaustive sweep in calculate_mse.
+    """
+    def __init__(self, cube, psrc_output, feature=cn.AVG_DIST,
+                 count_ranges=cn.BASKET_COUNT_RANGES, basket_size=cn.BASKET_SIZE):
+        """
+        Inputs:
+            cube (BasketFeatureCube)
+            psrc_output (dataframe), PSRC data with the four features
+            feature (optional), feature whose MSE is minimized, one of FEATURES
+            count_ranges (optional), counts of each class, in
+                cn.BASKET_CATEGORIES order
+            basket_size (optional), total count of a basket
+        """
+        self.cube = cube
+        self.psrc_arrays = cube.psrc_arrays(psrc_output)
+        self.feature = FEATURES.index(feature)
+        self.numerator, self.denominator = FEATURE_SUMS[feature]
+        self.target = self.psrc_arrays[0][:, self.feature]
+        self.in_psrc = self.psrc_arrays[1]
+        self.ranges = [sorted(counts) for counts in count_ranges]
+        self.basket_size = basket_size
+        self.evaluations = 0
+
+        n_classes = len(self.ranges)
+        low = [cube.cube[c][counts[0]] for c, counts in enumerate(self.ranges)]
+        high = [cube.cube[c][counts[-1]] for c, counts in enumerate(self.ranges)]
+        zeros = np.zeros_like(cube.base)
+        # Sums of the classes from j on, with their smallest and largest counts
+        self.suffix_low = list(itertools.accumulate(low[::-1], initial=zeros))[::-1]
+        self.suffix_high = list(itertools.accumulate(high[::-1], initial=zeros))[::-1]
+        self.suffix_min_count = np.cumsum([counts[0] for counts in self.ranges][::-1])[::-1].tolist() + [0]
+        self.suffix_max_count = np.cumsum([counts[-1] for counts in self.ranges][::-1])[::-1].tolist() + [0]
+        self.n_classes = n_classes
+
+
+    def search(self, top_n=1):
+        """
+        Input: top_n (optional), number of combinations to return
+        Outputs: combinations (array, top_n x classes) and their MSEs, best
+                 first
+        """
+        self.evaluations = 0
+        # Max-heap of the best combinations found so far, the worst on top
+        self._best = []
+        self._top_n = top_n
+        self._branch([], self.cube.base, 0)
+        best = sorted((-mse, tuple(-count for count in combination))
+                      for mse, combination in self._best)
+        combinations = np.array([combination for _, combination in best], dtype=np.int64)
+        return combinations.reshape(-1, self.n_classes), np.array([mse for mse, _ in best])
+
+
+    def _branch(self, counts, partial, j):
+        """
+        Inputs: counts of the classes before j, their summed cube entries
+                (blockgroups x sums), class j to assign
+        """
+        remaining = self.basket_size - sum(counts)
+        if self.n_classes - j <= LEAF_CLASSES:
+            self._evaluate(counts, remaining, j)
+            return
+        children = []
+        for count in self.ranges[j]:
+            left = remaining - count
+            if not self.suffix_min_count[j + 1] <= left <= self.suffix_max_count[j + 1]:
+                continue
+            child = partial + self.cube.cube[j][count]
+            children.append((self._bound(child, j + 1), count, child))
+        # Visit the most promising subtrees first, to tighten the threshold
+        for bound, count, child in sorted(children, key=lambda item: (item[0], item[1])):
+            if bound > self._threshold():
+                continue
+            self._branch(counts + [count], child, j + 1)
+
+
+    def _evaluate(self, counts, remaining, j):
+        """
+        Score every completion of the counts in one batch.
+        """
+        completions = [completion for completion in itertools.product(*self.ranges[j:])
+                       if sum(completion) == remaining]
+        if not completions:
+            return
+        combinations = np.array([counts + list(completion) for completion in completions])
+        mses = self.cube.calculate_mse(None, combinations, psrc_arrays=self.psrc_arrays)
+        self.evaluations += len(combinations)
+        for combination, mse in zip(combinations, mses[:, self.feature]):
+            # The exhaustive sweep never picks combinations without an MSE
+            if np.isnan(mse):
+                continue
+            item = (-mse, tuple(-combination))
+            if len(self._best) < self._top_n:
+                heapq.heappush(self._best, item)
+            elif item > self._best[0]:
+                heapq.heapreplace(self._best, item)
+
+
+    def _threshold(self):
+        """
+        Output: MSE of the N-th best combination so far, with a margin for
+                rounding so that ties are never pruned
+        """
+        if len(self._best) < self._top_n:
+            return np.inf
+        worst = -self._best[0][0]
+        return worst + 1e-9 * abs(worst)
+
+
+    def _bound(self, partial, j):
+        """
+        Inputs: summed cube entries of the assigned classes, first unassigned
+                class
+        Output: lower bound of the MSE of every completion
+        """
+        low = partial + self.suffix_low[j]
+        high = partial + self.suffix_high[j]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lowest = low[:, self.numerator] / high[:, self.denominator]
+            highest = high[:, self.numerator] / low[:, self.denominator]
+        lowest = np.where(np.isnan(lowest), 0, lowest)
+        highest = np.where(np.isnan(highest), np.inf, highest)
+        error = np.where(self.target < lowest, (lowest - self.target)**2,
+                         np.where(self.target > highest, (self.target - highest)**2, 0))
+        error = np.where(np.isnan(error), 0, error)
+        # Blockgroups always in the MSE, and those that might be. The lowest
+        # mean adds the uncertain blockgroups with the smallest errors, as long
+        # as they lower the mean.
+        certain = (low[:, BETWEEN_2_AND_10] > 0) & self.in_psrc
+        uncertain = (high[:, BETWEEN_2_AND_10] > 0) & self.in_psrc & ~certain
+        totals = error[certain].sum() + np.concatenate([[0], np.cumsum(np.sort(error[uncertain]))])
+        counts = certain.sum() + np.arange(len(totals))
+        if counts[-1] == 0:
+            return np.inf
+        return (totals[counts > 0] / counts[counts > 0]).min()
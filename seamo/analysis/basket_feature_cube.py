@@ -0,0 +1,222 @@
+import init
+import numpy as np
+import pandas as pd
+import constants as cn
+from haversine import haversine
+
+# Sums kept in the cube, for each blockgroup
+UNDER_2 = 0
+BETWEEN_2_AND_10 = 1
+VERT_HORI_SUM = 2
+VERT_HORI_COUNT = 3
+DISTANCE_SUM = 4
+DISTANCE_COUNT = 5
+CITYCENTER_SUM = 6
+CITYCENTER_COUNT = 7
+N_SUMS = 8
+
+DISTANCE_FROM_CITYCENTER = 'distance_from_citycenter_test'
+FEATURES = [cn.PROX_RATIO, cn.VERT_HORI_RATIO, cn.AVG_DIST, DISTANCE_FROM_CITYCENTER]
+
+
+def row_features(df):
+    """
+    Input: trip-level data with distance, orig_lat, orig_lon, dest_lat and
+           dest_lon columns
+    Output: dict of arrays, one value per row: dist_under_2 and dist_2_to_10
+            flags, vertical/horizontal ratio, distance and distance of the
+            destination from the city center
+    """
+    distance = df[cn.DISTANCE].values.astype(float)
+    dest_lat = df['dest_lat'].values.astype(float)
+    dest_lon = df['dest_lon'].values.astype(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vert_hori = np.abs((dest_lat - df['orig_lat'].values.astype(float)) /
+                           (dest_lon - df['orig_lon'].values.astype(float)))
+    return {'dist_under_2': (distance < cn.BASKET_EVAL_PROX_MIN).astype(int),
+            'dist_2_to_10': ((distance >= cn.BASKET_EVAL_PROX_MIN) &
+                             (distance < cn.BASKET_EVAL_PROX_MAX)).astype(int),
+            cn.VERT_HORI_RATIO: vert_hori,
+            cn.DISTANCE: distance,
+            DISTANCE_FROM_CITYCENTER: haversine(cn.CITY_CENTER[0], cn.CITY_CENTER[1],
+                                                dest_lat, dest_lon)}
+
+
+class BasketFeatureCube(object):
+    """
+    Precomputed sums for evaluating every basket combination of
+    market_basket_evaluator.
+
+    A basket combination keeps, for each class of cn.BASKET_CATEGORIES, the
+    destinations ranked up to the count of that class. The sums behind the
+    four features (proximity ratio, vertical/horizontal ratio, average distance
+    and distance from the city center) are stored as cumulative sums over rank
+    for every (blockgroup, class), so the features of any combination are a
+    gather of one entry per class followed by a sum, with no filtering or
+    groupby. Combinations are evaluated in vectorized chunks.
+
+    To evaluate combinations, call:
+    - features(combinations) for the features of each blockgroup
+    - calculate_mse(psrc_output, combinations) for the MSEs against PSRC
+    """
+    def __init__(self, google_input=None, max_counts=None):
+        """
+        Inputs:
+            google_input (dataframe), Google API data with origin, class, rank,
+                distance, orig_lat, orig_lon, dest_lat and dest_lon columns
+            max_counts (list, optional), largest count of each class in
+                cn.BASKET_CATEGORIES order, defaults to cn.BASKET_COUNT_RANGES
+        Without google_input the cube is left empty, for from_arrays.
+        """
+        if google_input is None:
+            return
+        if max_counts is None:
+            max_counts = [max(counts) for counts in cn.BASKET_COUNT_RANGES]
+        self.max_counts = np.asarray(max_counts, dtype=np.int64)
+        n_classes = len(cn.BASKET_CATEGORIES)
+        k = int(self.max_counts.max())
+
+        origin, self.origins = pd.factorize(google_input[cn.ORIGIN], sort=True)
+        self.origins = np.asarray(self.origins, dtype=object)
+        n_origins = len(self.origins)
+        sums = self._row_sums(google_input)
+
+        class_codes = pd.Index(cn.BASKET_CATEGORIES).get_indexer(google_input[cn.CLASS].values)
+        rank = google_input[cn.RANK].values.astype(float)
+        # Rows of other classes are in every basket
+        other = class_codes < 0
+        self.base = np.zeros((n_origins, N_SUMS))
+        np.add.at(self.base, origin[other], sums[other])
+        # Rows of the basket classes, by rank. Tied ranks can be fractional,
+        # a row is in a basket once the count reaches its rank rounded up.
+        # Ranks past k (or missing) are never in a basket.
+        ranked = ~other & (rank <= k)
+        slot = np.clip(np.ceil(rank[ranked]), 0, k).astype(np.int64)
+        cube = np.zeros((n_origins, n_classes, k + 1, N_SUMS))
+        np.add.at(cube, (origin[ranked], class_codes[ranked], slot), sums[ranked])
+        # cube[c, r, b] holds the sums of the rows ranked r or better, laid out
+        # so a gather over combinations copies whole blockgroup blocks
+        self.cube = np.ascontiguousarray(np.cumsum(cube, axis=2).transpose(1, 2, 0, 3))
+
+
+    @classmethod
+    def from_arrays(cls, origins, base, cube, max_counts):
+        """
+        Build a cube from the arrays of another one (origins, base, cube,
+        max_counts), without copying them. Used by worker processes to wrap
+        arrays in shared memory.
+        """
+        feature_cube = cls()
+        feature_cube.origins = origins
+        feature_cube.base = base
+        feature_cube.cube = cube
+        feature_cube.max_counts = max_counts
+        return feature_cube
+
+
+    def _row_sums(self, google_input):
+        """
+        Input: Google API data
+        Output: array of the sums contributed by each row
+        """
+        features = row_features(google_input)
+        sums = np.zeros((len(google_input), N_SUMS))
+        sums[:, UNDER_2] = features['dist_under_2']
+        sums[:, BETWEEN_2_AND_10] = features['dist_2_to_10']
+        # Means skip missing values, as pandas does
+        for total, count, values in [
+                (VERT_HORI_SUM, VERT_HORI_COUNT, features[cn.VERT_HORI_RATIO]),
+                (DISTANCE_SUM, DISTANCE_COUNT, features[cn.DISTANCE]),
+                (CITYCENTER_SUM, CITYCENTER_COUNT, features[DISTANCE_FROM_CITYCENTER])]:
+            present = ~np.isnan(values)
+            sums[:, total] = np.where(present, values, 0)
+            sums[:, count] = present
+        return sums
+
+
+    def sums(self, combinations):
+        """
+        Input: combinations (array, combinations x classes) of counts
+        Output: array of sums, blockgroups x combinations x sums
+        """
+        combinations = np.atleast_2d(np.asarray(combinations, dtype=np.int64))
+        if (combinations > self.max_counts).any():
+            raise ValueError('Basket counts exceed the counts the cube was '
+                             'built for {0}'.format(list(self.max_counts)))
+        total = np.repeat(self.base[np.newaxis, :, :], len(combinations), axis=0)
+        for c in range(len(cn.BASKET_CATEGORIES)):
+            total += self.cube[c][combinations[:, c]]
+        return total.transpose(1, 0, 2)
+
+
+    def features(self, combinations, sums=None):
+        """
+        Input: combinations (array, combinations x classes) of counts
+        Output: dict of feature arrays (blockgroups x combinations), keyed by
+                the feature columns of market_basket_evaluator. Blockgroups
+                without destinations between 2 and 10 miles are NaN, as they
+                are dropped from the proximity ratio.
+        """
+        if sums is None:
+            sums = self.sums(combinations)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            valid = sums[..., BETWEEN_2_AND_10] > 0
+            features = {
+                cn.PROX_RATIO: sums[..., UNDER_2] / sums[..., BETWEEN_2_AND_10],
+                cn.VERT_HORI_RATIO: sums[..., VERT_HORI_SUM] / sums[..., VERT_HORI_COUNT],
+                cn.AVG_DIST: sums[..., DISTANCE_SUM] / sums[..., DISTANCE_COUNT],
+                DISTANCE_FROM_CITYCENTER: sums[..., CITYCENTER_SUM] / sums[..., CITYCENTER_COUNT]}
+        for feature in FEATURES:
+            features[feature] = np.where(valid, features[feature], np.nan)
+        return features
+
+
+    def feature_df(self, basket_combination):
+        """
+        Input: basket_combination (list)
+        Output: dataframe in the format of market_basket_evaluator.calculate_features
+        """
+        features = self.features([basket_combination])
+        df = pd.DataFrame({cn.ORIGIN: self.origins})
+        for feature in FEATURES:
+            df[feature] = features[feature][:, 0]
+        return df[~np.isnan(df[cn.PROX_RATIO])].reset_index(drop=True)
+
+
+    def psrc_arrays(self, psrc_output):
+        """
+        Input: psrc_output (dataframe), PSRC data with the four features
+        Outputs: PSRC features aligned to the cube blockgroups (blockgroups x
+                 features) and mask of the blockgroups in the PSRC data
+        """
+        psrc = psrc_output.drop_duplicates(cn.ORIGIN).set_index(cn.ORIGIN).reindex(self.origins)
+        in_psrc = np.isin(self.origins, psrc_output[cn.ORIGIN].values)
+        return psrc[FEATURES].values.astype(float), in_psrc
+
+
+    def calculate_mse(self, psrc_output, combinations, chunk_size=cn.BASKET_CUBE_CHUNK_SIZE,
+                      psrc_arrays=None):
+        """
+        Inputs: psrc_output (dataframe), PSRC data with the four features
+                combinations (array, combinations x classes) of counts
+                chunk_size (optional), number of combinations evaluated at once
+                psrc_arrays (optional), output of psrc_arrays, used instead of
+                    psrc_output when given
+        Output: array of MSEs (combinations x features), in FEATURES order.
+                Each MSE is over the blockgroups that have the feature for the
+                combination and are in the PSRC data.
+        """
+        combinations = np.atleast_2d(np.asarray(combinations, dtype=np.int64))
+        if psrc_arrays is None:
+            psrc_arrays = self.psrc_arrays(psrc_output)
+        psrc, in_psrc = psrc_arrays
+        mses = np.empty((len(combinations), len(FEATURES)))
+        for start in range(0, len(combinations), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            features = self.features(combinations[chunk])
+            valid = ~np.isnan(features[cn.PROX_RATIO]) & in_psrc[:, np.newaxis]
+            n_valid = valid.sum(axis=0)
+            for i, feature in enumerate(FEATURES):
+                error = (features[feature] - psrc[:, i][:, np.newaxis])**2
+                mses[chunk, i] = np.where(valid, error, 0).sum(axis=0) / n_valid
+        return mses
@@ -0,0 +1,186 @@
+import init
+import os
+import time
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import constants as cn
+from basket_feature_cube import BasketFeatureCube, FEATURES
+
+# Arrays of the cube and the PSRC features, shared with the workers
+SHARED_ARRAYS = ['base', 'cube', 'max_counts', 'psrc', 'in_psrc']
+
+# State of a worker process, set by _init_worker
+_worker = {}
+
+
+class BasketSearchRunner(object):
+    """
+    Runs the basket combination search of market_basket_evaluator across a
+    process pool.
+
+    The combinations are split in shards. The read-only arrays of the
+    BasketFeatureCube and the PSRC features are placed once in shared memory,
+    so the workers attach to them instead of receiving a copy each. The MSEs
+    of every finished shard are saved to the checkpoint directory, and a run
+    over the same combinations resumes from the shards already on disk.
+    Throughput is reported as shards finish.
+
+    To run the search, call:
+    - run() for the MSEs of every combination (combinations x features)
+    """
+    def __init__(self, cube, psrc_output, combinations, checkpoint_dir=None,
+                 n_workers=None, shard_size=cn.BASKET_SHARD_SIZE, report=print):
+        """
+        Inputs:
+            cube (BasketFeatureCube)
+            psrc_output (dataframe), PSRC data with the four features
+            combinations (array, combinations x classes) of counts
+            checkpoint_dir (optional), directory of the shard results, no
+                checkpoints when None
+            n_workers (optional), processes in the pool, defaults to the
+                number of CPUs. 1 runs in this process.
+            shard_size (optional), combinations per shard
+            report (optional), function called with the progress messages
+        """
+        self.cube = cube
+        self.psrc_arrays = cube.psrc_arrays(psrc_output)
+        self.combinations = np.atleast_2d(np.asarray(combinations, dtype=np.int64))
+        self.checkpoint_dir = checkpoint_dir
+        self.n_workers = n_workers or multiprocessing.cpu_count()
+        self.shard_size = shard_size
+        self.report = report
+        self.n_shards = -(-len(self.combinations) // shard_size)
+
+
+    def run(self):
+        """
+        Output: array of MSEs (combinations x features), in FEATURES order
+        """
+        mses = np.empty((len(self.combinations), len(FEATURES)))
+        pending = []
+        for shard in range(self.n_shards):
+            saved = self._load_shard(shard)
+            if saved is None:
+                pending.append(shard)
+            else:
+                mses[self._shard_slice(shard)] = saved
+        if len(pending) < self.n_shards:
+            self.report('Resuming: {0} of {1} shards already done'.format(
+                self.n_shards - len(pending), self.n_shards))
+
+        start = time.time()
+        finished = self.n_shards - len(pending)
+        done = 0
+        for shard, shard_mses in self._evaluate(pending):
+            mses[self._shard_slice(shard)] = shard_mses
+            self._save_shard(shard, shard_mses)
+            finished += 1
+            done += len(shard_mses)
+            elapsed = time.time() - start
+            self.report('{0} of {1} shards done, {2:.0f} combinations/s'.format(
+                finished, self.n_shards, done / elapsed if elapsed > 0 else float('inf')))
+        return mses
+
+
+    def _evaluate(self, shards):
+        """
+        Input: list of shards to evaluate
+        Output: generator of (shard, MSEs), in order of completion
+        """
+        if self.n_workers == 1 or len(shards) <= 1:
+            for shard in shards:
+                yield shard, self.cube.calculate_mse(None, self.combinations[
+                    self._shard_slice(shard)], psrc_arrays=self.psrc_arrays)
+            return
+
+        arrays = {'base': self.cube.base, 'cube': self.cube.cube,
+                  'max_counts': self.cube.max_counts, 'psrc': self.psrc_arrays[0],
+                  'in_psrc': self.psrc_arrays[1]}
+        blocks = {}
+        try:
+            specs = {}
+            for name in SHARED_ARRAYS:
+                array = np.ascontiguousarray(arrays[name])
+                blocks[name] = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+                np.ndarray(array.shape, array.dtype, buffer=blocks[name].buf)[...] = array
+                specs[name] = (blocks[name].name, array.shape, array.dtype.str)
+            tasks = [(shard, self.combinations[self._shard_slice(shard)]) for shard in shards]
+            with multiprocessing.Pool(min(self.n_workers, len(shards)), _init_worker,
+                                      (specs, self.cube.origins)) as pool:
+                for result in pool.imap_unordered(_evaluate_shard, tasks):
+                    yield result
+        finally:
+            for block in blocks.values():
+                block.close()
+                block.unlink()
+
+
+    def _shard_slice(self, shard):
+        return slice(shard * self.shard_size, (shard + 1) * self.shard_size)
+
+
+    def _shard_path(self, shard):
+        return os.path.join(self.checkpoint_dir, 'shard_{0:05d}.npy'.format(shard))
+
+
+    def _load_shard(self, shard):
+        """
+        Input: shard number
+        Output: saved MSEs of the shard, None if it was not checkpointed
+        """
+        if self.checkpoint_dir is None:
+            return None
+        if shard == 0:
+            self._check_combinations()
+        path = self._shard_path(shard)
+        if not os.path.exists(path):
+            return None
+        return np.load(path)
+
+
+    def _save_shard(self, shard, mses):
+        if self.checkpoint_dir is None:
+            return
+        path = self._shard_path(shard)
+        # Write then rename, so an interrupted write never leaves a shard
+        with open(path + '.tmp', 'wb') as shard_file:
+            np.save(shard_file, mses)
+        os.replace(path + '.tmp', path)
+
+
+    def _check_combinations(self):
+        """
+        Checkpoints are only valid for the same combinations and shard size.
+        Saves them on the first run and raises ValueError on a mismatch.
+        """
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        path = os.path.join(self.checkpoint_dir, 'combinations.npz')
+        if os.path.exists(path):
+            saved = np.load(path)
+            if saved['shard_size'] != self.shard_size or \
+                    not np.array_equal(saved['combinations'], self.combinations):
+                raise ValueError('Checkpoint directory {0} holds a different '
+                                 'search'.format(self.checkpoint_dir))
+        else:
+            np.savez(path, combinations=self.combinations, shard_size=self.shard_size)
+
+
+def _init_worker(specs, origins):
+    """
+    Attach a worker process to the shared arrays.
+    """
+    arrays = {}
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _worker.setdefault('blocks', []).append(block)
+        arrays[name] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+    _worker['cube'] = BasketFeatureCube.from_arrays(origins, arrays['base'],
+                                                    arrays['cube'], arrays['max_counts'])
+    _worker['psrc_arrays'] = (arrays['psrc'], arrays['in_psrc'])
+
+
+def _evaluate_shard(task):
+    shard, combinations = task
+    return shard, _worker['cube'].calculate_mse(None, combinations,
+                                                psrc_arrays=_worker['psrc_arrays'])
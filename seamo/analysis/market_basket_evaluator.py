@@ -1,12 +1,17 @@
+import itertools
+import os
 import numpy as np
 import pandas as pd
 import shapely.wkt
 from sklearn.metrics import pairwise_distances
-from sklearn.metrics import mean_squared_error
 
 import init
 import constants as cn
-from coordinate import Coordinate
+import data_accessor as daq
+from haversine import haversine
+from basket_feature_cube import BasketFeatureCube, row_features, DISTANCE_FROM_CITYCENTER
+from basket_search_runner import BasketSearchRunner
+from basket_branch_and_bound import BasketBranchAndBound
 
 def proximity_ratio(df_destinations):
     """
@@ -68,11 +73,10 @@ def average_distance(df_destinations, df_blockgroup):
 
 def dist_from_cc(df):
     """
-    Helper function to create a new column in a DataFrame with dist to city center
+    Helper function to create a new column in a DataFrame with dist to city center.
+    Works on a whole DataFrame at once as well as on a single row.
     """
-    coordinate = Coordinate(df['dest_lat'], df['dest_lon'])
-    city_center = Coordinate(cn.CITY_CENTER[0], cn.CITY_CENTER[1])
-    return city_center.haversine_distance(coordinate) 
+    return haversine(cn.CITY_CENTER[0], cn.CITY_CENTER[1], df['dest_lat'], df['dest_lon'])
 
 def distance_from_citycenter(df_destinations, df_blockgroup):
     """
@@ -83,7 +87,7 @@ def distance_from_citycenter(df_destinations, df_blockgroup):
         df_blockgroup - data frame with origin blockgroup and proximity ratio
     """
     
-    df_destinations['distance_from_citycenter_val'] = df_destinations.apply(dist_from_cc, axis=1) 
+    df_destinations['distance_from_citycenter_val'] = dist_from_cc(df_destinations)
     
     df_blockgroup2 = df_destinations.groupby([cn.ORIGIN], as_index=False)['distance_from_citycenter_val'].mean()
     result_merged = pd.merge(left=df_blockgroup, right=df_blockgroup2, how='inner', left_on=cn.ORIGIN, right_on=cn.ORIGIN)
@@ -92,6 +96,65 @@ def distance_from_citycenter(df_destinations, df_blockgroup):
     return result_merged
 
 
+def blockgroup_features(df_destinations):
+    """
+    Calculate the four features of every blockgroup in one pass: the row
+    values are computed on whole arrays and summarized with a single groupby
+    input:
+        df_destinations - data frame with distance, trip-level data
+    output:
+        df_blockgroup - data frame with origin blockgroup, proximity ratio,
+        vert_hori_ratio, average distance and distance from city center,
+        sorted by origin
+    """
+    features = row_features(df_destinations)
+    rows = pd.DataFrame(features, index=df_destinations.index)
+    rows[cn.ORIGIN] = df_destinations[cn.ORIGIN].values
+    df_blockgroup = rows.groupby([cn.ORIGIN], as_index=False, sort=True).agg(
+        {'dist_under_2': 'sum', 'dist_2_to_10': 'sum', cn.VERT_HORI_RATIO: 'mean',
+         cn.DISTANCE: 'mean', DISTANCE_FROM_CITYCENTER: 'mean'})
+
+    # Remove rows with zero denominators
+    df_blockgroup = df_blockgroup[df_blockgroup['dist_2_to_10'] != 0].reset_index(drop=True)
+    df_blockgroup[cn.PROX_RATIO] = df_blockgroup['dist_under_2'] / df_blockgroup['dist_2_to_10']
+    df_blockgroup.rename(columns = {cn.DISTANCE: cn.AVG_DIST}, inplace=True)
+
+    return df_blockgroup[[cn.ORIGIN, cn.PROX_RATIO, cn.VERT_HORI_RATIO, cn.AVG_DIST,
+                          DISTANCE_FROM_CITYCENTER]]
+
+
+def read_psrc(psrc_fp=cn.PSRC_FP):
+    """
+    Load the PSRC trips
+    input:
+        path of the PSRC csv (optional)
+    output:
+        PSRC data with numeric distances
+    """
+    psrc_rawdat = pd.read_csv(psrc_fp, dtype={cn.ORIGIN: str, cn.DESTINATION: str})
+    psrc_rawdat[cn.DISTANCE] = pd.to_numeric(psrc_rawdat[cn.DISTANCE], errors='coerce')
+    return psrc_rawdat
+
+
+def load_psrc(psrc_fp=cn.PSRC_FP, pickle_dir=cn.PICKLE_DIR,
+              pickle_name=cn.PSRC_FEATURES_PICKLE):
+    """
+    Load the PSRC data with its four features. They are computed once and
+    pickled; the pickle is rebuilt when the PSRC csv is newer.
+    input:
+        path of the PSRC csv, directory and name of the pickle (optional)
+    output:
+        PSRC data with proximity ratio, vert_hori_ratio, average distance, and distance from city center
+    """
+    pickle_fp = os.path.join(pickle_dir, pickle_name)
+    if os.path.exists(pickle_fp) and os.path.getmtime(pickle_fp) >= os.path.getmtime(psrc_fp):
+        return daq.open_pickle(os.path.join(pickle_dir, ''), pickle_name)
+    df_psrc = prepare_psrc(read_psrc(psrc_fp))
+    os.makedirs(pickle_dir, exist_ok=True)
+    daq.make_pickle(pickle_dir, df_psrc, pickle_name)
+    return df_psrc
+
+
 def prepare_psrc(psrc_raw):
     """
     This code calculates four features and adds them to the original PSRC data. 
@@ -102,15 +165,7 @@ def prepare_psrc(psrc_raw):
         PSRC data with proximity ratio, vert_hori_ratio, average distance, and distance from city center
     """
     
-    psrc_blockgroup = proximity_ratio(psrc_raw)
-    with_vert_hori_ratio = vert_hori_ratio(psrc_raw, psrc_blockgroup)
-    with_average_distance = average_distance(psrc_raw, with_vert_hori_ratio)
-    with_distance_from_citycenter = distance_from_citycenter(psrc_raw, with_average_distance)
-    
-    result_merged = with_distance_from_citycenter
-    result_merged.sort_values(by=[cn.ORIGIN])
-    
-    return result_merged
+    return blockgroup_features(psrc_raw)
 
 
 def calculate_features(google_input, basket_combination):
@@ -129,47 +184,28 @@ def calculate_features(google_input, basket_combination):
         filtered_data = filtered_data[(filtered_data['class'] != cn.BASKET_CATEGORIES[i]) | (filtered_data['rank'] <= basket_combination[i])]
    
     # FEATURES: PROXIMITY RATIO, VERTICAL/HORIZONTAL TRAVEL DISTANCES, AVERAGE DISTANCE TO DESTINATION
-    
-    # Creating google results
-    with_proximity_ratio = proximity_ratio(filtered_data.copy())
-    with_vert_hori_ratio = vert_hori_ratio(filtered_data.copy(), with_proximity_ratio)
-    with_average_distance = average_distance(filtered_data.copy(), with_vert_hori_ratio)
-    with_distance_from_citycenter = distance_from_citycenter(filtered_data.copy(), with_average_distance)
-    
-    final_result = with_distance_from_citycenter.sort_values(by = [cn.ORIGIN])
-    
-    return final_result
+    return blockgroup_features(filtered_data)
 
 
-def calculate_mse(psrc_output, google_input):
+def calculate_mse(psrc_output, google_input, n_workers=1, checkpoint_dir=None):
     """
     This calculates three features for each basket combination, saves MSE to compare Google API with PSRC
     input:
         PSRC wth features, Google API data without features
+        number of worker processes (optional, None uses every CPU)
+        checkpoint directory (optional), to save progress and resume the search
     output:
         Basket combinations, MSEs for each basket
     """
 
-    score = []
-    combinations = []
-
-    for x in cn.BASKET_COMBOS:
-        if sum(x) == cn.BASKET_SIZE:
-        # To do a faster test run, comment out the above and use the following:
-        # if sum(x) == 40:
-            combinations.append(x)
-            df_google = calculate_features(google_input, list(x))
-            googled_psrc = psrc_output.loc[psrc_output[cn.ORIGIN].isin(df_google[cn.ORIGIN])]
-            proximity_ratio_mse = mean_squared_error(df_google[cn.PROX_RATIO], googled_psrc[cn.PROX_RATIO])
-            vert_hori_ratio_mse = mean_squared_error(df_google[cn.VERT_HORI_RATIO], googled_psrc[cn.VERT_HORI_RATIO])
-            average_distance_mse = mean_squared_error(df_google[cn.AVG_DIST], googled_psrc[cn.AVG_DIST])
-            distance_from_citycenter_mse = mean_squared_error(df_google['distance_from_citycenter_test'], googled_psrc['distance_from_citycenter_test'])
-
-            mses = (proximity_ratio_mse, vert_hori_ratio_mse, average_distance_mse, distance_from_citycenter_mse)
-            score.append(mses)
-            if (len(combinations) % 5000 == 0):
-                print("Still Processing..")
-                print("Idx+1 of combination is: ", len(combinations))
+    # All features of every combination come from one precomputed cube
+    cube = BasketFeatureCube(google_input)
+    combinations = np.array(list(itertools.product(*cn.BASKET_COUNT_RANGES)))
+    combinations = combinations[combinations.sum(axis=1) == cn.BASKET_SIZE]
+    # To do a faster test run, use the following instead:
+    # combinations = combinations[combinations.sum(axis=1) == 40]
+    runner = BasketSearchRunner(cube, psrc_output, combinations, checkpoint_dir, n_workers)
+    score = runner.run()
 
     print("Total number of combinations: " + str(len(combinations)))
     print()
@@ -192,48 +228,64 @@ def calculate_mse(psrc_output, google_input):
     return final_combinations, final_mses
 
 
-# Load PSRC data and pre-process
-psrc_rawdat = pd.read_csv(cn.PSRC_FP, dtype={cn.ORIGIN: str, cn.DESTINATION: str})
-
-psrc_rawdat[cn.DISTANCE] = pd.to_numeric(psrc_rawdat[cn.DISTANCE], errors='coerce')
+def best_baskets(psrc_output, google_input, top_n=5, feature=cn.AVG_DIST):
+    """
+    This finds the best basket combinations with branch and bound, without
+    scoring every combination like calculate_mse
+    input:
+        PSRC wth features, Google API data without features
+        number of combinations to return (optional)
+        feature whose MSE is minimized (optional), average distance by default
+        as in calculate_mse
+    output:
+        Basket combinations with their MSE, best first
+    """
+    search = BasketBranchAndBound(BasketFeatureCube(google_input), psrc_output, feature)
+    combinations, mses = search.search(top_n)
+    print("Combinations evaluated: " + str(search.evaluations))
+    best = pd.DataFrame(combinations, columns = cn.BASKET_CATEGORIES)
+    best['mse'] = mses
+    return best
 
 
-# Load Google API data 
-input_destinations = pd.read_csv(cn.RAW_DIR + 'GoogleMatrix_Places_Dist.csv', dtype={cn.ORIGIN: str})
-input_destinations.rename(columns = {'lat': 'dest_lat', 'lng': 'dest_lon', 'orig_lng': 'orig_lon'}, inplace=True)
+if __name__ == "__main__":
+    # Load Google API data 
+    input_destinations = pd.read_csv(cn.RAW_DIR + 'GoogleMatrix_Places_Dist.csv', dtype={cn.ORIGIN: str})
+    input_destinations.rename(columns = {'lat': 'dest_lat', 'lng': 'dest_lon', 'orig_lng': 'orig_lon'}, inplace=True)
 
-# Load blockgroup data with latitude and longitudes; will be merged with Google API
-blockgroup_mapping = pd.read_csv(cn.PROCESSED_DIR + 'SeattleCensusBlockGroups.csv', dtype={'tract_blkgrp': str})
+    # Load blockgroup data with latitude and longitudes; will be merged with Google API
+    blockgroup_mapping = pd.read_csv(cn.PROCESSED_DIR + 'SeattleCensusBlockGroups.csv', dtype={'tract_blkgrp': str})
 
-print("blockgroup_mapping is loaded!")
+    print("blockgroup_mapping is loaded!")
 
 
-blockgroup_mapping['tract_blkgrp'] = '530330' + blockgroup_mapping['tract_blkgrp']
-orig_pts = blockgroup_mapping.centroid.apply(shapely.wkt.loads)
-blockgroup_mapping['orig_lon'] = pd.DataFrame([kk.x for kk in orig_pts])
-blockgroup_mapping['orig_lat'] = pd.DataFrame([kk.y for kk in orig_pts])
-origin_blockgroups = blockgroup_mapping [['tract_blkgrp', 'orig_lat', 'orig_lon']]
+    blockgroup_mapping['tract_blkgrp'] = '530330' + blockgroup_mapping['tract_blkgrp']
+    orig_pts = blockgroup_mapping.centroid.apply(shapely.wkt.loads)
+    blockgroup_mapping['orig_lon'] = pd.DataFrame([kk.x for kk in orig_pts])
+    blockgroup_mapping['orig_lat'] = pd.DataFrame([kk.y for kk in orig_pts])
+    origin_blockgroups = blockgroup_mapping [['tract_blkgrp', 'orig_lat', 'orig_lon']]
 
-# origin_merged will be an input data for 'evaluate_features' function
-origin_merged = pd.merge(left=input_destinations, right=origin_blockgroups, how='left', left_on=cn.ORIGIN, right_on='tract_blkgrp')
-origin_merged = origin_merged[[cn.ORIGIN, 'dest_lat', 'orig_lat','dest_lon', 'orig_lon', 'rank', cn.DISTANCE, 'class']]
+    # origin_merged will be an input data for 'evaluate_features' function
+    origin_merged = pd.merge(left=input_destinations, right=origin_blockgroups, how='left', left_on=cn.ORIGIN, right_on='tract_blkgrp')
+    origin_merged = origin_merged[[cn.ORIGIN, 'dest_lat', 'orig_lat','dest_lon', 'orig_lon', 'rank', cn.DISTANCE, 'class']]
 
-print("Google data are ready!")
+    print("Google data are ready!")
 
-# One-time computation of psrc: generate three features
-df_psrc = prepare_psrc(psrc_rawdat.copy())
+    # One-time computation of psrc: generate four features, cached as a pickle
+    df_psrc = load_psrc()
 
-print("PSRC data are ready!")
+    print("PSRC data are ready!")
 
-comb, res = calculate_mse(df_psrc, origin_merged.copy())
-print("The following is the head of combinations")
-print(comb.head())
+    comb, res = calculate_mse(df_psrc, origin_merged.copy(), n_workers=None,
+                              checkpoint_dir=cn.BASKET_CHECKPOINT_DIR)
+    print("The following is the head of combinations")
+    print(comb.head())
 
-print("\n\n")
-print("The following is the head of mses")
-print(res.head())
+    print("\n\n")
+    print("The following is the head of mses")
+    print(res.head())
 
-print("all done!")
+    print("all done!")
 
-comb.to_csv(cn.BASKET_COMBO_FP)
-res.to_csv(cn.MSES_FP)
+    comb.to_csv(cn.BASKET_COMBO_FP)
+    res.to_csv(cn.MSES_FP)
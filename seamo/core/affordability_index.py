@@ -2,8 +2,11 @@ import init
 import pandas as pd
 import constants as cn
 from index_base_class import IndexBase
+from trip_table import TripTable
+from coordinate import Coordinate
+from parking_rates import get_parking_rates
+import normalization as norm
 import numpy as np
-from collections import defaultdict
 
 class AffordabilityIndex(IndexBase):
     """
@@ -14,15 +17,19 @@ class AffordabilityIndex(IndexBase):
         2) relative cost based off the average cheapest and fastest trips,
            scaled from 0-100
     """
-    def __init__(self, viable_modes):
+    def __init__(self, viable_modes, scaling=cn.MIN_MAX):
         """
         Constructor for instatiating the affordability index. Scores are set as
         instance variable when calculated.
-        Input: viable_modes (dictionary data type), which is the output from
-                the mode choice calculator. Key is origin block group, value is
-                list of viable trips.
+        Input: viable_modes, the viable trips from the mode choice calculator,
+                either as a TripTable or as a dictionary where the key is the
+                origin block group and the value is a list of viable trips.
+               scaling (optional), the normalization method for the scores
         """
-        self.viable_modes = dict(viable_modes)
+        if not isinstance(viable_modes, TripTable):
+            viable_modes = TripTable.from_trips(dict(viable_modes))
+        self.trips = viable_modes
+        self.scaling = scaling
         self.affordability_scores = None
 
 
@@ -31,47 +38,76 @@ class AffordabilityIndex(IndexBase):
         This method calculates all of the average cost for all trips in a blockgroup.
         It also populates the dataframe with the average cheapest and average fastest
         trips per desination category.
-        All columns are populated using vectorized operations.
+        All columns are populated using grouped reductions over the trip columns.
         Outputs: Dataframe, columns: key, cost, direct cost, average duration,
                  average cheapest trip, and average fastest trip
         """
-        result_df = pd.DataFrame({cn.KEY: list(self.viable_modes.keys())})
-        result_df['temp_cost'] = result_df.applymap(lambda x: self._calculate_avg_cost(x))
-        result_df[cn.COST] = result_df.apply(lambda x: x['temp_cost'][0], axis=1)
-        result_df[cn.DIRECT_COST] = result_df.apply(lambda x: x['temp_cost'][1], axis=1)
-        result_df[cn.AVG_DURATION] = result_df.apply(lambda x: x['temp_cost'][2], axis=1)
-        result_df[cn.CHEAPEST] = result_df.apply(lambda x: x['temp_cost'][3], axis=1)
-        result_df[cn.FASTEST] = result_df.apply(lambda x: x['temp_cost'][4], axis=1)
-        result_df.drop(columns = ['temp_cost'], inplace=True)
+        trips = self.trips
+        cost, direct_cost = self.calculate_trip_costs()
+        n_origins = len(trips.origins)
+
+        def origin_mean(origin, values):
+            return np.bincount(origin, weights=values, minlength=n_origins) \
+                / np.maximum(np.bincount(origin, minlength=n_origins), 1)
+
+        # group trips by origin and destination, and find the minimum direct
+        # cost and duration of each group
+        keys = trips.origin.astype(np.int64) * len(trips.dest_lat) + trips.destination
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        group_origin = (sorted_keys[starts] // len(trips.dest_lat)).astype(np.int64)
+        cheapest = np.minimum.reduceat(direct_cost[order], starts) if len(starts) else []
+        fastest = np.minimum.reduceat(trips.duration[order], starts) if len(starts) else []
+
+        # keep the origins with trips, in order of first appearance
+        present, first = np.unique(trips.origin, return_index=True)
+        present = present[np.argsort(first)]
+        result_df = pd.DataFrame({cn.KEY: np.asarray(trips.origins, dtype=object)[present]})
+        result_df[cn.COST] = origin_mean(trips.origin, cost)[present]
+        result_df[cn.DIRECT_COST] = origin_mean(trips.origin, direct_cost)[present]
+        result_df[cn.AVG_DURATION] = origin_mean(trips.origin, trips.duration)[present]
+        result_df[cn.CHEAPEST] = origin_mean(group_origin, cheapest)[present]
+        result_df[cn.FASTEST] = origin_mean(group_origin, fastest)[present]
         return result_df
 
 
-    def _calculate_avg_cost(self, origin_blockgroup):
+    def calculate_trip_costs(self):
         """
-        For a specific attribute, this method creates a list containing values
-        for all trips associated with a block group.
-        Inputs: origin_blockgroup
-        Outputs: mean values for cost, direct cost, duration, average cheapest
-                 trip, and average fastest trip
+        Vectorized version of Trip.set_cost for every trip.
+        Outputs: cost and direct cost arrays, one value per trip
         """
-        # collect all trips associated with the origin block group
-        trips = self.viable_modes[origin_blockgroup]
-        # run set_cost method from trip class for each trip. This populates the
-        # trip object with cost attributes
-        costs = [trip.set_cost().cost for trip in trips]
-        direct_costs = [trip.direct_cost for trip in trips]
-        time = [trip.duration for trip in trips]
-        
-        # define default dictionary
-        groups = defaultdict(list)
-        # keys are destination lat, grouping trips by their destination
-        [groups[trip.destination.lat].append(trip) for trip in trips]
-        # for the trips in each destination group, find the minimum value
-        cheapest = {k: min([trip.direct_cost for trip in v]) for k, v in groups.items()}
-        fastest = {k: min([trip.duration for trip in v]) for k, v in groups.items()}
-        # the mean values of all of the lists created are returned to the dataframe
-        return [np.mean(costs), np.mean(direct_costs),
-            np.mean(time), np.mean(list(cheapest.values())), np.mean(list(fastest.values()))]
+        trips = self.trips
+        mode = trips.mode
+        direct_cost = np.zeros(len(trips))
+        car = mode == cn.MODE_CODES[cn.DRIVING_MODE]
+        direct_cost[car] = trips.distance[car] * cn.AAA_RATE \
+            + self._parking_costs()[trips.destination[car]]
+        transit = mode == cn.MODE_CODES[cn.TRANSIT_MODE]
+        direct_cost[transit] = trips.fare[transit]
+        bike = mode == cn.MODE_CODES[cn.BIKING_MODE]
+        direct_cost[bike] = trips.distance[bike] * cn.BIKE_RATE
+        cost = trips.duration * cn.VOT_RATE / cn.MIN_TO_HR + direct_cost
+        return cost, direct_cost
+
+
+    def _parking_costs(self):
+        """
+        Parking cost of every destination of the trips, indexed by destination
+        code. Each destination is looked up once, as Coordinate.set_parking_cost
+        would for each car trip.
+        """
+        trips = self.trips
+        parking_costs = np.zeros(len(trips.dest_lat))
+        car = trips.mode == cn.MODE_CODES[cn.DRIVING_MODE]
+        dests = np.unique(trips.destination[car])
+        block_groups = trips.dest_blockgroups[dests].copy()
+        for i, dest in enumerate(dests):
+            if block_groups[i] is None:
+                coordinate = Coordinate(trips.dest_lat[dest], trips.dest_lon[dest])
+                block_groups[i] = coordinate.set_geocode().block_group
+        parking_costs[dests] = get_parking_rates().rates_for(block_groups)
+        return parking_costs
 
 
     def calculate_score(self, df=None):
@@ -85,30 +121,18 @@ class AffordabilityIndex(IndexBase):
             blkgrp_mode_cost_df = self.create_avg_blockgroup_cost_df()
         else:
             blkgrp_mode_cost_df = df
-        # score 1, relative cost from direct and indirect costs:
-        blkgrp_mode_cost_df = self._scale_score(blkgrp_mode_cost_df, cn.COST, cn.SCALED)
         # score 2, relative cost based off the average cheapest and fastest trips
         # compute additional time beyond average fastest trip, max is taken to
         # ensure value is positive
-        blkgrp_mode_cost_df[cn.ADDITIONAL_TIME_COST] = blkgrp_mode_cost_df.apply(lambda x:
-            max((x[cn.AVG_DURATION] - x[cn.FASTEST]), 0) / cn.MIN_TO_HR * cn.VOT_RATE, axis=1)
+        blkgrp_mode_cost_df[cn.ADDITIONAL_TIME_COST] = (blkgrp_mode_cost_df[cn.AVG_DURATION]
+            - blkgrp_mode_cost_df[cn.FASTEST]).clip(lower=0) / cn.MIN_TO_HR * cn.VOT_RATE
         # calculate relative cost 
-        blkgrp_mode_cost_df[cn.RELATIVE_COST] = blkgrp_mode_cost_df.apply(lambda x:
-            x[cn.DIRECT_COST] - x[cn.CHEAPEST] + x[cn.ADDITIONAL_TIME_COST], axis=1)
-        # scaled score
-        blkgrp_mode_cost_df = self._scale_score(blkgrp_mode_cost_df,
-            cn.RELATIVE_COST, cn.RELATIVE_SCALED)
+        blkgrp_mode_cost_df[cn.RELATIVE_COST] = blkgrp_mode_cost_df[cn.DIRECT_COST] \
+            - blkgrp_mode_cost_df[cn.CHEAPEST] + blkgrp_mode_cost_df[cn.ADDITIONAL_TIME_COST]
+        # scaled scores: score 1 from direct and indirect costs, score 2 from
+        # the relative cost
+        blkgrp_mode_cost_df = norm.scale_columns(blkgrp_mode_cost_df,
+            [cn.COST, cn.RELATIVE_COST], [cn.SCALED, cn.RELATIVE_SCALED], self.scaling)
         # set dataframe to instance variable
         self.affordability_scores = blkgrp_mode_cost_df
         return self.affordability_scores
-
-
-    def _scale_score(self, df, column, scaled_name):
-        """
-        Method for scaling score from 0-100
-        Inputs: dataframe, column to scale, scaled column name
-        Outputs: dataframe with new scaled value
-        """
-        df[scaled_name] = df.apply(lambda x: (x[column] - df[column].min()) /
-                (df[column].max() - df[column].min()), axis=1)
-        return df
\ No newline at end of file
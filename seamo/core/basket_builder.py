@@ -0,0 +1,120 @@
+import init
+import numpy as np
+import pandas as pd
+import constants as cn
+
+
+class BasketBuilder(object):
+    """
+    Builds baskets of destinations from a distance dataframe, without sorting
+    every (blockgroup, class) group.
+
+    The k nearest destinations of every (blockgroup, class) group are found
+    once with a partial selection (np.partition), where k is the largest count
+    any basket can ask for in that class. A basket is then a selection of the
+    first counts of these groups, returned as an array of row positions in the
+    distance dataframe, so building many candidate baskets never copies the
+    dataframe.
+
+    Ties are broken by order of appearance, as in
+    basket_calculator.rank_destinations.
+    """
+    def __init__(self, dist_df, max_counts=None):
+        """
+        Inputs:
+            dist_df (dataframe), with blockgroup, class and distance columns,
+                in the format of basket_calculator.origins_to_destinations
+            max_counts (list, optional), largest count of each class in
+                cn.BASKET_CATEGORIES order. Defaults to the largest of
+                cn.FINAL_BASKET and cn.BASKET_COUNT_RANGES.
+        """
+        if max_counts is None:
+            max_counts = [max([final] + list(counts)) for final, counts
+                          in zip(cn.FINAL_BASKET, cn.BASKET_COUNT_RANGES)]
+        self.max_counts = np.asarray(max_counts, dtype=np.int64)
+        n_classes = len(cn.BASKET_CATEGORIES)
+        self.k = int(self.max_counts.max())
+
+        # -1 for the classes outside the baskets
+        class_codes = pd.Index(cn.BASKET_CATEGORIES).get_indexer(dist_df[cn.CLASS].values)
+        self.row_class = class_codes
+        origin, self.blockgroups = pd.factorize(dist_df[cn.BLOCKGROUP])
+        # NaN distances sort after the inf padding in np.partition; they are
+        # inf, and out of every basket as rank_destinations leaves them unranked
+        values = dist_df[cn.DISTANCE].values.astype(float)
+        valid = ~np.isnan(values)
+        values = np.nan_to_num(values, nan=np.inf)
+        rows = np.flatnonzero((class_codes >= 0) & valid)
+        groups = origin[rows].astype(np.int64) * n_classes + class_codes[rows]
+        self.n_groups = len(self.blockgroups) * n_classes
+        self.group_class = np.tile(np.arange(n_classes), len(self.blockgroups))
+
+        # Padded groups x members matrix of distances, members in order of
+        # appearance. Missing members are inf.
+        order = np.argsort(groups, kind='stable')
+        rows, groups = rows[order], groups[order]
+        sizes = np.bincount(groups, minlength=self.n_groups)
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        member = np.arange(len(rows)) - starts[groups]
+        width = max(int(sizes.max()) if len(sizes) else 0, self.k)
+        distance = np.full((self.n_groups, width), np.inf)
+        distance[groups, member] = values[rows]
+        positions = np.full((self.n_groups, width), -1, dtype=np.int64)
+        positions[groups, member] = rows
+        self.top = self._select(distance, positions)
+
+
+    def _select(self, distance, positions):
+        """
+        Inputs: groups x members matrices of distances and row positions
+        Output: groups x k matrix of the row positions of the k nearest
+                members of each group, nearest first, -1 when a group has
+                fewer than k members
+        """
+        k = self.k
+        if k == 0 or len(distance) == 0:
+            return np.full((len(distance), k), -1, dtype=np.int64)
+        # kth smallest distance of every group
+        kth = np.partition(distance, k - 1, axis=1)[:, k - 1][:, np.newaxis]
+        below = distance < kth
+        # Fill up to k with the members at the kth distance, first seen first
+        ties = (distance == kth) & (np.cumsum(distance == kth, axis=1)
+                                    <= k - below.sum(axis=1)[:, np.newaxis])
+        selected = (below | ties) & (positions >= 0)
+        # Order the (at most k) selected members by distance, then appearance
+        group, member = np.nonzero(selected)
+        order = np.lexsort((member, distance[group, member], group))
+        group, member = group[order], member[order]
+        counts = np.bincount(group, minlength=len(distance))
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        top = np.full((len(distance), k), -1, dtype=np.int64)
+        top[group, np.arange(len(group)) - starts[group]] = positions[group, member]
+        return top
+
+
+    def basket(self, basket_combination=cn.FINAL_BASKET):
+        """
+        Input: basket_combination (list), count of each class in
+               cn.BASKET_CATEGORIES order
+        Output: row positions of the basket destinations in the distance
+                dataframe, grouped by class in cn.BASKET_CATEGORIES order, as
+                basket_calculator.create_basket
+        """
+        counts = np.asarray(basket_combination, dtype=np.int64)
+        if (counts > self.max_counts).any():
+            raise ValueError('Basket counts {0} exceed the counts the builder '
+                             'was built for {1}'.format(list(counts), list(self.max_counts)))
+        picked = self.top[np.arange(self.k)[np.newaxis, :] <
+                          counts[self.group_class][:, np.newaxis]]
+        picked = picked[picked >= 0]
+        return picked[np.lexsort((picked, self.row_class[picked]))]
+
+
+    def ranks(self):
+        """
+        Output: rank of every selected row (row positions, ranks), 1 for the
+                nearest destination of its group
+        """
+        rank = np.tile(np.arange(1, self.k + 1), self.n_groups)
+        positions = self.top.ravel()
+        return positions[positions >= 0], rank[positions >= 0]
@@ -14,21 +14,43 @@ possible origin-destination pair by their driving distance.
 The basket definition is created by using parameters to filter each
 class of destination.
 """
+import csv
 import json
 import os
 from urllib.request import Request, urlopen
 
+import numpy as np
 import pandas as pd
 
 import init
 import constants as cn
 
 from coordinate import Coordinate
+from haversine import haversine
+from place_index import PlaceIndex
+from basket_builder import BasketBuilder
+from distance_matrix_client import DistanceMatrixClient
 
 
 
 origin_df = pd.read_csv(cn.ORIGIN_FP)
 dest_df = pd.read_csv(cn.DEST_FP)
+# Spatial index over the places of dest_df, built on first use
+_place_index = None
+
+
+def get_place_index(places=dest_df):
+    """
+    Input: places (dataframe), defaults to dest_df
+    Output: PlaceIndex of the places. The index of dest_df is built once and
+            kept for the process.
+    """
+    global _place_index
+    if places is not dest_df:
+        return PlaceIndex(places)
+    if _place_index is None:
+        _place_index = PlaceIndex(dest_df)
+    return _place_index
 
 
 def origins_to_destinations(origin_df=origin_df, dest_df=dest_df,
@@ -37,7 +59,8 @@ def origins_to_destinations(origin_df=origin_df, dest_df=dest_df,
     For every origin, store the distance to every destination in the
     full basket of destinations.
     Distance is calculated either with haversine or
-    via the Google Distance Matrix API.
+    via the Google Distance Matrix API. Haversine distances are found with
+    a radius search over the PlaceIndex of the destinations.
 
     Inputs: origin_df (dataframe)
             dest_df (dataframe)
@@ -46,6 +69,10 @@ def origins_to_destinations(origin_df=origin_df, dest_df=dest_df,
     Outputs: dist_df (dataframe)
   
     """
+    if method == 'haversine':
+        # Batched radius search, citywide places are always included
+        return get_place_index(dest_df).distance_frame(origin_df, threshold)
+
     cols = [cn.BLOCKGROUP, cn.PAIR, cn.DISTANCE, cn.CLASS,
             cn.GOOGLE_START_LAT, cn.GOOGLE_START_LON,
             cn.GOOGLE_END_LAT, cn.GOOGLE_END_LON]
@@ -87,16 +114,23 @@ def rank_destinations(dist_df):
     return dist_df
 
 
-def calculate_distance_API(origin, destination, api_key=None, reader=None):
+def calculate_distance_API(origin, destination, api_key=None, reader=None, cache=None):
     """
     Calculate the distance between an origin and destination pair.
     Calls Google Distance Matrix API.
 
     Input:  origin (Coordinate)
             destination (Coordinate)
+            cache (ODCache, optional), read before calling the API
     Output: distance in miles (int)
     """
     distance = 0
+    if cache is not None:
+        key = cache.key(origin, destination, cn.DRIVING_MODE, cn.TIMESTAMP)
+        element = cache.get(key)
+        if element is not None:
+            cache.saved_requests += 1
+            return element['distance']['value']
 
     url = cn.DIST_MATRIX_URL +\
           'units={0}'.format(cn.IMPERIAL_UNITS) +\
@@ -115,7 +149,7 @@ def calculate_distance_API(origin, destination, api_key=None, reader=None):
 
         if data['status'] != 'OK':
             message = data['error_message']
-            with open('API_error.log', 'a+') as outf:
+            with open(cn.API_ERROR_LOG, 'a+') as outf:
                 outf.write("{0} {1} {2}\n".format(origin, destination, message))
         else:
             elements = data['rows'][0]['elements']
@@ -123,18 +157,38 @@ def calculate_distance_API(origin, destination, api_key=None, reader=None):
             if element['status'] == 'NOT_FOUND':
                 # If the origin-destination pair is not found, should write to a log.
                 message = 'Could not find the distance for this pair.'
-                with open('API_error.log', 'a+') as outf:
+                with open(cn.API_ERROR_LOG, 'a+') as outf:
                     outf.write("{0} {1} {2}\n".format(origin, destination, message))
             elif element['status'] == 'OK':
                 distance = element['distance']['value']
+                if cache is not None:
+                    cache.put(key, element)
     except:
         message = "URL open error."
-        with open('API_error.log', 'a+') as outf:
+        with open(cn.API_ERROR_LOG, 'a+') as outf:
             outf.write("{0} {1} {2}\n".format(origin, destination, message))
 
     return distance
 
 
+def calculate_distances_API(pairs, api_key=None, client=None, cache=None):
+    """
+    Calculate the distances of many origin and destination pairs with
+    batched Google Distance Matrix API requests.
+
+    Input:  pairs (list of (Coordinate, Coordinate))
+            api_key (string)
+            client (DistanceMatrixClient, optional), used instead of a new
+                client with the api_key
+            cache (ODCache, optional), read through by a new client
+    Output: distances in meters (list of int), 0 where the API gave none
+    """
+    if client is None:
+        client = DistanceMatrixClient(api_key, cache=cache)
+    return [element['distance']['value'] if element and element['status'] == 'OK' else 0
+            for element in client.elements(pairs)]
+
+
 def calculate_distance_haversine(origin, destination):
     """
     inputs: origin (Coordinate)
@@ -166,16 +220,18 @@ def calculate_distances(origin, dest_df, method, threshold):
     """
     distances = {}
 
-    for index, row in dest_df.iterrows():
-        end_lat, end_lon = row[cn.GOOGLE_PLACES_LAT], row[cn.GOOGLE_PLACES_LON]
-        destination = Coordinate(end_lat, end_lon)
-        dest_class = row[cn.CLASS]
-        place_id = row[cn.PLACE_ID]
+    end_lats = dest_df[cn.GOOGLE_PLACES_LAT].values
+    end_lons = dest_df[cn.GOOGLE_PLACES_LON].values
+    if method == 'haversine':
+        # One batched call for every destination of this origin
+        all_distances = haversine(origin.lat, origin.lon, end_lats, end_lons)
+    elif method == 'API':
+        all_distances = calculate_distances_API(
+            [(origin, Coordinate(end_lat, end_lon)) for end_lat, end_lon in zip(end_lats, end_lons)])
 
-        if method == 'API':
-            distance = calculate_distance_API(origin, destination)
-        elif method == 'haversine':
-            distance = calculate_distance_haversine(origin, destination)
+    for i, (end_lat, end_lon, dest_class, place_id) in enumerate(zip(
+            end_lats, end_lons, dest_df[cn.CLASS].values, dest_df[cn.PLACE_ID].values)):
+        distance = all_distances[i]
 
         data = {cn.GOOGLE_END_LAT: end_lat,
                 cn.GOOGLE_END_LON: end_lon,
@@ -197,22 +253,49 @@ def calculate_distances(origin, dest_df, method, threshold):
 def create_basket(dist_df, basket_combination):
     """
     Given a list of integers denoting counts for basket categories
-    and a dataframe of origin-destination pairs with each destination for
-    each class ranked by proximity to the origin, create a basket of
-    destinations for each blockgroup.
+    and a dataframe of origin-destination pairs, create a basket of
+    destinations for each blockgroup: the closest destinations of each
+    class, as ranked by rank_destinations.
 
     Input: dist_df (dataframe), basket_combination (list)
     Output: dataframe
     """
-    # A list to store intermediate dataframes organized by destination class
-    dfs_by_class = []
-   
-    for i, category in enumerate(cn.BASKET_CATEGORIES):
-        class_df = dist_df[(dist_df[cn.CLASS] == category) &
-                    (dist_df[cn.RANK] <= basket_combination[i])]
-        dfs_by_class.append(class_df)
+    builder = BasketBuilder(dist_df, basket_combination)
+    return dist_df.iloc[builder.basket(basket_combination)]
 
-    # Concatenate the intermediate dataframes
-    basket_df = pd.concat(dfs_by_class)
 
-    return basket_df
+def write_input_baskets(baskets_df, output_fp=cn.INPUT_BASKETS_FP):
+    """
+    Write the basket of each blockgroup as one row: its place IDs separated
+    with commas, its destinations and their classes separated with a pipe.
+    Rows are grouped by blockgroup in a single sort and written to the file
+    one at a time.
+
+    Input: baskets_df (dataframe), output of create_basket
+           output_fp (optional), path of the CSV file
+    Output: number of blockgroups written
+    """
+    blockgroups = baskets_df[cn.BLOCKGROUP].values
+    order = np.argsort(blockgroups, kind='stable')
+    blockgroups = blockgroups[order]
+    pairs = baskets_df[cn.PAIR].astype(str).values[order]
+    classes = baskets_df[cn.CLASS].astype(str).values[order]
+    origins = (baskets_df[cn.GOOGLE_START_LAT].astype(str) + ',' +
+               baskets_df[cn.GOOGLE_START_LON].astype(str)).values[order]
+    destinations = (baskets_df[cn.GOOGLE_END_LAT].astype(str) + ',' +
+                    baskets_df[cn.GOOGLE_END_LON].astype(str)).values[order]
+    starts = np.flatnonzero(np.r_[True, blockgroups[1:] != blockgroups[:-1]])[:len(blockgroups)]
+    ends = np.r_[starts[1:], len(blockgroups)]
+
+    with open(output_fp, 'w', newline='') as outf:
+        writer = csv.writer(outf)
+        writer.writerow(['', cn.BLOCKGROUP, cn.PLACE_IDS, cn.ORIGIN, cn.DESTINATIONS, cn.CLASS])
+        for i, (start, end) in enumerate(zip(starts, ends)):
+            # Place ID is the part of pair after the blockgroup. Blockgroup IDs
+            # have no dash, but some place IDs do, so split on the first one
+            writer.writerow([i, blockgroups[start],
+                             ','.join(pair.split('-', 1)[1] for pair in pairs[start:end]),
+                             origins[end - 1],
+                             '|'.join(destinations[start:end]),
+                             '|'.join(classes[start:end])])
+    return len(starts)
@@ -3,7 +3,10 @@ import pandas as pd
 from geocoder_input import GeocoderInput, GeocoderBlockgroupInput
 import constants as cn
 from geocode_base_class import GeocodeBase
-import seamo_exceptions as se
+
+# Geocoded attributes, in the order of the output columns
+GEOCODE_COLUMNS = [cn.BLOCK_GROUP, cn.NBHD_LONG, cn.NBHD_SHORT, cn.COUNCIL_DISTRICT,
+                   cn.URBAN_VILLAGE, cn.ZIPCODE]
 
 class Geocoder(GeocodeBase):
     """
@@ -31,9 +34,14 @@ class Geocoder(GeocodeBase):
     - get_blockgroup_from_point(coord, pickle_name) if passing lat/lon pair in 
       format (LAT, LON), pickle_name parameter is optional, default will be used
       otherwise
+
+    Each call runs a single spatial join, counted in join_count. Points that
+    fall in no polygon of the reference get missing attributes. The output
+    keeps the index of the input, so results can be joined back by it.
     """ 
     def __init__(self, crs=cn.CRS_EPSG):
         super().__init__(crs)
+        self.references = {}
 
 
     # Geocoder function
@@ -45,12 +53,11 @@ class Geocoder(GeocodeBase):
         Outputs: dataframe containing geocoded information
         """
         reference_gdf = self._get_geocode_reference(0, pickle_name)
-        try:
-            self._find_overlap_in_reference(gdf, pickle_name, reference_gdf)
-        except se.NoOverlapSpatialJoinError:
-            df = pd.DataFrame(cn.GEOCODE_NAN_DF)
+        df = self._find_overlap_in_reference(gdf, pickle_name, reference_gdf)
+        # sjoin keeps the points outside every polygon, without a geography
+        if df[cn.GEOGRAPHY].isna().all():
+            df = self._empty_result(gdf, GEOCODE_COLUMNS)
         else:
-            df = self._find_overlap_in_reference(gdf, pickle_name, reference_gdf)
             df = df.sort_values(by=cn.GEOGRAPHY)
             df = df.set_index([cn.LAT, cn.LON, cn.GEOGRAPHY], append=cn.KEY).unstack()
             df.columns = df.columns.droplevel()
@@ -67,14 +74,11 @@ class Geocoder(GeocodeBase):
         Outputs: dataframe containing block groups
         """
         reference_gdf = self._get_geocode_reference(1, pickle_name)
-        try:
-            self._find_overlap_in_reference(gdf, pickle_name, reference_gdf)
-        except se.NoOverlapSpatialJoinError:
-            print('No overlap found')
-            df = pd.DataFrame({cn.KEY: [None]})
+        df = self._find_overlap_in_reference(gdf, pickle_name, reference_gdf)
+        if df[cn.KEY].isna().all():
+            df = self._empty_result(gdf, [cn.KEY])
         else:
-            df = self._find_overlap_in_reference(gdf, pickle_name, reference_gdf)
-            df[cn.KEY] = df[cn.KEY].astype(str)
+            df[cn.KEY] = self._as_strings(df[cn.KEY])
         return df
 
 
@@ -85,35 +89,50 @@ class Geocoder(GeocodeBase):
         Inputs: dataframe of geocoded attributes
         Outputs: formatted dataframe of geocoded attributes
         """
-        df = df.reset_index().drop(['level_0'], axis=1)
+        # the points keep the index of the input geodataframe
+        df = df.reset_index(level=[cn.LAT, cn.LON])
+        df.index.name = None
         df[cn.LAT] = df[cn.LAT].astype(float)
         df[cn.LON] = df[cn.LON].astype(float)
-        for col in [cn.BLOCK_GROUP, cn.NBHD_LONG, cn.NBHD_SHORT, cn.COUNCIL_DISTRICT,
-                    cn.URBAN_VILLAGE, cn.ZIPCODE]:
-            try:
-                df[col].astype(str)
-            except KeyError:
-                df[col] = None
+        for col in GEOCODE_COLUMNS:
+            if col in df.columns:
+                df[col] = self._as_strings(df[col])
             else:
-                df[col] = df[col].astype(str)
+                df[col] = None
         df = df[[cn.LAT, cn.LON, cn.BLOCK_GROUP, cn.NBHD_LONG, cn.NBHD_SHORT,cn.COUNCIL_DISTRICT,
                 cn.URBAN_VILLAGE, cn.ZIPCODE]]
         return df
 
 
+    def _as_strings(self, values):
+        """
+        Input: series of geocoded attributes
+        Output: series of the attributes as strings, None where missing
+        """
+        values = values.map(str, na_action='ignore').astype(object)
+        return values.where(values.notna(), None)
+
+
     def _get_geocode_reference(self, ref_type, pickle_name):
         """
         This method gets the appropriate reference dataframe to be used in the
-        spatial joining.
+        spatial joining. References are loaded once per Geocoder instance.
         Inputs: geocode method using, pickle name
         Outputs: reference dataframe
         """
-        if ref_type == 0:
-            gi = GeocoderInput()
-            return self._get_reference(pickle_name, gi)
-        elif ref_type == 1:
-            gi = GeocoderBlockgroupInput()
-            return self._get_reference(pickle_name, gi)
+        key = (ref_type, pickle_name)
+        if key not in self.references:
+            if ref_type == 0:
+                gi = GeocoderInput()
+            elif ref_type == 1:
+                gi = GeocoderBlockgroupInput()
+            else:
+                return None
+            reference = self._get_reference(pickle_name, gi)
+            # build the spatial index once, sjoin reuses it on every call
+            reference.sindex
+            self.references[key] = reference
+        return self.references[key]
 
 
     def geocode_csv(self, input_file, pickle_name=cn.REFERENCE_PICKLE):
@@ -0,0 +1,86 @@
+import init
+import threading
+from collections import OrderedDict
+import constants as cn
+from geocoder import Geocoder
+
+
+class GeocoderRegistry(object):
+    """
+    Process-wide warm geocoder. A single Geocoder is kept for the process, so
+    the reference geodataframes and their spatial indexes are loaded once.
+    Geocoded points are memoized in a bounded LRU cache keyed on the rounded
+    (lat, lon), so repeated lookups of the same destination skip the spatial
+    join entirely.
+
+    Use get_geocoder_registry() to get the registry of the process, then call:
+    - geocode_point(lat, lon) for all geocoded attributes of a point
+    - cache_info() for the hit and miss counters
+    """
+    def __init__(self, maxsize=cn.GEOCODE_CACHE_SIZE,
+                 precision=cn.GEOCODE_CACHE_PRECISION, geocoder=None):
+        """
+        Inputs: maximum number of cached points, decimal places used to round
+                lat/lon, geocoder (optional, defaults to a new Geocoder)
+        """
+        self.maxsize = maxsize
+        self.precision = precision
+        self.geocoder = geocoder if geocoder is not None else Geocoder()
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+
+    def geocode_point(self, lat, lon):
+        """
+        Inputs: lat, lon (floats)
+        Outputs: dataframe of geocoded information, as Geocoder.geocode_point.
+                 The dataframe is shared with later lookups, do not modify it.
+        """
+        key = (round(float(lat), self.precision), round(float(lon), self.precision))
+        with self._lock:
+            if key in self.cache:
+                self.hits += 1
+                self.cache.move_to_end(key)
+                return self.cache[key]
+            self.misses += 1
+        df = self.geocoder.geocode_point((float(lat), float(lon)))
+        with self._lock:
+            self.cache[key] = df
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
+        return df
+
+
+    def cache_info(self):
+        """
+        Outputs: dict with the hits, misses, current size and maximum size of
+                 the cache
+        """
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self.cache), 'maxsize': self.maxsize}
+
+
+    def clear(self):
+        """
+        Empty the cache and reset the counters. References stay loaded.
+        """
+        with self._lock:
+            self.cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_REGISTRY = None
+
+
+def get_geocoder_registry():
+    """
+    Output: the GeocoderRegistry of the process
+    """
+    global _REGISTRY
+    if _REGISTRY is None:
+        _REGISTRY = GeocoderRegistry()
+    return _REGISTRY
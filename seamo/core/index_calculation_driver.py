@@ -13,7 +13,8 @@ try:
 except:
     total_trips_df = pd.read_csv(cn.WEEKDAY_DISTANCES_OUT_FP, 
         dtype={cn.BLOCK_GROUP: str, cn.DEST_BLOCK_GROUP: str})
-    trips_per_blockgroup = mc.trips_per_blockgroup(total_trips_df, viable_only=True)
+    trips_per_blockgroup = mc.trip_table(total_trips_df)
+    trips_per_blockgroup = trips_per_blockgroup.subset(trips_per_blockgroup.viable == 1)
     daq.make_pickle(cn.PICKLE_DIR, trips_per_blockgroup, 'mode_choice_calc.pickle')
 else:
     trips_per_blockgroup = daq.open_pickle(cn.PICKLE_DIR, 'mode_choice_calc.pickle')
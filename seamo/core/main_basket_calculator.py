@@ -4,6 +4,9 @@ import __init__
 import constants as cn
 from basket_calculator import * 
 from coordinate import Coordinate
+from distance_queue import DistanceQueue, LEASE
+from distance_matrix_client import DistanceMatrixClient
+from od_cache import ODCache
 
 
 """
@@ -35,54 +38,39 @@ cols = [cn.BLOCKGROUP, cn.PAIR, cn.DISTANCE, cn.CLASS,
         cn.GOOGLE_START_LAT, cn.GOOGLE_START_LON,
         cn.GOOGLE_END_LAT, cn.GOOGLE_END_LON]
 
-OUTPUT_FP = cn.API_DIST_FP 
-if not os.path.exists(OUTPUT_FP):
-    with open(OUTPUT_FP, 'w+') as outf:
-        outf.write(','.join(cols))
-        outf.write('\n')
-
-dist_df = pd.read_csv(cn.HAVERSINE_DIST_FP)
-
-# If the queue does not exist, create it by making a copy of the distance csv
-if not os.path.exists(cn.DISTANCE_QUEUE_FP):
-    dist_df.to_csv(cn.DISTANCE_QUEUE_FP)
-
-# If the 'stack' file exists, use it
-queue_df = pd.read_csv(cn.DISTANCE_QUEUE_FP)  
-
+# Pairs waiting for an API distance are kept in a SQLite queue, so several
+# workers can run this step at once and a crash loses at most one batch
+queue = DistanceQueue()
+new_queue = sum(queue.counts().values()) == 0
+queue.enqueue(pd.read_csv(cn.HAVERSINE_DIST_FP))
+# Keep the distances fetched by earlier runs
+if new_queue and os.path.exists(cn.API_DIST_FP):
+    done_df = pd.read_csv(cn.API_DIST_FP)
+    queue.complete(done_df[cn.PAIR], done_df[cn.DISTANCE])
+
+# Distances already fetched by any earlier run are read from the OD cache
+client = DistanceMatrixClient(api_key, cache=ODCache())
 api_calls = 0
-finished_rows = []
-
-with open(OUTPUT_FP, 'a+') as outf:
-    for index, row in queue_df.iterrows():
-        blockgroup = row[cn.BLOCKGROUP]
-        origin_lat = row[cn.GOOGLE_START_LAT]
-        origin_lon = row[cn.GOOGLE_START_LON]
-        origin = Coordinate(origin_lat, origin_lon)
-        end_lat = row[cn.GOOGLE_END_LAT]
-        end_lon = row[cn.GOOGLE_END_LON]
-        destination = Coordinate(end_lat, end_lon)
-        distance = bc.calculate_distance_API(origin, destination)
-        # Increment number of API calls made
-        api_calls +=1 
-        if distance: 
-            # If the call was successful, log its index
-            finished_rows.append(index)
-            dest_class = row[cn.CLASS]
-            end_lat = row[cn.GOOGLE_END_LAT]
-            end_lon = row[cn.GOOGLE_END_LON]
-            pair = row[cn.PAIR] 
-            row = [blockgroup, pair, distance, dest_class,
-                   origin_lat, origin_lon, end_lat, end_lon]
-
-            outf.write(','.join([str(e) for e in row]))
-            outf.write('\n')
-        if api_calls == cn.API_CALL_LIMIT:
-            break
-
-# Remove rows for which we successfully got data 
-queue_df = queue_df.drop(queue_df.index[finished_rows])
-queue_df.to_csv(cn.DISTANCE_QUEUE_FP)
+while api_calls < cn.API_CALL_LIMIT:
+    batch = queue.claim(min(cn.DISTANCE_QUEUE_BATCH, cn.API_CALL_LIMIT - api_calls))
+    if batch.empty:
+        break
+    pairs = [(Coordinate(start_lat, start_lon), Coordinate(end_lat, end_lon))
+             for start_lat, start_lon, end_lat, end_lon in zip(
+                 batch[cn.GOOGLE_START_LAT], batch[cn.GOOGLE_START_LON],
+                 batch[cn.GOOGLE_END_LAT], batch[cn.GOOGLE_END_LON])]
+    distances = pd.Series(calculate_distances_API(pairs, client=client), index=batch.index)
+    # Increment number of API calls made
+    api_calls += len(batch)
+    found = distances != 0
+    # Only the pairs still held under the lease of the batch are updated
+    lease = batch[LEASE].iloc[0]
+    queue.complete(batch.loc[found, cn.PAIR], distances[found], lease)
+    queue.fail(batch.loc[~found, cn.PAIR], lease)
+
+print(queue.counts())
+print(client.cache.report())
+queue.done_df()[cols].to_csv(cn.API_DIST_FP, index=False)
 
 api_distances = cn.API_DIST_FP
 
@@ -95,39 +83,4 @@ baskets_df = create_basket(ranked_df, cn.FINAL_BASKET)
 baskets_df.to_csv(cn.BASKETS_FP)
 # Also put out a CSV wherein destinations are concatenated and pipe-separated
 # Destination place IDs and classes also concatenated
-bgs = { blockgroup: { cn.ORIGIN : None, 
-                      cn.DESTINATIONS : [], 
-                      cn.PLACE_IDS : [], 
-                      cn.CLASS: [] } for blockgroup in df[cn.BLOCKGROUP].values }
-for _, row in baskets_df.iterrows():
-    blkgrp = row[cn.BLOCKGROUP]
-    origin = "{0},{1}".format(row[cn.GOOGLE_START_LAT], row[cn.GOOGLE_START_LON])
-    destination = "{0},{1}".format(row[cn.GOOGLE_END_LAT], row[cn.GOOGLE_END_LON])
-    dest_class = row[cn.CLASS]
-    pair = row[cn.PAIR]
-    # Place ID is the part of pair after the origin string
-    # Can't split on '-' because some place IDs have dashes in the name
-    place_id = pair[13:]
-
-    bgs[blkgrp][cn.PLACE_IDS].append(place_id) 
-    bgs[blkgrp][cn.DESTINATIONS].append(destination) 
-    bgs[blkgrp][cn.CLASS].append(dest_class) 
-    bgs[blkgrp][cn.ORIGIN] = origin
-
-cols = [cn.BLOCKGROUP, cn.PLACE_IDS, cn.ORIGIN, cn.DESTINATIONS, cn.CLASS]
-rows = []
-for bg, data in bgs.items():
-    origin = data[cn.ORIGIN]
-    # Separate place ids with commas
-    place_ids = ",".join(data[cn.PLACE_IDS]) 
-    # Separate destinations with a pipe
-    dests = "|".join(data[cn.DESTINATIONS])
-    dest_classes = "|".join(data[cn.CLASS])
-    new_row = { cn.BLOCKGROUP : bg,
-                cn.ORIGIN: origin,
-                cn.PLACE_IDS: place_ids,
-                cn.DESTINATIONS: dests, 
-                cn.CLASS: dest_classes }
-    rows.append(new_row)
-new_df = pd.DataFrame(rows, columns=cols)
-new_df.to_csv(cn.INPUT_BASKETS_FP)
+write_input_baskets(baskets_df, cn.INPUT_BASKETS_FP)
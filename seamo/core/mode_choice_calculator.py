@@ -1,11 +1,40 @@
 import init
 import constants as cn
 from trip import BikeTrip, CarTrip, TransitTrip, WalkTrip
+from trip_table import TripTable
 from index_base_class import IndexBase
 
+import numpy as np
 import pandas as pd
 
-from collections import defaultdict
+
+def viable_matrix(duration, mode, fare, thresholds):
+    """
+    Inputs:
+        duration (array of floats)
+        mode (array of mode codes from cn.MODE_CODES, -1 for unknown modes)
+        fare (array of floats)
+        thresholds (array, rows x number of modes), thresholds in minutes with
+            columns in the order of cn.MODES
+    Outputs:
+        viable (int8 array, rows x trips)
+
+    Viability rules shared by ModeChoiceCalculator and PersonaSweep. Every
+    duration is compared with the threshold of its mode, for each row of
+    thresholds. Transit trips without a fare (0 or NaN) are not viable, and
+    neither are trips with an unknown mode.
+    """
+    duration = np.asarray(duration, dtype=float)
+    mode = np.asarray(mode, dtype=int)
+    fare = np.nan_to_num(np.asarray(fare, dtype=float))
+    thresholds = np.atleast_2d(np.asarray(thresholds, dtype=float))
+    # The extra trailing threshold is used by unknown modes (code -1)
+    thresholds = np.hstack([thresholds, np.full((len(thresholds), 1), -np.inf)])
+    viable = duration[np.newaxis, :] < thresholds[:, mode]
+    # If the trip's fare is empty, Google Maps gave walking directions
+    # and thus, transit is not viable.
+    viable &= ((mode != cn.MODE_CODES[cn.TRANSIT_MODE]) | (fare != 0))[np.newaxis, :]
+    return viable.astype(np.int8)
 
 
 class ModeChoiceCalculator(IndexBase):
@@ -145,6 +174,49 @@ class ModeChoiceCalculator(IndexBase):
         return viable
 
     
+    def is_viable_batch(self, duration, mode, fare):
+        """
+        Inputs:
+            duration (array of floats)
+            mode (array of mode codes from cn.MODE_CODES, or of mode names)
+            fare (array of floats)
+        Outputs:
+            viable (array of ints)
+
+        Vectorized version of is_viable. Compares every duration with the
+        threshold of its mode in one NumPy pass and returns an array of 1s
+        (viable) and 0s (not viable). Transit trips without a fare (0 or NaN)
+        are not viable, and neither are trips with an unknown mode.
+        """
+        mode = np.asarray(mode)
+        if mode.dtype.kind not in 'iu':
+            mode = pd.Series(mode).map(cn.MODE_CODES).fillna(-1).values.astype(int)
+        return viable_matrix(duration, mode, fare, self.thresholds())[0]
+
+
+    def thresholds(self):
+        """
+        Output: thresholds (array), in the order of cn.MODES
+        """
+        return np.array([self.car_time_threshold, self.bike_time_threshold,
+                         self.transit_time_threshold, self.walk_time_threshold], dtype=float)
+
+
+    def trip_table(self, df):
+        """
+        Inputs:
+            df (Dataframe)
+        Outputs:
+            table (TripTable)
+
+        Given a dataframe containing data for one trip per row, build a
+        columnar TripTable and set the viability of every trip in one pass.
+        """
+        table = TripTable.from_df(df)
+        return table.set_viability(self.is_viable_batch(table.duration, table.mode,
+                                                        table.fare))
+
+
     def trips_per_blockgroup(self, df, viable_only=False):
         """
         Inputs:
@@ -160,85 +232,89 @@ class ModeChoiceCalculator(IndexBase):
         If viable_only == True, only append the viable trips to the lists. 
 
         Return a dict where keys are blockgroups and values are lists of Trips.
+        Prefer trip_table, which avoids building a Trip object per row.
         """
-        blkgrp_dict = defaultdict(list)
-        for _, row in df.iterrows():
-            trip = self.trip_from_row(row)
-            blkgrp = trip.origin
-            viable = self.is_viable(trip)
-            trip.set_viability(viable)
-            if viable_only:
-                if viable == 1:
-                    blkgrp_dict[blkgrp].append(trip)
-            else:
-                blkgrp_dict[blkgrp].append(trip)
-
-        return blkgrp_dict
+        table = self.trip_table(df)
+        if viable_only:
+            table = table.subset(table.viable == 1)
+        return table.trips_per_blockgroup()
 
 
     def calculate_mode_avail(self, trips):
         """
         Input: trips (list of Trips)
         Output: scores (dict)
-                    keys: blockgroup IDs (int)
-                    values: list of Trip objects 
+                    keys: modes (string)
+                    values: mode availability score (float)
 
         For each mode, calculate the ratio of viable trips to total trips for 
         that particular mode. Return a dict containing scores for each mode.
 
         """
-        # Hours of data availability, HOURS constant should be float
-        scores = {}
-        for mode in [cn.DRIVING_MODE, cn.BIKING_MODE, cn.TRANSIT_MODE, cn.WALKING_MODE]:
-            # List of 0s and 1s corresponding to binary viability value for each trip
-            viability_per_trip = [trip.viable for trip in trips if trip.mode == mode]
-            # Number of viable trips
-            viable_trips = sum(viability_per_trip)
-            if viable_trips <= 0:
-                mode_avail_score = 0
-            else:
-                mode_avail_score = viable_trips / len(viability_per_trip)
-
-            # if mode == cn.DRIVING_MODE or mode == cn.TRANSIT_MODE:
-            #    mode_avail /= cn.TRAVEL_HOURS
-            # mode_avail /= cn.BASKET_SIZE
-            
-            scores[mode] = mode_avail_score
-        return scores 
-        
+        mode = np.array([cn.MODE_CODES[trip.mode] for trip in trips], dtype=int)
+        viable = np.array([trip.viable for trip in trips], dtype=float)
+        scores = self._mode_avail_scores(np.zeros(len(mode), dtype=int), mode,
+                                         viable, 1)
+        return dict(zip(cn.MODES, scores[0]))
+
+
+    def _mode_avail_scores(self, origin, mode, viable, n_origins):
+        """
+        Inputs:
+            origin (array of origin codes)
+            mode (array of mode codes)
+            viable (array of 0s and 1s)
+            n_origins (int)
+        Outputs:
+            scores (array, n_origins x number of modes)
+
+        Grouped reduction behind the mode availability scores: counts total and
+        viable trips per (origin, mode) with bincount and returns their ratio.
+        Origin/mode pairs without trips score 0.
+        """
+        n_modes = len(cn.MODES)
+        keys = origin.astype(np.int64) * n_modes + mode
+        size = n_origins * n_modes
+        total = np.bincount(keys, minlength=size).reshape(n_origins, n_modes)
+        viable = np.bincount(keys, weights=viable, minlength=size).reshape(n_origins, n_modes)
+        return viable / np.maximum(total, 1)
+
 
     def create_availability_df(self, blkgrp_dict):
         """
         Input:
-            blkgrp_dict (dict)
+            blkgrp_dict (TripTable or dict)
                 keys: blockgroup IDs (int)
                 values: list of Trips originating from that blockgroup
         Output:
             df (Pandas DataFrame)
 
-        Given a dict in which keys are blockgroup IDs and values are a list of
-        trips from that blockgroup, this method calculates a mode availability 
-        score for each blockroup and creates a Pandas DataFrame with a row for 
-        each block group and columns for mode-specific and total availability
-        scores. 
+        Given a TripTable, or a dict in which keys are blockgroup IDs and values
+        are a list of trips from that blockgroup, this method calculates a mode
+        availability score for each blockroup and creates a Pandas DataFrame
+        with a row for each block group and columns for mode-specific and total
+        availability scores. 
 
         Mode-specific scores are calculated by the ratio of viable trips to
         total trips. The final mode availability score is the unweighted mean 
         of the 4 mode-specific scores. 
         """
-        data = []
-        for blkgrp, trips in blkgrp_dict.items():
-            mode_scores = self.calculate_mode_avail(trips)
-            row = mode_scores
-            mode_index = sum(mode_scores.values()) / 4
-            row[cn.BLOCK_GROUP] =  blkgrp
-            row[cn.MODE_CHOICE_INDEX] = mode_index
-            data.append(row)
-            
-        cols=[cn.BLOCK_GROUP, cn.DRIVING_MODE, cn.BIKING_MODE, cn.TRANSIT_MODE,
-              cn.WALKING_MODE, cn.MODE_CHOICE_INDEX]
-
-        df = pd.DataFrame(data, columns=cols)
-    
+        if isinstance(blkgrp_dict, TripTable):
+            origins, origin = blkgrp_dict.origins, blkgrp_dict.origin
+            mode, viable = blkgrp_dict.mode, blkgrp_dict.viable
+            # Subsets of a TripTable can have origins without trips
+            present = np.bincount(origin, minlength=len(origins)) > 0
+        else:
+            origins = list(blkgrp_dict.keys())
+            trips = [trip for blkgrp in origins for trip in blkgrp_dict[blkgrp]]
+            origin = np.repeat(np.arange(len(origins)),
+                               [len(blkgrp_dict[blkgrp]) for blkgrp in origins])
+            mode = np.array([cn.MODE_CODES[trip.mode] for trip in trips], dtype=int)
+            viable = np.array([trip.viable for trip in trips])
+            present = np.ones(len(origins), dtype=bool)
+
+        scores = self._mode_avail_scores(origin, mode, viable.astype(float), len(origins))
+        df = pd.DataFrame(scores[present], columns=cn.MODES)
+        df.insert(0, cn.BLOCK_GROUP, np.asarray(origins, dtype=object)[present])
+        df[cn.MODE_CHOICE_INDEX] = df[cn.MODES].sum(axis=1) / len(cn.MODES)
         return df
-
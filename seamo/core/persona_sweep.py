@@ -0,0 +1,110 @@
+import init
+import numpy as np
+import pandas as pd
+import constants as cn
+from affordability_index import AffordabilityIndex
+from mode_choice_calculator import viable_matrix
+
+
+class PersonaSweep(object):
+    """
+    Evaluates mode availability and affordability for many personas at once.
+
+    The trips are loaded once into a TripTable. Each persona is a row of a
+    persona-by-mode threshold matrix, which is broadcast against the duration
+    column to get the viability of every trip for every persona in one NumPy
+    pass. Adding a persona only adds a row to the matrix.
+    """
+    def __init__(self, trips, personas=None):
+        """
+        Inputs:
+            trips (TripTable)
+            personas (dict, optional)
+                keys: persona names
+                values: dict of thresholds in minutes, keyed by the columns in
+                        cn.MODE_THRESHOLDS (the format of persona_thresholds.csv)
+        """
+        self.trips = trips
+        self.personas = []
+        self.thresholds = np.empty((0, len(cn.MODES)))
+        for persona, attrs in (personas or {}).items():
+            self.add_persona(persona, attrs)
+
+
+    def add_persona(self, persona, attrs):
+        """
+        Add a persona to the sweep.
+        Inputs: persona name (string), dict of thresholds keyed by cn.MODE_THRESHOLDS
+        """
+        row = [float(attrs[threshold]) for threshold in cn.MODE_THRESHOLDS]
+        self.personas.append(persona)
+        self.thresholds = np.vstack([self.thresholds, row])
+        return self
+
+
+    def viability(self):
+        """
+        Output: viable (int8 array, personas x trips)
+
+        Viability of every trip for every persona, with the rules of
+        ModeChoiceCalculator (mode_choice_calculator.viable_matrix).
+        """
+        trips = self.trips
+        return viable_matrix(trips.duration, trips.mode, trips.fare, self.thresholds)
+
+
+    def availability_dfs(self, viable=None):
+        """
+        Input: viable (optional), the output of viability()
+        Output: dict, keys are personas, values are dataframes in the format of
+                ModeChoiceCalculator.create_availability_df
+
+        All personas are reduced with a single bincount over
+        (persona, origin, mode) keys.
+        """
+        if viable is None:
+            viable = self.viability()
+        trips = self.trips
+        n_personas, n_origins, n_modes = len(self.personas), len(trips.origins), len(cn.MODES)
+        size = n_origins * n_modes
+        keys = trips.origin.astype(np.int64) * n_modes + trips.mode
+        total = np.bincount(keys, minlength=size).reshape(n_origins, n_modes)
+        persona_keys = np.arange(n_personas)[:, np.newaxis] * size + keys[np.newaxis, :]
+        viable_counts = np.bincount(persona_keys.ravel(), weights=viable.ravel(),
+            minlength=n_personas * size).reshape(n_personas, n_origins, n_modes)
+        scores = viable_counts / np.maximum(total, 1)
+        present = total.sum(axis=1) > 0
+        origins = np.asarray(trips.origins, dtype=object)[present]
+
+        avail_dfs = {}
+        for i, persona in enumerate(self.personas):
+            df = pd.DataFrame(scores[i][present], columns=cn.MODES)
+            df.insert(0, cn.BLOCK_GROUP, origins)
+            df[cn.MODE_CHOICE_INDEX] = df[cn.MODES].sum(axis=1) / n_modes
+            avail_dfs[persona] = df
+        return avail_dfs
+
+
+    def affordability_dfs(self, viable=None):
+        """
+        Input: viable (optional), the output of viability()
+        Output: dict, keys are personas, values are affordability score
+                dataframes with the columns in cn.AFFORDABILITY_COLUMNS
+        """
+        if viable is None:
+            viable = self.viability()
+        afford_dfs = {}
+        for i, persona in enumerate(self.personas):
+            ac = AffordabilityIndex(self.trips.subset(viable[i] == 1))
+            afford_dfs[persona] = ac.calculate_score().loc[:, cn.AFFORDABILITY_COLUMNS]
+        return afford_dfs
+
+
+    def run(self):
+        """
+        Output: (availability, affordability), two dicts keyed by persona
+
+        Compute the viability matrix once and produce both sets of tables.
+        """
+        viable = self.viability()
+        return self.availability_dfs(viable), self.affordability_dfs(viable)
@@ -0,0 +1,95 @@
+import init
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+import constants as cn
+from haversine import haversine, haversine_matrix
+
+
+class PlaceIndex(object):
+    """
+    Spatial index over the places of the basket of destinations.
+
+    The places are loaded once into a ball tree on (lat, lon) in radians with
+    the haversine metric, so "every place within R miles of each origin" is
+    answered for all origins with a single batched query instead of computing
+    the distance from every origin to every place. Citywide places are always
+    included, whatever their distance.
+
+    To get the distance dataframe of basket_calculator.origins_to_destinations
+    call:
+    - distance_frame(origin_df, threshold, radius)
+    """
+    def __init__(self, dest_df):
+        """
+        Input: dest_df (dataframe), places with the columns of
+               GoogleMatrix_Places_Full.csv
+        """
+        # A place is listed once per origin, as in
+        # basket_calculator.calculate_distances the last row of a place wins
+        dest_df = dest_df.drop_duplicates(cn.PLACE_ID, keep='last')
+        self.lats = dest_df[cn.GOOGLE_PLACES_LAT].values.astype(float)
+        self.lons = dest_df[cn.GOOGLE_PLACES_LON].values.astype(float)
+        self.classes = dest_df[cn.CLASS].values
+        self.place_ids = dest_df[cn.PLACE_ID].values
+        self.citywide = np.flatnonzero(self.classes == cn.CITYWIDE)
+        self.tree = BallTree(np.radians(np.column_stack([self.lats, self.lons])),
+                             metric='haversine')
+
+
+    def query_radius(self, lats, lons, radius=cn.PROXIMITY_THRESHOLD_MILES):
+        """
+        Inputs: latitudes and longitudes of the origins, radius in miles
+        Outputs: origin and place positions (two arrays) of every pair within
+                 the radius, plus every origin with every citywide place,
+                 sorted by origin then place
+        """
+        points = np.radians(np.column_stack([lats, lons]).astype(float))
+        # Pad the radius so pairs on the boundary are kept, the exact
+        # distances are filtered again by the caller
+        radius = radius / (cn.EARTH_RADIUS_KM * cn.KM_TO_MILES) * (1 + 1e-9)
+        neighbors = self.tree.query_radius(points, radius)
+        origin = np.repeat(np.arange(len(points)), [len(places) for places in neighbors])
+        place = np.concatenate(list(neighbors) + [np.array([], dtype=np.intp)])
+        # Add the citywide places of every origin
+        origin = np.concatenate([origin, np.repeat(np.arange(len(points)), len(self.citywide))])
+        place = np.concatenate([place, np.tile(self.citywide, len(points))])
+        keys = np.unique(origin.astype(np.int64) * len(self.lats) + place)
+        return keys // len(self.lats), keys % len(self.lats)
+
+
+    def distance_frame(self, origin_df, threshold=True, radius=cn.PROXIMITY_THRESHOLD_MILES):
+        """
+        Inputs: origin_df (dataframe), blockgroups with their census lat/lon
+                threshold (Boolean), if True only keep places within the radius
+                    and citywide places, otherwise keep every place
+                radius (optional), in miles
+        Output: dataframe with one row per origin-place pair, in the format of
+                basket_calculator.origins_to_destinations
+        """
+        blockgroups = origin_df[cn.BLOCKGROUP].values
+        origin_lats = origin_df[cn.CENSUS_LAT].values.astype(float)
+        origin_lons = origin_df[cn.CENSUS_LON].values.astype(float)
+        if threshold:
+            origin, place = self.query_radius(origin_lats, origin_lons, radius)
+            distance = haversine(origin_lats[origin], origin_lons[origin],
+                                 self.lats[place], self.lons[place])
+            keep = (distance <= radius) | (self.classes[place] == cn.CITYWIDE)
+            origin, place, distance = origin[keep], place[keep], distance[keep]
+        else:
+            origin = np.repeat(np.arange(len(origin_df)), len(self.lats))
+            place = np.tile(np.arange(len(self.lats)), len(origin_df))
+            distance = haversine_matrix(origin_lats, origin_lons,
+                                        self.lats, self.lons).ravel()
+
+        dist_df = pd.DataFrame({
+            cn.BLOCKGROUP: blockgroups[origin],
+            cn.PAIR: pd.Series(blockgroups[origin]).astype(str).values + '-'
+                     + pd.Series(self.place_ids[place]).astype(str).values,
+            cn.DISTANCE: distance,
+            cn.CLASS: self.classes[place],
+            cn.GOOGLE_START_LAT: origin_lats[origin],
+            cn.GOOGLE_START_LON: origin_lons[origin],
+            cn.GOOGLE_END_LAT: self.lats[place],
+            cn.GOOGLE_END_LON: self.lons[place]})
+        return dist_df
@@ -3,17 +3,20 @@ import pandas as pd
 import constants as cn
 import data_accessor as daq
 from index_base_class import IndexBase
+import normalization as norm
 from math import sqrt
 
 class ReliabilityIndex(IndexBase):
 
-    def __init__(self, db_filepath, db_name):
+    def __init__(self, db_filepath, db_name, scaling=cn.MIN_MAX):
         """
         Constructor for Reliability Index. Users can access reliability scores.
-        Inputs: path to database file, database filename.
+        Inputs: path to database file, database filename, normalization method
+                for the scores (optional).
         """
         self.db_filepath = db_filepath
         self.db_name = db_name
+        self.scaling = scaling
         self.reliability_scores = self.get_score()
 
 
@@ -55,8 +58,7 @@ class ReliabilityIndex(IndexBase):
 
 
     def _scale_reliability_score(self, df):
-        df[cn.SCALED] = df.apply(lambda x: (x[cn.RATIO] - df[cn.RATIO].min()) /
-                (df[cn.RATIO].max() - df[cn.RATIO].min()), axis=1)
+        df = norm.scale_columns(df, [cn.RATIO], [cn.SCALED], self.scaling)
         df.columns = [cn.KEY, cn.RATIO, cn.SCALED]
         return df
 
@@ -0,0 +1,121 @@
+import init
+import itertools
+import numpy as np
+import pandas as pd
+import constants as cn
+
+
+class ThresholdSensitivity(object):
+    """
+    Answers how mode availability changes as the mode time thresholds move,
+    without rerunning the ModeChoiceCalculator for each point.
+
+    The durations of the trips are sorted once per (blockgroup, mode). The
+    availability ratio of a mode for any threshold is then the position of the
+    threshold in the sorted durations (a binary search) divided by the number
+    of trips. All (blockgroup, mode) groups live in one sorted array, so a
+    whole grid of thresholds is answered with a single searchsorted call.
+    """
+    def __init__(self, trips):
+        """
+        Input: trips (TripTable)
+        """
+        n_modes = len(cn.MODES)
+        self.origins = np.asarray(trips.origins, dtype=object)
+        n_groups = len(self.origins) * n_modes
+        keys = trips.origin.astype(np.int64) * n_modes + trips.mode
+        # Transit trips without a fare are never viable, whatever the threshold
+        duration = np.where((trips.mode == cn.MODE_CODES[cn.TRANSIT_MODE]) &
+                            (trips.fare == 0), np.inf, trips.duration)
+        # Replace durations by their rank among all durations, so that
+        # (group, duration) pairs can be sorted and searched as one integer key
+        self.durations, rank = np.unique(duration, return_inverse=True)
+        self.sorted_keys = np.sort(keys * len(self.durations) + rank.ravel())
+        self.counts = np.bincount(keys, minlength=n_groups).reshape(-1, n_modes)
+        self.starts = np.concatenate([[0], np.cumsum(self.counts.ravel())[:-1]]).reshape(-1, n_modes)
+        self.present = self.counts.sum(axis=1) > 0
+
+
+    def ratios(self, mode, thresholds):
+        """
+        Inputs:
+            mode (string), one of cn.MODES
+            thresholds (array of thresholds in minutes)
+        Output:
+            ratios (array, blockgroups x thresholds)
+
+        Ratio of trips with a duration strictly below each threshold, for
+        every blockgroup, as in ModeChoiceCalculator.is_viable.
+        """
+        code = cn.MODE_CODES[mode]
+        thresholds = np.atleast_1d(np.asarray(thresholds, dtype=float))
+        # Number of distinct durations below each threshold
+        rank = np.searchsorted(self.durations, thresholds, side='left')
+        groups = np.arange(len(self.origins), dtype=np.int64) * len(cn.MODES) + code
+        query = groups[:, np.newaxis] * len(self.durations) + rank[np.newaxis, :]
+        below = np.searchsorted(self.sorted_keys, query, side='left') \
+            - self.starts[:, code][:, np.newaxis]
+        counts = self.counts[:, code][:, np.newaxis]
+        return below / np.maximum(counts, 1)
+
+
+    def surface(self, grid=None):
+        """
+        Input: grid (dict, optional)
+                   keys: modes
+                   values: lists of thresholds to evaluate
+               Defaults to the thresholds in constants.py for every mode.
+        Output: tidy dataframe with columns block_group, mode, threshold, ratio
+        """
+        if grid is None:
+            grid = self._default_grid()
+        dfs = []
+        for mode, thresholds in grid.items():
+            thresholds = np.atleast_1d(np.asarray(thresholds, dtype=float))
+            ratios = self.ratios(mode, thresholds)[self.present]
+            origins = self.origins[self.present]
+            dfs.append(pd.DataFrame({
+                cn.BLOCK_GROUP: np.repeat(origins, len(thresholds)),
+                cn.MODE: mode,
+                cn.THRESHOLD: np.tile(thresholds, len(origins)),
+                cn.RATIO: ratios.ravel()}))
+        return pd.concat(dfs, ignore_index=True)
+
+
+    def index_surface(self, car_thresholds=None, bike_thresholds=None,
+                      transit_thresholds=None, walk_thresholds=None):
+        """
+        Inputs: lists of thresholds for each mode, defaulting to the single
+                threshold in constants.py
+        Output: tidy dataframe with one row per blockgroup and combination of
+                thresholds, with the four threshold columns and mode_index
+
+        The mode index is the unweighted mean of the four mode ratios, as in
+        ModeChoiceCalculator.create_availability_df.
+        """
+        thresholds = self._default_grid()
+        for mode, values in zip(cn.MODES, [car_thresholds, bike_thresholds,
+                                           transit_thresholds, walk_thresholds]):
+            if values is not None:
+                thresholds[mode] = np.atleast_1d(np.asarray(values, dtype=float))
+        # blockgroups x car x bike x transit x walk
+        index = 0
+        for axis, mode in enumerate(cn.MODES):
+            shape = [-1, 1, 1, 1, 1]
+            shape[axis + 1] = len(thresholds[mode])
+            index = index + self.ratios(mode, thresholds[mode])[self.present].reshape(shape)
+        index = index / len(cn.MODES)
+
+        combos = np.array(list(itertools.product(*[thresholds[mode] for mode in cn.MODES])))
+        origins = self.origins[self.present]
+        df = pd.DataFrame(np.tile(combos, (len(origins), 1)), columns=cn.MODE_THRESHOLDS)
+        df.insert(0, cn.BLOCK_GROUP, np.repeat(origins, len(combos)))
+        df[cn.MODE_CHOICE_INDEX] = index.ravel()
+        return df
+
+
+    def _default_grid(self):
+        return {cn.DRIVING_MODE: np.array([cn.CAR_TIME_THRESHOLD], dtype=float),
+                cn.BIKING_MODE: np.array([cn.BIKE_TIME_THRESHOLD], dtype=float),
+                cn.TRANSIT_MODE: np.array([cn.TRANSIT_TIME_THRESHOLD], dtype=float),
+                cn.WALKING_MODE: np.array([cn.WALK_TIME_THRESHOLD], dtype=float)}
@@ -1,9 +1,37 @@
 import init
+import json
 import os
 import constants as cn
 import pandas as pd
 import data_accessor as daq
-from geocoder import Geocoder
+from geocoder_registry import get_geocoder_registry
+
+# Columns shared by the output of every mode
+PLACE_COLUMNS = [cn.DEST_BLOCK_GROUP, cn.DESTINATION, cn.LAT, cn.LON, cn.NBHD_LONG,
+                 cn.NBHD_SHORT, cn.COUNCIL_DISTRICT, cn.URBAN_VILLAGE, cn.ZIPCODE,
+                 cn.ADDRESS, cn.CLASS, cn.TYPE, cn.CITY, cn.RATING]
+# Export file and output columns of each mode, keyed by the name of its output
+MODE_EXPORTS = {'driving': 'dynamo_out_driving.csv',
+                'transit': 'dynamo_out_transit.csv',
+                'biking': 'dynamo_out_bicycling.csv',
+                'walking': 'dynamo_out_walking.csv'}
+MODE_COLUMNS = {'driving': [cn.BLOCK_GROUP, cn.MODE, cn.DEPARTURE_TIME, cn.DISTANCE, cn.DURATION,
+                            cn.DURATION_IN_TRAFFIC] + PLACE_COLUMNS,
+                'transit': [cn.BLOCK_GROUP, cn.MODE, cn.FARE, cn.DEPARTURE_TIME, cn.DISTANCE,
+                            cn.DURATION] + PLACE_COLUMNS,
+                'biking': [cn.BLOCK_GROUP, cn.MODE, cn.DEPARTURE_TIME, cn.DISTANCE,
+                           cn.DURATION] + PLACE_COLUMNS,
+                'walking': [cn.BLOCK_GROUP, cn.MODE, cn.DEPARTURE_TIME, cn.DISTANCE,
+                            cn.DURATION] + PLACE_COLUMNS}
+# Columns of the combined output of every mode, in MODE_EXPORTS order
+COMBINED_COLUMNS = list(dict.fromkeys(column for mode in MODE_EXPORTS
+                                      for column in MODE_COLUMNS[mode]))
+# Geocoded attributes of the destinations
+GEOCODED_COLUMNS = [cn.DEST_BLOCK_GROUP, cn.NBHD_LONG, cn.NBHD_SHORT, cn.COUNCIL_DISTRICT,
+                    cn.URBAN_VILLAGE, cn.ZIPCODE]
+# Column of the export a row came from, in ConvertDynamodbModes
+EXPORT = 'export'
+
 
 class ConvertDynamodb(object):
     def __init__(self):
@@ -12,14 +40,35 @@ class ConvertDynamodb(object):
 
     def _read_dynamodb_outfile(self, dynamodb_csv, dynamodb_dir=cn.DYNAMODB_OUT_DIR):
         df = pd.read_csv(os.path.join(dynamodb_dir, dynamodb_csv))
-        df = df[df.status == 'OK']
-        df.drop(columns = ['status'], inplace=True)
-        df[cn.BLOCK_GROUP] = df.apply(lambda x: x['tripID'].split('++')[0], axis=1)
-        df[cn.DESTINATION] = df.apply(lambda x: x['tripID'].split('++')[1], axis=1)
-        df[cn.DEPARTURE_TIME] = df.apply(lambda x: daq.format_time(x[cn.DEPARTURE_TIME]), axis=1)
+        df = df[df.status == 'OK'].drop(columns = ['status'])
+        # tripID is blockgroup++destination++departure time
+        trip = df['tripID'].astype(str).str.split('++', n=2, expand=True, regex=False)
+        # An export without OK rows splits into no columns
+        trip = trip.reindex(columns=range(3))
+        df[cn.BLOCK_GROUP] = trip[0]
+        df[cn.DESTINATION] = trip[1]
+        df[cn.DEPARTURE_TIME] = self._parse_departure_times(df[cn.DEPARTURE_TIME])
         return df.drop_duplicates().reset_index()
 
 
+    def _parse_departure_times(self, times):
+        """
+        Input: departure times (Series of strings) with a UTC offset
+        Output: local times without offset or microseconds, as
+                data_accessor.format_time
+        """
+        times = times.astype(str)
+        parsed = pd.to_datetime(times.str.slice(0, 19), format='%Y-%m-%d %H:%M:%S',
+                                errors='coerce')
+        # Times in any other format are parsed one by one
+        other = parsed.isna()
+        if other.any():
+            parsed = parsed.astype(object)
+            parsed[other] = times[other].apply(daq.format_time)
+            parsed = pd.to_datetime(parsed)
+        return parsed
+
+
     def _drop_repeat_destinations(self, df):
         mask = df.place_id.duplicated(keep='last')
         return df[~mask]
@@ -34,22 +83,46 @@ class ConvertDynamodb(object):
         df.rename(columns={'name': cn.DESTINATION, 'lng': cn.LON}, inplace=True)
         return df
 
-    def _chunker(self, df, chunks):
-        size = len(df) // chunks
+    def _chunker(self, df, size):
+        """
+        Input: dataframe, size, maximum rows of a chunk
+        Output: generator of the chunks of the dataframe
+        """
+        size = max(1, int(size))
         return (df[pos:pos + size] for pos in range(0, len(df), size))
 
-    def _get_blockgroup(self, df):
-        geo = Geocoder()
+    def _get_blockgroup(self, df, geocoder=None):
+        """
+        Inputs: dataframe of trips with destination lat, lon
+                geocoder (optional), defaults to the warm geocoder of the
+                process
+        Output: dataframe of trips with the geocoded attributes of their
+                destination
+        """
+        if geocoder is None:
+            geocoder = get_geocoder_registry().geocoder
+        # Each destination point is geocoded once, however many trips go there:
+        # trips get the integer code of their point, points are numbered in
+        # order of first appearance. ngroup leaves trips without coordinates
+        # out of every group (NaN); they get code -1, which is no point.
+        codes = df.groupby([cn.LAT, cn.LON], sort=False, dropna=True).ngroup()
+        codes = codes.fillna(-1).astype(int)
+        first = codes[codes >= 0].drop_duplicates().index
+        # The index of the points is their code, kept by the geocoder
+        points = df.loc[first, [cn.LAT, cn.LON]].reset_index(drop=True)
         temp = []
-        for chunk in self._chunker(df, 250):
-            coords = chunk.loc[:, (cn.LAT, cn.LON)]
-            blkgrps = geo.geocode_df(coords)
-            blkgrps.columns = [cn.LAT, cn.LON, cn.DEST_BLOCK_GROUP, cn.NBHD_LONG, cn.NBHD_SHORT,
-                               cn.COUNCIL_DISTRICT, cn.URBAN_VILLAGE, cn.ZIPCODE]
-            temp.append(pd.merge(chunk, blkgrps, left_on=[cn.LAT, cn.LON],
-                right_on=[cn.LAT, cn.LON], how='left').drop_duplicates())
-        df = pd.concat(temp, sort=False).reset_index()
-        return df
+        for chunk in self._chunker(points, cn.GEOCODE_CHUNK_SIZE):
+            blkgrps = geocoder.geocode_df(chunk.copy())
+            blkgrps.columns = [cn.LAT, cn.LON] + GEOCODED_COLUMNS
+            temp.append(blkgrps.drop(columns=[cn.LAT, cn.LON]))
+        if temp:
+            attributes = pd.concat(temp, sort=False)
+            attributes = attributes[~attributes.index.duplicated()]
+        else:
+            attributes = pd.DataFrame(columns=GEOCODED_COLUMNS)
+        attributes = attributes.reindex(codes.to_numpy())
+        attributes.index = df.index
+        return pd.concat([df, attributes], axis=1).reset_index(drop=True)
 
     def _process_dynamodb(self, dynamodb_csv, dynamodb_dir=cn.DYNAMODB_OUT_DIR):
         df = self._read_dynamodb_outfile(dynamodb_csv, dynamodb_dir)
@@ -73,10 +146,7 @@ class ConvertDynamodbDriving(ConvertDynamodb):
 
     def _process_dynamodb_driving(self, dynamodb_csv, dynamodb_dir=cn.DYNAMODB_OUT_DIR):
         df = self._process_dynamodb(dynamodb_csv, dynamodb_dir)
-        df = df[[cn.BLOCK_GROUP, cn.MODE, cn.DEPARTURE_TIME, cn.DISTANCE, cn.DURATION,
-            cn.DURATION_IN_TRAFFIC, cn.DEST_BLOCK_GROUP, cn.DESTINATION, cn.LAT, cn.LON,
-            cn.NBHD_LONG, cn.NBHD_SHORT,cn.COUNCIL_DISTRICT, cn.URBAN_VILLAGE, cn.ZIPCODE,
-            cn.ADDRESS, cn.CLASS, cn.TYPE, cn.CITY, cn.RATING]]
+        df = df[MODE_COLUMNS['driving']]
         return df
 
 
@@ -87,10 +157,7 @@ class ConvertDynamodbTransit(ConvertDynamodb):
 
     def _process_dynamodb_transit(self, dynamodb_csv, dynamodb_dir=cn.DYNAMODB_OUT_DIR):
         df = self._process_dynamodb(dynamodb_csv, dynamodb_dir)
-        df = df[[cn.BLOCK_GROUP, cn.MODE, cn.FARE, cn.DEPARTURE_TIME, cn.DISTANCE, cn.DURATION,
-            cn.DEST_BLOCK_GROUP, cn.DESTINATION, cn.LAT, cn.LON, cn.NBHD_LONG, cn.NBHD_SHORT,
-            cn.COUNCIL_DISTRICT, cn.URBAN_VILLAGE, cn.ZIPCODE, cn.ADDRESS, cn.CLASS, cn.TYPE,
-            cn.CITY, cn.RATING]]
+        df = df[MODE_COLUMNS['transit']]
         return df
 
 
@@ -101,10 +168,7 @@ class ConvertDynamodbBiking(ConvertDynamodb):
 
     def _process_dynamodb_biking(self, dynamodb_csv, dynamodb_dir=cn.DYNAMODB_OUT_DIR):
         df = self._process_dynamodb(dynamodb_csv, dynamodb_dir)
-        df = df[[cn.BLOCK_GROUP, cn.MODE, cn.DEPARTURE_TIME, cn.DISTANCE, cn.DURATION,
-            cn.DEST_BLOCK_GROUP, cn.DESTINATION, cn.LAT, cn.LON, cn.NBHD_LONG, cn.NBHD_SHORT,
-            cn.COUNCIL_DISTRICT, cn.URBAN_VILLAGE, cn.ZIPCODE, cn.ADDRESS, cn.CLASS, cn.TYPE,
-            cn.CITY, cn.RATING]]
+        df = df[MODE_COLUMNS['biking']]
         return df
 
 
@@ -115,8 +179,171 @@ class ConvertDynamodbWalking(ConvertDynamodb):
 
     def _process_dynamodb_walking(self, dynamodb_csv, dynamodb_dir=cn.DYNAMODB_OUT_DIR):
         df = self._process_dynamodb(dynamodb_csv, dynamodb_dir)
-        df = df[[cn.BLOCK_GROUP, cn.MODE, cn.DEPARTURE_TIME, cn.DISTANCE, cn.DURATION,
-            cn.DEST_BLOCK_GROUP, cn.DESTINATION, cn.LAT, cn.LON, cn.NBHD_LONG, cn.NBHD_SHORT,
-            cn.COUNCIL_DISTRICT, cn.URBAN_VILLAGE, cn.ZIPCODE, cn.ADDRESS, cn.CLASS, cn.TYPE,
-            cn.CITY, cn.RATING]]
-        return df
\ No newline at end of file
+        df = df[MODE_COLUMNS['walking']]
+        return df
+
+
+class ConvertDynamodbModes(ConvertDynamodb):
+    """
+    Converts the exports of every mode in one run: the exports are read into
+    one dataframe, so the place merge and the geocoding run once for all
+    modes.
+    """
+    def __init__(self, dynamodb_csvs=MODE_EXPORTS, dynamodb_dir=cn.DYNAMODB_OUT_DIR):
+        """
+        Inputs: dynamodb_csvs (optional), dict of the export file of each
+                mode, keyed by the name of its output
+                dynamodb_dir (optional), directory of the exports
+        """
+        self.dataframes = self._process_dynamodb_modes(dynamodb_csvs, dynamodb_dir)
+
+
+    def _process_dynamodb_modes(self, dynamodb_csvs, dynamodb_dir=cn.DYNAMODB_OUT_DIR):
+        """
+        Output: dict of the converted dataframe of each mode
+        """
+        frames = {mode: self._read_dynamodb_outfile(dynamodb_csv, dynamodb_dir)
+                  for mode, dynamodb_csv in dynamodb_csvs.items()}
+        return self._convert_modes(frames)
+
+
+    def _convert_modes(self, frames):
+        """
+        Input: dict of the export dataframe of each mode, as read by
+               _read_dynamodb_outfile
+        Output: dict of the converted dataframe of each mode
+        """
+        if all(df.empty for df in frames.values()):
+            return {mode: pd.DataFrame(columns=MODE_COLUMNS[mode]) for mode in frames}
+        df = pd.concat([df.assign(**{EXPORT: mode}) for mode, df in frames.items()],
+                       ignore_index=True, sort=False)
+        df = self._merge_place_data(df)
+        df = self._get_blockgroup(df)
+        return {mode: df.loc[df[EXPORT] == mode, MODE_COLUMNS[mode]].reset_index(drop=True)
+                for mode in frames}
+
+
+class ConvertDynamodbIncremental(ConvertDynamodbModes):
+    """
+    Converts only the rows collected since the last run. The watermark of a
+    mode is the latest departure time converted, with the tripIDs converted
+    at that time; rows after it, or at it with another tripID, are new. Rows
+    of a collection run still being written when the export was taken are
+    therefore converted on a later run, whatever their tripID. The converted
+    rows are appended to the csv file of their mode, then the watermarks move
+    forward.
+
+    To convert the new rows and append them, call:
+    - ConvertDynamodbIncremental().append_to_csv()
+    A crash between the append and the watermark update converts the rows
+    again on the next run, so rows are appended at least once.
+    """
+    def __init__(self, dynamodb_csvs=MODE_EXPORTS, dynamodb_dir=cn.DYNAMODB_OUT_DIR,
+                 watermark_fp=cn.CONVERT_WATERMARK_FP):
+        """
+        Inputs: dynamodb_csvs (optional), dict of the export file of each
+                mode, keyed by the name of its output
+                dynamodb_dir (optional), directory of the exports
+                watermark_fp (optional), json file of the watermarks
+        """
+        self.watermark_fp = watermark_fp
+        self.watermarks = self.read_watermarks()
+        self.new_watermarks = {}
+        frames = {}
+        for mode, dynamodb_csv in dynamodb_csvs.items():
+            df = self._read_dynamodb_outfile(dynamodb_csv, dynamodb_dir)
+            watermark = self.watermarks.get(mode)
+            df = self._after_watermark(df, watermark)
+            if not df.empty:
+                self.new_watermarks[mode] = self._next_watermark(df, watermark)
+            frames[mode] = df
+        self.dataframes = self._convert_modes(frames)
+
+
+    def read_watermarks(self):
+        """
+        Output: dict of the watermark of each mode, empty before the first run
+        """
+        if not os.path.exists(self.watermark_fp):
+            return {}
+        with open(self.watermark_fp) as f:
+            return json.load(f)
+
+
+    def _after_watermark(self, df, watermark):
+        """
+        Inputs: export dataframe of a mode, watermark of the mode (or None)
+        Output: rows of the dataframe after the watermark
+        """
+        if not watermark:
+            return df
+        time = pd.Timestamp(watermark[cn.DEPARTURE_TIME])
+        newer = ((df[cn.DEPARTURE_TIME] > time) |
+                 ((df[cn.DEPARTURE_TIME] == time) & ~df['tripID'].isin(watermark['tripIDs'])))
+        return df[newer]
+
+
+    def _next_watermark(self, df, watermark):
+        """
+        Inputs: new rows of a mode, not empty, watermark of the mode (or None)
+        Output: watermark past the new rows
+        """
+        last = df[cn.DEPARTURE_TIME].max()
+        trip_ids = df.loc[df[cn.DEPARTURE_TIME] == last, 'tripID'].tolist()
+        # Late rows of the watermark time add to the tripIDs converted at it
+        if watermark and pd.Timestamp(watermark[cn.DEPARTURE_TIME]) == last:
+            trip_ids += watermark['tripIDs']
+        return {cn.DEPARTURE_TIME: str(last), 'tripIDs': sorted(set(trip_ids))}
+
+
+    def append_to_csv(self, output_file=cn.GOOGLE_DIST_MATRIX_OUT, processed_dir=cn.CSV_DIR,
+                      combined=False):
+        """
+        Append the converted rows of each mode to <output_file>_<mode>.csv,
+        creating the file of every mode, then save the new watermarks.
+        Inputs: output_file (optional), prefix of the csv files
+                processed_dir (optional), directory of the csv files
+                combined (optional), also append the rows of every mode to
+                <output_file>.csv, in COMBINED_COLUMNS
+        Output: dict of the number of rows appended for each mode
+        """
+        appended = {}
+        for mode, df in self.dataframes.items():
+            appended[mode] = len(df)
+            self._append(df, os.path.join(processed_dir, output_file + '_' + mode + '.csv'))
+        if combined:
+            self._append(self.combined(), os.path.join(processed_dir, output_file + '.csv'))
+        self.write_watermarks()
+        return appended
+
+
+    def combined(self):
+        """
+        Output: dataframe of the converted rows of every mode, in
+                COMBINED_COLUMNS
+        """
+        return pd.concat([df.reindex(columns=COMBINED_COLUMNS)
+                          for df in self.dataframes.values()], ignore_index=True, sort=False)
+
+
+    def _append(self, df, fp):
+        """
+        Append the rows to a csv file, with the header when the file is new.
+        A file without rows yet gets only the header.
+        """
+        if df.empty and os.path.exists(fp):
+            return
+        df.to_csv(fp, mode='a', header=not os.path.exists(fp), index=False)
+
+
+    def write_watermarks(self):
+        """
+        Save the watermarks moved past the converted rows. The file is
+        replaced in one step, so it is never left half written.
+        """
+        self.watermarks.update(self.new_watermarks)
+        self.new_watermarks = {}
+        tmp_fp = self.watermark_fp + '.tmp'
+        with open(tmp_fp, 'w') as f:
+            json.dump(self.watermarks, f, indent=2, sort_keys=True)
+        os.replace(tmp_fp, self.watermark_fp)
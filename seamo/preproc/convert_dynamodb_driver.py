@@ -1,30 +1,27 @@
 import init
-import pandas as pd
+import os
+import sys
 import convert_dynamodb
 import data_accessor as daq
 import constants as cn
 
-driving = convert_dynamodb.ConvertDynamodbDriving()
-car = driving.dataframe
-driving.write_to_csv(car, cn.GOOGLE_DIST_MATRIX_OUT + '_driving')
-print('driving done')
+# With --incremental, only the rows collected since the last run are
+# converted and appended. Otherwise every row is converted again.
+incremental = '--incremental' in sys.argv[1:]
+if not incremental and os.path.exists(cn.CONVERT_WATERMARK_FP):
+    os.remove(cn.CONVERT_WATERMARK_FP)
 
-transit = convert_dynamodb.ConvertDynamodbTransit()
-train = transit.dataframe
-transit.write_to_csv(train, cn.GOOGLE_DIST_MATRIX_OUT + '_transit')
-print('transit done')
-
-biking = convert_dynamodb.ConvertDynamodbBiking()
-bike = biking.dataframe
-biking.write_to_csv(bike, cn.GOOGLE_DIST_MATRIX_OUT + '_biking')
-print('biking done')
-
-walking = convert_dynamodb.ConvertDynamodbWalking()
-walk = walking.dataframe
-walking.write_to_csv(walk, cn.GOOGLE_DIST_MATRIX_OUT + '_walking')
-print('walking done')
-
-
-df = pd.concat([car, train, bike, walk], sort=False)
-daq.write_to_csv(df, cn.GOOGLE_DIST_MATRIX_OUT + '.csv')
-print('done')
\ No newline at end of file
+# All modes are converted in one run, sharing the place merge and geocoding
+modes = convert_dynamodb.ConvertDynamodbIncremental()
+if incremental:
+    # The new rows are appended to the combined file too, so a refresh only
+    # writes the rows it converted
+    for mode, rows in modes.append_to_csv(combined=True).items():
+        print(mode + ' done, {0} rows appended'.format(rows))
+else:
+    for mode, df in modes.dataframes.items():
+        modes.write_to_csv(df, cn.GOOGLE_DIST_MATRIX_OUT + '_' + mode)
+        print(mode + ' done')
+    modes.write_watermarks()
+    daq.write_to_csv(modes.combined(), cn.GOOGLE_DIST_MATRIX_OUT + '.csv')
+print('done')
@@ -1,144 +1,139 @@
 # coding: utf-8
 """
 Google Time and Distance Collector
- 
+
 This script accesses the Google Distance Matrix API to download distance
 and travel times, given a datafile that contains origins and destinations.
 
-The script is intended to be run in AWS Lambda using only Python native
-libraries. Environmental variables for AWS services and the Google API
-are required.
+The script is intended to be run in AWS Lambda. Environmental variables
+for AWS services and the Google API are required. The Lambda package holds
+this script with init.py, constants.py, seamo_exceptions.py,
+distance_matrix_client.py, trip_sinks.py and od_cache.py at its root, and
+numpy (imported by constants.py) and python-dateutil; boto3 comes with the
+Lambda runtime. Outside a seamo checkout init.py finds no seamo directory,
+and the modules are imported from the root of the package.
+
+The data are saved to the AWS DynamoDB table "seamo". Rows are grouped by
+origin into matrix requests, and the results are saved with batch writes.
+Set SEAMO_SINK=sqlite and SINK_DB_FP to save them to a local SQLite file
+instead.
 
-The data are saved to the AWS DynamoDB table "seamo".
+Each run samples the travel times of its hour, so responses are not cached
+by default. Set OD_CACHE_DB_FP to a writable file to read repeated trips of
+the same hour from an OD cache, e.g. when rerunning a failed hour.
 
-We are implementing a Cloudwatch trigger with the cron script: 
+We are implementing a Cloudwatch trigger with the cron script:
 cron(0 3-16 * * ? *), which has been adjusted for the Los_Angeles time zone
 """
 
 # Libraries for API ETL
-import json
+import init
 import os
-from urllib.request import Request, urlopen
 import csv
+import time
 from datetime import datetime
 from dateutil import tz
 
-# Libraries for AWS services
-import boto3
-import decimal
+import constants as cn
+from od_cache import ODCache
+from distance_matrix_client import DistanceMatrixClient
+from trip_sinks import DynamoDBSink, SQLiteSink
 
 # API constants
 DIST_MATRIX_URL = 'https://maps.googleapis.com/maps/api/distancematrix/json?'
 UNITS = 'imperial'
 MODE = 'driving'
+TRIPS_FP = './data/GoogleMatrix_Trips_In.csv'
 
 
-API_KEY = os.environ['API_KEY']
-
 def lambda_handler(event, context):
-    # TODO implement
-    return 'Hello from Lambda'
-    
-# Get AWS service resource.
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-aws_access_key_id = os.environ['aws_access_key_id'] 
-aws_secret_access_key = os.environ['aws_secret_access_key'] 
-
-table = dynamodb.Table('seamo')
-
-# Load trip attributes filter
-f = open('./data/GoogleMatrix_Trips_In.csv')
-csv_f = csv.reader(f)
-
-# Access the Google Matrix API
-for row in csv_f:
-    
-    origin = str(row[4]) + "," + str(row[5])
-    destination = str(row[2]) + "," + str(row[3])
-    
-    url = DIST_MATRIX_URL +\
-              'units={0}'.format(UNITS) +\
-              '&mode={0}'.format(MODE) +\
-              '&origins={0}'.format(origin) +\
-              '&destinations={0}'.format(destination) +\
-              "&key={0}".format(API_KEY)
-    
-    request = Request(url)
-    try: 
-        response = urlopen(request).read()
-    except:
-        raise Exception("Couldn't open link.")  
-
-    data = json.loads(response)
-    
-    if data['status'] != 'OK':
-        message = data['error_message']
-        raise Exception(message)
-        
-        # Going to make a SeamoError type.
-    else:
-        elements = data['rows'][0]['elements']
-        element = elements[0]
-                
-        if element['status'] == 'OK':
-            distance = str(float(element['distance']['value'])/1609)
-            if 'fare' in element:
-                fare = element['fare']['value']
-            
-            if 'duration_in_traffic' in element:
-                duration_in_traffic = str(float(element['duration_in_traffic']['value'])/60)
-            
-            duration = str(float(element['duration']['value'])/60)
-            status = element['status']
-            mode = MODE
-
-            # convert from UTC to local time zone
-            from_zone = tz.gettz('UTC')
-            to_zone = tz.gettz('America/Los_Angeles')
-            utc = datetime.utcnow()
-            utc = utc.replace(tzinfo=from_zone)
-            local = utc.astimezone(to_zone)
-            departure_time = str(local)
-            tripID = "{0}++{1}".format(row[0],departure_time) 
-
-
-            # save to DynamoDB
-
-            if 'fare' in element:        
-                response = table.put_item(
-                    Item={
-                        'tripID': tripID,
-                        'mode': mode,
-                        'fare': decimal.Decimal(str(fare)),
-                        'duration': decimal.Decimal(str(duration)),
-                        'distance': decimal.Decimal(str(distance)),
-                        'departure_time': departure_time,
-                        'status': status
-                        }         
-                )
-    
-            if 'duration_in_traffic' in element:        
-                response = table.put_item(
-                    Item={
-                        'tripID': tripID,
-                        'mode': mode,
-                        'duration_in_traffic': decimal.Decimal(str(duration_in_traffic)),
-                        'duration': decimal.Decimal(str(duration)),
-                        'distance': decimal.Decimal(str(distance)),
-                        'departure_time': departure_time,
-                        'status': status
-                        }         
-                )
-
-                
-            if ('duration_in_traffic' not in element) & ('fare' not in element):        
-                response = table.put_item(
-                    Item={
-                        'tripID': tripID,
-                        'mode': mode,
-                        'duration': decimal.Decimal(str(duration)),
-                        'distance': decimal.Decimal(str(distance)),
-                        'departure_time': departure_time,
-                        'status': status
-                        }         
-                )
\ No newline at end of file
+    return main()
+
+
+def make_item(trip_id, element, mode, departure_time):
+    """
+    Input: trip id, Distance Matrix element, mode, local departure time
+    Output: DynamoDB item of the trip (dict), with the distance in miles and
+            durations in minutes
+    """
+    item = {'tripID': "{0}++{1}".format(trip_id, departure_time),
+            'mode': mode,
+            'duration': float(element['duration']['value'])/60,
+            'distance': float(element['distance']['value'])/1609,
+            'departure_time': departure_time,
+            'status': element['status']}
+    if 'fare' in element:
+        item['fare'] = element['fare']['value']
+    if 'duration_in_traffic' in element:
+        item['duration_in_traffic'] = float(element['duration_in_traffic']['value'])/60
+    return item
+
+
+def local_time():
+    # convert from UTC to local time zone
+    from_zone = tz.gettz('UTC')
+    to_zone = tz.gettz('America/Los_Angeles')
+    utc = datetime.utcnow()
+    utc = utc.replace(tzinfo=from_zone)
+    return str(utc.astimezone(to_zone))
+
+
+def collect(rows, client, sink, mode=MODE, report=print):
+    """
+    Input: rows of the trips file (lists: trip id, _, destination lat, lon,
+           origin lat, lon), DistanceMatrixClient, Sink, mode, function
+           called with the report
+    Output: number of items saved
+    """
+    start = time.time()
+    pairs = [(str(row[4]) + "," + str(row[5]), str(row[2]) + "," + str(row[3]))
+             for row in rows]
+    elements = client.elements(pairs)
+    departure_time = local_time()
+    items = [make_item(row[0], element, mode, departure_time)
+             for row, element in zip(rows, elements)
+             if element is not None and element['status'] == 'OK']
+    sink.write(items)
+    elapsed = time.time() - start
+    report('{0} of {1} trips saved in {2} requests and {3} batch writes, {4:.0f} items/s'.format(
+        len(items), len(rows), client.requests, sink.batches,
+        len(items) / elapsed if elapsed > 0 else float('inf')))
+    if client.cache is not None:
+        report(client.cache.report())
+    return len(items)
+
+
+def make_sink():
+    """
+    Output: sink chosen by the SEAMO_SINK environment variable, DynamoDB by
+            default
+    """
+    if os.environ.get('SEAMO_SINK', 'dynamodb') == 'sqlite':
+        return SQLiteSink(os.environ['SINK_DB_FP'])
+    return DynamoDBSink(cn.DYNAMODB_TABLE, cn.DYNAMODB_REGION)
+
+
+def make_cache():
+    """
+    Output: ODCache at the OD_CACHE_DB_FP environment variable, None when it
+            is not set
+    """
+    db_fp = os.environ.get('OD_CACHE_DB_FP')
+    if not db_fp:
+        return None
+    return ODCache(db_fp)
+
+
+def main():
+    # Load trip attributes filter
+    with open(TRIPS_FP) as f:
+        rows = list(csv.reader(f))
+    cache = make_cache()
+    client = DistanceMatrixClient(os.environ['API_KEY'], url=DIST_MATRIX_URL, mode=MODE,
+                                  departure_time=None, units=UNITS, error_log=None,
+                                  cache=cache)
+    return collect(rows, client, make_sink())
+
+
+if __name__ == "__main__":
+    main()
@@ -43,8 +43,11 @@ F = [1,2,3] # post office
 G = [1,2,3] # school
 H = [1,2,3] # cafe
 
+# Ranges of counts, in the order of BASKET_CATEGORIES
+BASKET_COUNT_RANGES = [AA, BB, A, B, C, D, E, F, G, H]
+
 # Cartesian product. Iterates through all possible basket combinations. 
-BASKET_COMBOS = itertools.product(AA, BB, A, B, C, D, E, F, G, H) 
+BASKET_COMBOS = itertools.product(*BASKET_COUNT_RANGES) 
 
 CLASS = 'class'
 RANK = 'rank'
@@ -69,6 +72,8 @@ DRIVE_THRESHOLD = 'driving_threshold'
 TRANSIT_THRESHOLD = 'transit_threshold'
 BIKE_THRESHOLD = 'biking_threshold'
 WALK_THRESHOLD = 'walking_threshold'
+# Persona threshold columns, in the order of MODES
+MODE_THRESHOLDS = [DRIVE_THRESHOLD, BIKE_THRESHOLD, TRANSIT_THRESHOLD, WALK_THRESHOLD]
 MODE = 'mode'
 TRIP_ID = 'trip_id'
 VIABLE = 'viable'
@@ -113,6 +118,10 @@ PARKING_COLUMNS = ['BLOCK_NBR', 'PARKING_CA', 'WKD_RATE1', 'WKD_RATE2', 'WKD_RAT
 NO_PARKING_ALLOWED = 'No Parking Allowed'
 RATE = 'rate'
 SCALED = 'scaled'
+# Score scaling methods
+MIN_MAX = 'min_max'
+Z_SCORE = 'z_score'
+PERCENTILE_RANK = 'percentile_rank'
 
 
 # geocode exception handling
@@ -151,12 +160,19 @@ BLOCKGROUP_PICKLE = 'blockgroup.pickle'
 BASKET_EVAL_PROX_MIN = 2.0 # miles
 BASKET_EVAL_PROX_MAX = 10.0 # miles
 PROXIMITY_THRESHOLD = 0.8 # 5-6 miles in lat-long coords
+PROXIMITY_THRESHOLD_MILES = 5.0 # miles, nearby destinations of an origin
+GEOCODE_CACHE_SIZE = 65536 # geocoded points kept in memory
+GEOCODE_CACHE_PRECISION = 5 # decimal places of lat/lon, about 1 meter
 METERS_TO_MILES = 1609
 KM_TO_MILES = 0.621371
 DEG_INTO_MILES = 69
 MIN_TO_HR = 60
 CITY_CENTER = [47.6062, -122.3321]
 EARTH_RADIUS_KM = 6373.0 # Approximate radius of Earth in km
+HAVERSINE_CHUNK_SIZE = 1000000 # distances computed at once
+BASKET_CUBE_CHUNK_SIZE = 250 # basket combinations evaluated at once
+BASKET_SHARD_SIZE = 2000 # basket combinations per checkpointed shard
+GEOCODE_CHUNK_SIZE = 1000 # points geocoded at once
 AAA_RATE = 0.56
 VOT_RATE = 14.10
 BIKE_RATE = 0.15
@@ -173,6 +189,34 @@ IMPERIAL_UNITS = 'imperial'
 GOOGLE_DIST_MATRIX_OUT = 'google_dist_matrix_out'
 TIMESTAMP = '1531933200' # Wednesday, July 18, 10AM UTC
 API_CALL_LIMIT = 100000
+API_ERROR_LOG = 'API_error.log'
+# Limits of a single Distance Matrix request
+DIST_MATRIX_MAX_ORIGINS = 25
+DIST_MATRIX_MAX_DESTINATIONS = 25
+DIST_MATRIX_MAX_ELEMENTS = 100
+# Client side limits of the batched Distance Matrix client
+DIST_MATRIX_ELEMENTS_PER_SECOND = 1000
+DIST_MATRIX_CONCURRENCY = 8
+DIST_MATRIX_RETRIES = 4
+DIST_MATRIX_BACKOFF = 0.5 # seconds, doubled on each retry
+DIST_MATRIX_TIMEOUT = 30 # seconds
+# Distance queue of main_basket_calculator
+DISTANCE_QUEUE_BATCH = 500 # pairs claimed at once
+DISTANCE_QUEUE_LEASE = 600 # seconds
+DISTANCE_QUEUE_MAX_ATTEMPTS = 3
+# Persistent cache of Distance Matrix responses
+OD_CACHE_TTL = 30 * 24 * 3600 # seconds
+OD_CACHE_MAX_ENTRIES = 1000000
+OD_CACHE_BUCKET_SECONDS = 3600 # departure times in the same hour share entries
+OD_CACHE_QUERY_SIZE = 500 # keys looked up per query
+# DynamoDB table of the time and distance collector
+DYNAMODB_TABLE = 'seamo'
+DYNAMODB_REGION = 'us-east-1'
+DYNAMODB_BATCH_SIZE = 25 # largest batch write
+# Parallel export of the DynamoDB tables
+DYNAMODB_SCAN_SEGMENTS = 8
+DYNAMODB_SCAN_PAGE_SIZE = 1000 # items per scan request
+DYNAMODB_EXPORT_FLUSH_ROWS = 50000 # items buffered by a worker
 
 # Google API and distance data column naming
 GOOGLE_PLACES_LAT = 'lat'
@@ -203,6 +247,9 @@ DRIVING_MODE = 'driving'
 TRANSIT_MODE = 'transit'
 BIKING_MODE = 'bicycling'
 WALKING_MODE = 'walking'
+# Order of modes in columnar trip data; a trip's mode code is its index here
+MODES = [DRIVING_MODE, BIKING_MODE, TRANSIT_MODE, WALKING_MODE]
+MODE_CODES = {mode: code for code, mode in enumerate(MODES)}
 # Seattle Census Data naming
 CENSUS_LAT = 'CT_LAT'
 CENSUS_LON = 'CT_LON'
@@ -233,6 +280,7 @@ DISTRICT6_PICKLE = 'parking_district6.pickle'
 DISTRICT7_PICKLE = 'parking_district7.pickle'
 PRIMARY_DISTRICT = 'PRIMARYDIS'
 PARKING_RATES_PICKLE = 'parking_rates.pickle'
+PSRC_FEATURES_PICKLE = 'psrc_features.pickle'
 
 #N
 
@@ -271,6 +319,8 @@ FASTEST = 'fastest'
 ADDITIONAL_TIME_COST = 'additional_time_cost'
 RELATIVE_COST = 'relative_cost'
 RELATIVE_SCALED = 'relative_scaled'
+AFFORDABILITY_COLUMNS = [KEY, COST, RELATIVE_COST, SCALED, RELATIVE_SCALED, AVG_DURATION,
+    FASTEST, DIRECT_COST, CHEAPEST]
 
 
 # Personas constants
@@ -361,6 +411,7 @@ CSV_DIR = os.path.join(PROCESSED_DIR, 'csv_files/')
 TEST_DIR = os.path.join(DATADIR, 'test/')
 GEN_SHAPEFILE_DIR = os.path.join(PROCESSED_DIR, 'shapefiles/')
 DYNAMODB_OUT_DIR = os.path.join(RAW_DIR + 'dynamodb_out/')
+DYNAMODB_EXPORT_DIR = os.path.join(DYNAMODB_OUT_DIR, 'export/')
 SEATTLE_GEOGRAPHIES_DB = 'seattle_geographies'
 
 # Filepaths
@@ -368,13 +419,16 @@ ORIGIN_FP = os.path.join(RAW_DIR, 'SeattleCensusBlocksandNeighborhoodCorrelation
 DEST_FP = os.path.join(RAW_DIR, 'GoogleMatrix_Places_Full.csv')
 GOOGLE_DIST_FP = os.path.join(RAW_DIR, 'GoogleMatrix_Dist_Out.csv')
 HAVERSINE_DIST_FP = os.path.join(CSV_DIR, 'haversine_distances.csv')
-DISTANCE_QUEUE_FP = os.path.join(CSV_DIR, 'distance_queue.csv')
+DISTANCE_QUEUE_DB_FP = os.path.join(PROCESSED_DIR, 'distance_queue.sqlite')
+OD_CACHE_DB_FP = os.path.join(PROCESSED_DIR, 'od_cache.sqlite')
+CONVERT_WATERMARK_FP = os.path.join(PROCESSED_DIR, 'convert_dynamodb_watermarks.json')
 API_DIST_FP = os.path.join(CSV_DIR, 'api_distances.csv')
 RANKED_DEST_FP = os.path.join(CSV_DIR, 'ranked_destinations.csv')
 BASKETS_FP = os.path.join(CSV_DIR, 'baskets.csv')
 INPUT_BASKETS_FP = os.path.join(CSV_DIR, 'input_baskets.csv')
 BASKET_COMBO_FP = os.path.join(CSV_DIR, 'basket_combinations.csv')
 MSES_FP = os.path.join(CSV_DIR, 'basket_mses.csv')
+BASKET_CHECKPOINT_DIR = os.path.join(PROCESSED_DIR, 'basket_search/')
 PSRC_FP = os.path.join(RAW_DIR, 'PSRC_full_final.csv')
 SEATTLE_BLOCK_GROUPS_FP = os.path.join(CSV_DIR, 'SeattleCensusBlockGroups.csv')
 WEEKDAY_MODE_CHOICE_FP = os.path.join(CSV_DIR, 'wkday_mode_avail.csv')
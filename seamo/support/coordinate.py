@@ -1,10 +1,11 @@
 import init
 import pandas as pd
-from math import sin, cos, sqrt, atan2, radians
-from geocoder import Geocoder
+from geocoder_registry import get_geocoder_registry
 import constants as cn
 import seamo_exceptions as se
 import data_accessor as daq
+from haversine import haversine
+from parking_rates import get_parking_rates
 
 class Coordinate:
     """
@@ -59,15 +60,9 @@ class Coordinate:
         return self
 
     def set_parking_cost(self):
-        parking_dict = daq.open_pickle(cn.PICKLE_DIR, cn.PARKING_RATES_PICKLE)
         if self.block_group == None:
             self.set_geocode()
-        try:
-            parking_dict[self.block_group]
-        except:
-            self.parking_cost = 0
-        else:
-            self.parking_cost = parking_dict[self.block_group]
+        self.parking_cost = get_parking_rates().rate_for(self.block_group)
         return self
 
 
@@ -80,33 +75,11 @@ class Coordinate:
         output: distance (float)
                 in miles
         """
-       
-        # This Coordinate 
-        lat1 = radians(self.lat)
-        lon1 = radians(self.lon)
-        # The Coordinate to calculate distance to
-        lat2 = radians(coordinate.lat)
-        lon2 = radians(coordinate.lon)
-
-        # Differences
-        diff_lon = lon2 - lon1
-        diff_lat = lat2 - lat1
-
-        # Solve for distance applying inverse Haversine
-        a = sin(diff_lat / 2)**2 + cos(lat1) * cos(lat2) * sin(diff_lon / 2)**2
-        c = 2 * atan2(sqrt(a), sqrt(1 - a))
-
-        distance = cn.EARTH_RADIUS_KM * c 
-        # Convert to miles
-        distance *= cn.KM_TO_MILES
-    
-        return distance
+        return haversine(self.lat, self.lon, coordinate.lat, coordinate.lon)
 
 
     def _geocode(self, lat, lon):
-        geo = Geocoder()
-        df = geo.geocode_point((float(lat), float(lon)))
-        # import pdb; pdb.set_trace()
+        df = get_geocoder_registry().geocode_point(lat, lon)
         self.block_group = df[cn.BLOCK_GROUP].item()
         self.neighborhood_long = df[cn.NBHD_LONG].item()
         self.neighborhood_short = df[cn.NBHD_SHORT].item()
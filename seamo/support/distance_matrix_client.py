@@ -0,0 +1,300 @@
+"""
+Batched client for the Google Distance Matrix API.
+
+Origin-destination pairs are packed into matrix requests within the limits of
+the API (origins, destinations and elements per request) instead of one
+request per pair. Requests are sent concurrently from an asyncio event loop
+over a pool of keep-alive connections, throttled by a token bucket on
+elements per second, and retried with exponential backoff when the API or the
+network fails. Errors are written to the error log once per run.
+
+Requests go through the standard library, without an HTTP package, so the
+client also runs in AWS Lambda; the package needs numpy, which constants.py
+imports (see google_time_and_distance_collector.py).
+
+To get the Distance Matrix elements of a list of (origin, destination) pairs,
+call:
+- DistanceMatrixClient(api_key).elements(pairs) from synchronous code
+- await DistanceMatrixClient(api_key).fetch(pairs) from a coroutine
+"""
+import init
+import asyncio
+import http.client
+import json
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+import constants as cn
+from seamo_exceptions import DistanceMatrixError
+
+# Statuses of a whole response worth retrying
+RETRYABLE_STATUSES = ['OVER_QUERY_LIMIT', 'UNKNOWN_ERROR']
+RETRYABLE_HTTP_STATUSES = [429, 500, 502, 503, 504]
+
+
+def pack_requests(pairs, max_origins=cn.DIST_MATRIX_MAX_ORIGINS,
+                  max_destinations=cn.DIST_MATRIX_MAX_DESTINATIONS,
+                  max_elements=cn.DIST_MATRIX_MAX_ELEMENTS):
+    """
+    Input: pairs (list of (origin, destination)), as strings
+    Output: list of (origins, destinations) of each request. Every pair is in
+            exactly one request; the destinations of an origin are split in
+            chunks, and origins with the same chunk share a request.
+    """
+    by_origin = OrderedDict()
+    for origin, destination in pairs:
+        by_origin.setdefault(origin, OrderedDict())[destination] = None
+    per_request = min(max_destinations, max_elements)
+    chunks = OrderedDict()
+    for origin, destinations in by_origin.items():
+        destinations = list(destinations)
+        for start in range(0, len(destinations), per_request):
+            chunk = tuple(destinations[start:start + per_request])
+            chunks.setdefault(chunk, []).append(origin)
+
+    requests = []
+    for destinations, origins in chunks.items():
+        n_origins = min(max_origins, max_elements // len(destinations))
+        for start in range(0, len(origins), n_origins):
+            requests.append((origins[start:start + n_origins], list(destinations)))
+    return requests
+
+
+class TokenBucket(object):
+    """
+    Token bucket shared by the coroutines of one event loop. Tokens are added
+    at a constant rate up to the capacity.
+    """
+    def __init__(self, rate, capacity=None):
+        """
+        Inputs: rate (tokens per second), capacity (optional), defaults to
+                the rate
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+
+    async def acquire(self, tokens=1):
+        """
+        Wait until the tokens are available and take them. Requests larger
+        than the capacity take the whole bucket.
+        """
+        tokens = min(tokens, self.capacity)
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return
+            await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+class DistanceMatrixClient(object):
+    def __init__(self, api_key=None, url=cn.DIST_MATRIX_URL, mode=cn.DRIVING_MODE,
+                 departure_time=cn.TIMESTAMP, units=cn.IMPERIAL_UNITS,
+                 elements_per_second=cn.DIST_MATRIX_ELEMENTS_PER_SECOND,
+                 concurrency=cn.DIST_MATRIX_CONCURRENCY, retries=cn.DIST_MATRIX_RETRIES,
+                 backoff=cn.DIST_MATRIX_BACKOFF, timeout=cn.DIST_MATRIX_TIMEOUT,
+                 error_log=cn.API_ERROR_LOG, cache=None):
+        """
+        Inputs:
+            api_key (string)
+            url (optional), Distance Matrix endpoint, e.g. a DistanceMatrixStub
+            mode, departure_time, units (optional), request parameters.
+                departure_time is left out when None.
+            elements_per_second (optional), rate of the token bucket
+            concurrency (optional), requests in flight and open connections
+            retries (optional), retries of a failed request
+            backoff (optional), seconds before the first retry, doubled after
+                each one
+            timeout (optional), socket timeout in seconds
+            error_log (optional), file the errors are appended to, None to
+                only keep them in self.errors
+            cache (ODCache, optional), read through for every pair
+        """
+        self.api_key = api_key
+        parts = urlsplit(url)
+        self.scheme = parts.scheme
+        self.netloc = parts.netloc
+        self.path = parts.path
+        self.mode = mode
+        self.departure_time = departure_time
+        self.params = [('units', units), ('mode', mode)]
+        if departure_time is not None:
+            self.params.append(('departure_time', departure_time))
+        self.elements_per_second = elements_per_second
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.error_log = error_log
+        self.cache = cache
+        self.max_origins = cn.DIST_MATRIX_MAX_ORIGINS
+        self.max_destinations = cn.DIST_MATRIX_MAX_DESTINATIONS
+        self.max_elements = cn.DIST_MATRIX_MAX_ELEMENTS
+        # guards the counters, updated from the worker threads
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+
+    def reset_stats(self):
+        self.requests = 0
+        self.retried = 0
+        self.connections = 0
+        self.errors = []
+
+
+    def elements(self, pairs):
+        """
+        Input: pairs (list of (origin, destination)), anything whose str() is
+               a location accepted by the API, e.g. Coordinate
+        Output: list of the Distance Matrix element of each pair (dict), None
+                when the request failed
+        Inside a running event loop (e.g. Jupyter), use
+        await client.fetch(pairs) instead.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.fetch(pairs))
+        raise RuntimeError('elements() cannot run inside a running event loop, '
+                           'use await client.fetch(pairs) instead')
+
+
+    async def fetch(self, pairs):
+        """
+        Coroutine version of elements().
+        """
+        pairs = [(str(origin), str(destination)) for origin, destination in pairs]
+        cached = {}
+        if self.cache is not None:
+            keys = {pair: self.cache.key(pair[0], pair[1], self.mode, self.departure_time)
+                    for pair in dict.fromkeys(pairs)}
+            found = self.cache.get_many(list(keys.values()))
+            cached = {pair: found[key] for pair, key in keys.items() if key in found}
+        requests = self._pack([pair for pair in pairs if pair not in cached])
+        if self.cache is not None:
+            self.cache.saved_requests += len(self._pack(pairs)) - len(requests)
+        results = {}
+        bucket = None
+        if self.elements_per_second:
+            bucket = TokenBucket(self.elements_per_second,
+                                 max(self.elements_per_second, self.max_elements))
+        # Each slot holds one keep-alive connection, and taking a slot bounds
+        # the requests in flight
+        slots = asyncio.Queue()
+        for _ in range(self.concurrency):
+            slots.put_nowait({'connection': None})
+        executor = ThreadPoolExecutor(self.concurrency)
+        errors = len(self.errors)
+        try:
+            await asyncio.gather(*[self._send(origins, destinations, results, bucket,
+                                              slots, executor)
+                                   for origins, destinations in requests])
+        finally:
+            executor.shutdown(wait=True)
+            while not slots.empty():
+                connection = slots.get_nowait()['connection']
+                if connection is not None:
+                    connection.close()
+            self._write_errors(self.errors[errors:])
+        if self.cache is not None:
+            self.cache.put_many({keys[pair]: element for pair, element in results.items()
+                                 if element['status'] == 'OK'})
+            results.update(cached)
+        return [results.get(pair) for pair in pairs]
+
+
+    def _pack(self, pairs):
+        return pack_requests(pairs, self.max_origins, self.max_destinations, self.max_elements)
+
+
+    async def _send(self, origins, destinations, results, bucket, slots, executor):
+        """
+        Send one matrix request, retrying it, and store its elements in
+        results keyed by (origin, destination).
+        """
+        loop = asyncio.get_running_loop()
+        query = self.params + [('origins', '|'.join(origins)),
+                               ('destinations', '|'.join(destinations)),
+                               ('key', self.api_key)]
+        path = self.path + '?' + urlencode(query)
+        for attempt in range(self.retries + 1):
+            if bucket is not None:
+                await bucket.acquire(len(origins) * len(destinations))
+            slot = await slots.get()
+            try:
+                data = await loop.run_in_executor(executor, self._get, slot, path)
+                break
+            except DistanceMatrixError as error:
+                if not error.retryable or attempt == self.retries:
+                    self._log(origins, destinations, error.message)
+                    return
+            finally:
+                slots.put_nowait(slot)
+            with self._lock:
+                self.retried += 1
+            await asyncio.sleep(self.backoff * 2**attempt * (1 + random.random()))
+
+        for origin, row in zip(origins, data['rows']):
+            for destination, element in zip(destinations, row['elements']):
+                results[(origin, destination)] = element
+                if element['status'] != 'OK':
+                    self.errors.append((origin, destination, element['status']))
+
+
+    def _get(self, slot, path):
+        """
+        Run in a worker thread. Send a request on the connection of the slot,
+        opening a new one if needed.
+        Output: decoded response, raises DistanceMatrixError on failure
+        """
+        if slot['connection'] is None:
+            connection_class = http.client.HTTPSConnection if self.scheme == 'https' \
+                else http.client.HTTPConnection
+            slot['connection'] = connection_class(self.netloc, timeout=self.timeout)
+            with self._lock:
+                self.connections += 1
+        with self._lock:
+            self.requests += 1
+        try:
+            slot['connection'].request('GET', path)
+            response = slot['connection'].getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException) as error:
+            slot['connection'].close()
+            slot['connection'] = None
+            raise DistanceMatrixError('URL open error: {0}'.format(error), retryable=True)
+        if response.status != 200:
+            raise DistanceMatrixError('HTTP error {0}'.format(response.status),
+                                      retryable=response.status in RETRYABLE_HTTP_STATUSES)
+        try:
+            data = json.loads(body)
+        except ValueError:
+            raise DistanceMatrixError('Invalid response.', retryable=True)
+        if data['status'] != 'OK':
+            raise DistanceMatrixError(data.get('error_message', data['status']),
+                                      retryable=data['status'] in RETRYABLE_STATUSES)
+        return data
+
+
+    def _log(self, origins, destinations, message):
+        for origin in origins:
+            for destination in destinations:
+                self.errors.append((origin, destination, message))
+
+
+    def _write_errors(self, errors):
+        """
+        Append the errors of a run to the error log, in one write.
+        """
+        if self.error_log is None or not errors:
+            return
+        with open(self.error_log, 'a+') as outf:
+            outf.write(''.join('{0} {1} {2}\n'.format(*error) for error in errors))
@@ -0,0 +1,188 @@
+"""
+Local stand-in for the Google Distance Matrix API, for offline tests and
+throughput benchmarks of the distance collection.
+
+The stub answers Distance Matrix requests on localhost with the haversine
+distance of each origin-destination pair and a duration at a constant speed.
+It keeps connections alive, enforces the limits of a single request, and can
+add latency and fail the first requests with OVER_QUERY_LIMIT.
+
+To run the stub, use it as a context manager:
+    with DistanceMatrixStub() as stub:
+        DistanceMatrixClient('key', url=stub.url).elements(pairs)
+
+Running this file benchmarks one request per pair against the batched client.
+"""
+import init
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from urllib.request import Request, urlopen
+import constants as cn
+from haversine import haversine
+
+STUB_PATH = '/maps/api/distancematrix/json'
+STUB_SPEED_MPH = 25.0
+METERS_PER_MILE = 1609.34
+
+
+class DistanceMatrixStub(object):
+    def __init__(self, latency=0.0, failures=0, host='127.0.0.1', port=0):
+        """
+        Inputs:
+            latency (optional), seconds added to every response
+            failures (optional), number of first requests answered with
+                OVER_QUERY_LIMIT
+            host, port (optional), port 0 picks a free port
+        """
+        self.latency = latency
+        self.failures = failures
+        self.requests = 0
+        self.elements = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return 'http://{0}:{1}{2}?'.format(host, port, STUB_PATH)
+
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self._thread.join()
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+    def respond(self, query):
+        """
+        Input: query parameters of a request (dict of lists)
+        Output: response of the Distance Matrix API (dict)
+        """
+        with self._lock:
+            self.requests += 1
+            failing = self.requests <= self.failures
+        if failing:
+            return {'status': 'OVER_QUERY_LIMIT',
+                    'error_message': 'You have exceeded your rate-limit for this API.'}
+        if 'key' not in query:
+            return {'status': 'REQUEST_DENIED',
+                    'error_message': 'You must use an API key to authenticate each request.'}
+        origins = query.get('origins', [''])[0].split('|')
+        destinations = query.get('destinations', [''])[0].split('|')
+        if len(origins) > cn.DIST_MATRIX_MAX_ORIGINS or \
+                len(destinations) > cn.DIST_MATRIX_MAX_DESTINATIONS:
+            return {'status': 'MAX_DIMENSIONS_EXCEEDED',
+                    'error_message': 'Too many origins or destinations.'}
+        if len(origins) * len(destinations) > cn.DIST_MATRIX_MAX_ELEMENTS:
+            return {'status': 'MAX_ELEMENTS_EXCEEDED',
+                    'error_message': 'Too many elements.'}
+        with self._lock:
+            self.elements += len(origins) * len(destinations)
+        return {'status': 'OK',
+                'origin_addresses': origins,
+                'destination_addresses': destinations,
+                'rows': [{'elements': [self._element(origin, destination)
+                                       for destination in destinations]}
+                         for origin in origins]}
+
+
+    def _element(self, origin, destination):
+        try:
+            start = [float(value) for value in origin.split(',')]
+            end = [float(value) for value in destination.split(',')]
+        except ValueError:
+            return {'status': 'NOT_FOUND'}
+        if len(start) != 2 or len(end) != 2:
+            return {'status': 'NOT_FOUND'}
+        miles = haversine(start[0], start[1], end[0], end[1])
+        seconds = miles / STUB_SPEED_MPH * 3600
+        return {'status': 'OK',
+                'distance': {'text': '{0:.1f} mi'.format(miles),
+                             'value': int(round(miles * METERS_PER_MILE))},
+                'duration': {'text': '{0:.0f} mins'.format(seconds / 60),
+                             'value': int(round(seconds))}}
+
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 keeps the connection open between requests
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                BaseHTTPRequestHandler.setup(self)
+                with stub._lock:
+                    stub.connections += 1
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                if parts.path != STUB_PATH:
+                    self.send_error(404)
+                    return
+                if stub.latency:
+                    time.sleep(stub.latency)
+                body = json.dumps(stub.respond(parse_qs(parts.query))).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=UTF-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def benchmark(n_origins=20, n_destinations=40, latency=0.02):
+    """
+    Compare one request per pair, as in basket_calculator.calculate_distance_API,
+    with the batched client, against a stub with the given latency.
+    Output: pairs per second of each (dict)
+    """
+    from distance_matrix_client import DistanceMatrixClient
+
+    origins = ['{0:.5f},{1:.5f}'.format(47.5 + i * 0.01, -122.4) for i in range(n_origins)]
+    destinations = ['{0:.5f},{1:.5f}'.format(47.6, -122.45 + j * 0.005)
+                    for j in range(n_destinations)]
+    pairs = [(origin, destination) for origin in origins for destination in destinations]
+    rates = {}
+    with DistanceMatrixStub(latency=latency) as stub:
+        start = time.time()
+        for origin, destination in pairs:
+            url = stub.url + 'origins={0}&destinations={1}&key=stub'.format(origin, destination)
+            json.loads(urlopen(Request(url)).read())
+        rates['one request per pair'] = len(pairs) / (time.time() - start)
+
+        client = DistanceMatrixClient('stub', url=stub.url, error_log=None)
+        start = time.time()
+        client.elements(pairs)
+        rates['batched client'] = len(pairs) / (time.time() - start)
+    return rates
+
+
+if __name__ == "__main__":
+    for name, rate in benchmark().items():
+        print('{0}: {1:.0f} pairs/s'.format(name, rate))
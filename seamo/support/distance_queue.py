@@ -0,0 +1,215 @@
+"""
+Durable work queue of the origin-destination pairs whose distance is fetched
+from the Google Distance Matrix API by main_basket_calculator.py.
+
+The queue is a SQLite table keyed by pair. Each pair is pending, in flight,
+done or failed. Workers claim batches of pending pairs under a lease; a pair
+whose lease expires (e.g. its worker crashed) is claimed again, so a crash
+loses at most the batch in flight. Claims are transactions, so any number of
+workers (threads or processes) can pull batches from the same file, and only
+the claimed rows are updated.
+
+To work through the queue, call:
+- enqueue(dist_df) with the pairs to fetch
+- claim(batch_size) for a batch, then complete(pairs, distances, lease) and
+  fail(pairs, lease) with its results, lease being the LEASE of the batch.
+  A worker whose lease expired updates nothing, so it cannot undo the work
+  of the worker that claimed its pairs again.
+- done_df() for the fetched distances
+"""
+import init
+import sqlite3
+import time
+from contextlib import closing
+import pandas as pd
+import constants as cn
+
+PENDING = 'pending'
+IN_FLIGHT = 'in_flight'
+DONE = 'done'
+FAILED = 'failed'
+STATES = [PENDING, IN_FLIGHT, DONE, FAILED]
+# Column of a claimed batch with the expiry time of its lease
+LEASE = 'lease_expires'
+
+# Columns of the pairs, as in basket_calculator.origins_to_destinations
+COLUMNS = [cn.BLOCKGROUP, cn.PAIR, cn.DISTANCE, cn.CLASS,
+           cn.GOOGLE_START_LAT, cn.GOOGLE_START_LON,
+           cn.GOOGLE_END_LAT, cn.GOOGLE_END_LON]
+
+
+class DistanceQueue(object):
+    def __init__(self, db_fp=cn.DISTANCE_QUEUE_DB_FP, lease_seconds=cn.DISTANCE_QUEUE_LEASE,
+                 max_attempts=cn.DISTANCE_QUEUE_MAX_ATTEMPTS):
+        """
+        Inputs:
+            db_fp (optional), path of the SQLite file
+            lease_seconds (optional), time a worker has to finish a batch
+                before its pairs are claimed again
+            max_attempts (optional), claims of a pair before it is failed
+                for good
+        """
+        self.db_fp = db_fp
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute("""CREATE TABLE IF NOT EXISTS pairs (
+                              pair TEXT PRIMARY KEY,
+                              blockgroup,
+                              class TEXT,
+                              start_lat REAL,
+                              start_lon REAL,
+                              end_lat REAL,
+                              end_lon REAL,
+                              distance REAL,
+                              state TEXT NOT NULL,
+                              attempts INTEGER NOT NULL DEFAULT 0,
+                              lease_expires REAL)""")
+            db.execute('CREATE INDEX IF NOT EXISTS pairs_state ON pairs (state, lease_expires)')
+
+
+    def _connect(self):
+        """
+        Output: new connection in autocommit mode; transactions are opened
+                explicitly. Each call gets its own connection, so a queue can
+                be shared by threads.
+        """
+        db = sqlite3.connect(self.db_fp, timeout=60, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        # Closing the connection rolls back a transaction left open by an error
+        return closing(db)
+
+
+    def enqueue(self, dist_df):
+        """
+        Input: dist_df (dataframe), pairs in the format of
+               basket_calculator.origins_to_destinations
+        Output: number of pairs added. Pairs already in the queue are left
+                as they are.
+        """
+        rows = zip(dist_df[cn.PAIR].astype(str), dist_df[cn.BLOCKGROUP].tolist(),
+                   dist_df[cn.CLASS].astype(str),
+                   dist_df[cn.GOOGLE_START_LAT].astype(float).tolist(),
+                   dist_df[cn.GOOGLE_START_LON].astype(float).tolist(),
+                   dist_df[cn.GOOGLE_END_LAT].astype(float).tolist(),
+                   dist_df[cn.GOOGLE_END_LON].astype(float).tolist())
+        with self._connect() as db:
+            db.execute('BEGIN IMMEDIATE')
+            before = db.total_changes
+            db.executemany("""INSERT OR IGNORE INTO pairs (pair, blockgroup, class, start_lat,
+                                  start_lon, end_lat, end_lon, state)
+                              VALUES (?, ?, ?, ?, ?, ?, ?, '{0}')""".format(PENDING), rows)
+            added = db.total_changes - before
+            db.execute('COMMIT')
+        return added
+
+
+    def claim(self, batch_size, now=None):
+        """
+        Inputs: batch_size, largest number of pairs to claim
+                now (optional), current time in seconds since the epoch
+        Output: dataframe of the claimed pairs, with their LEASE, empty when
+                nothing is left. Pending pairs are claimed first, then pairs
+                whose lease expired.
+        """
+        now = time.time() if now is None else now
+        lease = now + self.lease_seconds
+        with self._connect() as db:
+            db.execute('BEGIN IMMEDIATE')
+            # Expired leases that used up their attempts are failed for good
+            db.execute("""UPDATE pairs SET state = ?, lease_expires = NULL
+                          WHERE state = ? AND lease_expires <= ? AND attempts >= ?""",
+                       (FAILED, IN_FLIGHT, now, self.max_attempts))
+            rows = db.execute("""SELECT * FROM pairs
+                                 WHERE state = ? OR (state = ? AND lease_expires <= ?)
+                                 ORDER BY state = ?, rowid LIMIT ?""",
+                              (PENDING, IN_FLIGHT, now, IN_FLIGHT, batch_size)).fetchall()
+            db.executemany("""UPDATE pairs SET state = ?, lease_expires = ?,
+                                  attempts = attempts + 1 WHERE pair = ?""",
+                           [(IN_FLIGHT, lease, row['pair']) for row in rows])
+            db.execute('COMMIT')
+        df = self._to_df(rows)
+        df[LEASE] = lease
+        return df
+
+
+    def complete(self, pairs, distances, lease=None):
+        """
+        Inputs: pairs (list of strings) and their distances
+                lease (optional), LEASE of the batch of the pairs. Only pairs
+                still in flight under this lease are updated. Without it, the
+                pairs are updated whatever their state, to load distances
+                fetched outside the queue.
+        Output: number of pairs updated
+        """
+        with self._connect() as db:
+            db.execute('BEGIN IMMEDIATE')
+            before = db.total_changes
+            if lease is None:
+                db.executemany("""UPDATE pairs SET state = ?, distance = ?, lease_expires = NULL
+                                  WHERE pair = ?""",
+                               [(DONE, float(distance), str(pair))
+                                for pair, distance in zip(pairs, distances)])
+            else:
+                db.executemany("""UPDATE pairs SET state = ?, distance = ?, lease_expires = NULL
+                                  WHERE pair = ? AND state = ? AND lease_expires = ?""",
+                               [(DONE, float(distance), str(pair), IN_FLIGHT, float(lease))
+                                for pair, distance in zip(pairs, distances)])
+            updated = db.total_changes - before
+            db.execute('COMMIT')
+        return updated
+
+
+    def fail(self, pairs, lease):
+        """
+        Inputs: pairs (list of strings) whose distance could not be fetched.
+                They are claimed again until they use up their attempts.
+                lease, LEASE of the batch of the pairs. Only pairs still in
+                flight under this lease are updated.
+        Output: number of pairs updated
+        """
+        with self._connect() as db:
+            db.execute('BEGIN IMMEDIATE')
+            before = db.total_changes
+            db.executemany("""UPDATE pairs SET lease_expires = NULL,
+                                  state = CASE WHEN attempts >= ? THEN ? ELSE ? END
+                              WHERE pair = ? AND state = ? AND lease_expires = ?""",
+                           [(self.max_attempts, FAILED, PENDING, str(pair), IN_FLIGHT,
+                             float(lease)) for pair in pairs])
+            updated = db.total_changes - before
+            db.execute('COMMIT')
+        return updated
+
+
+    def counts(self):
+        """
+        Output: dict of the number of pairs in each state
+        """
+        with self._connect() as db:
+            counts = dict(db.execute('SELECT state, COUNT(*) FROM pairs GROUP BY state').fetchall())
+        return {state: counts.get(state, 0) for state in STATES}
+
+
+    def done_df(self):
+        """
+        Output: dataframe of the pairs with a distance, in the format of
+                basket_calculator.origins_to_destinations
+        """
+        with self._connect() as db:
+            rows = db.execute('SELECT * FROM pairs WHERE state = ? ORDER BY rowid',
+                              (DONE,)).fetchall()
+        return self._to_df(rows)
+
+
+    def _to_df(self, rows):
+        df = pd.DataFrame([tuple(row) for row in rows],
+                          columns=rows[0].keys() if rows else None)
+        if df.empty:
+            return pd.DataFrame(columns=COLUMNS)
+        df = df.rename(columns={'blockgroup': cn.BLOCKGROUP, 'class': cn.CLASS,
+                                'start_lat': cn.GOOGLE_START_LAT,
+                                'start_lon': cn.GOOGLE_START_LON,
+                                'end_lat': cn.GOOGLE_END_LAT, 'end_lon': cn.GOOGLE_END_LON})
+        return df[COLUMNS]
+
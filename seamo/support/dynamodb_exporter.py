@@ -0,0 +1,200 @@
+"""
+Parallel export of a DynamoDB table of collected trips to partitioned files.
+
+The table is read with a parallel scan: each of the segments is scanned page
+by page by a worker of a thread pool, following LastEvaluatedKey in a loop.
+The items of each worker are buffered and written to files partitioned by
+mode and departure date whenever the buffer is full, so memory stays bounded
+by the buffers of the workers whatever the size of the table:
+
+    <out_dir>/mode=<mode>/date=<YYYY-MM-DD>/part-<segment>-<n>.csv
+
+The files are csv by default. Parquet can be chosen where pyarrow or
+fastparquet is installed.
+
+boto3 resources are not thread safe, so each worker scans through its own
+Table, made by the table_factory of the exporter.
+
+Progress is reported in items scanned per second.
+
+To export a table and read it back, call:
+- DynamoDBExporter(table_name, out_dir).export()
+- read_export(out_dir, mode) for a dataframe of the exported items
+- export_files(out_dir, mode) to read the files one at a time instead
+"""
+import init
+import decimal
+import glob
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import constants as cn
+
+PARQUET = 'parquet'
+CSV = 'csv'
+
+
+def to_row(item):
+    """
+    Input: DynamoDB item (dict)
+    Output: item with its Decimal numbers as floats
+    """
+    return {name: float(value) if isinstance(value, decimal.Decimal) else value
+            for name, value in item.items()}
+
+
+def partition(row):
+    """
+    Input: row of a trip
+    Output: (mode, departure date) of the partition of the row
+    """
+    return str(row.get(cn.MODE)), str(row.get(cn.DEPARTURE_TIME))[:10]
+
+
+def export_files(out_dir, mode=None, file_format=CSV):
+    """
+    Inputs: directory of an export, mode (optional), only the partitions of
+            this mode when given, file_format (optional)
+    Output: sorted paths of the exported files
+    """
+    pattern = os.path.join(out_dir, 'mode={0}'.format(mode or '*'), 'date=*',
+                           '*.' + file_format)
+    return sorted(glob.glob(pattern))
+
+
+def read_part(path, file_format=CSV):
+    """
+    Inputs: path of an exported file, file_format (optional)
+    Output: dataframe of the items of the file
+    """
+    return pd.read_parquet(path) if file_format == PARQUET else pd.read_csv(path)
+
+
+def read_export(out_dir, mode=None, file_format=CSV):
+    """
+    Inputs: directory of an export, mode (optional), only the partitions of
+            this mode when given, file_format (optional)
+    Output: dataframe of the exported items
+    """
+    parts = [read_part(path, file_format) for path in export_files(out_dir, mode, file_format)]
+    if not parts:
+        return pd.DataFrame()
+    return pd.concat(parts, ignore_index=True, sort=False)
+
+
+class DynamoDBExporter(object):
+    def __init__(self, table_name, out_dir=cn.DYNAMODB_EXPORT_DIR,
+                 total_segments=cn.DYNAMODB_SCAN_SEGMENTS, max_workers=None,
+                 page_size=cn.DYNAMODB_SCAN_PAGE_SIZE, flush_rows=cn.DYNAMODB_EXPORT_FLUSH_ROWS,
+                 file_format=CSV, region_name=cn.DYNAMODB_REGION, table_factory=None,
+                 report=print):
+        """
+        Inputs:
+            table_name, name of the DynamoDB table
+            out_dir (optional), directory of the partitions, without an
+                earlier export of the same format
+            total_segments (optional), segments of the parallel scan
+            max_workers (optional), threads, defaults to one per segment
+            page_size (optional), items per scan request
+            flush_rows (optional), items buffered by a worker before they are
+                written
+            file_format (optional), CSV, or PARQUET where a Parquet engine is
+                installed
+            region_name (optional), AWS region
+            table_factory (optional), function returning a new boto3 Table
+                (or a stand-in), called once by each worker
+            report (optional), function called with the progress messages
+        """
+        if table_factory is None:
+            def table_factory():
+                import boto3
+                session = boto3.session.Session()
+                return session.resource('dynamodb', region_name=region_name).Table(table_name)
+        self.table_factory = table_factory
+        self.out_dir = out_dir
+        self.total_segments = total_segments
+        self.max_workers = max_workers or total_segments
+        self.page_size = page_size
+        self.flush_rows = flush_rows
+        self.file_format = file_format
+        self.report = report
+        self.scanned = 0
+        self.files = []
+        self._lock = threading.Lock()
+
+
+    def export(self):
+        """
+        Output: number of items exported
+        """
+        # Parts of an earlier export would be read back with the new ones
+        if export_files(self.out_dir, file_format=self.file_format):
+            raise ValueError('Export directory {0} already holds an export'.format(self.out_dir))
+        self.scanned = 0
+        self.files = []
+        self._start = time.time()
+        with ThreadPoolExecutor(self.max_workers) as pool:
+            for _ in pool.map(self._scan_segment, range(self.total_segments)):
+                pass
+        self.report('{0} items scanned in {1} segments, {2:.0f} items/s'.format(
+            self.scanned, self.total_segments, self._rate()))
+        return self.scanned
+
+
+    def _rate(self):
+        elapsed = time.time() - self._start
+        return self.scanned / elapsed if elapsed > 0 else float('inf')
+
+
+    def _scan_segment(self, segment):
+        """
+        Scan one segment page by page, writing its items as the buffer
+        fills.
+        """
+        table = self.table_factory()
+        buffer = []
+        parts = 0
+        start_key = None
+        while True:
+            kwargs = {'Segment': segment, 'TotalSegments': self.total_segments,
+                      'Limit': self.page_size}
+            if start_key is not None:
+                kwargs['ExclusiveStartKey'] = start_key
+            response = table.scan(**kwargs)
+            buffer.extend(to_row(item) for item in response['Items'])
+            with self._lock:
+                self.scanned += len(response['Items'])
+            if len(buffer) >= self.flush_rows:
+                self._write(buffer, segment, parts)
+                buffer = []
+                parts += 1
+            start_key = response.get('LastEvaluatedKey')
+            if start_key is None:
+                break
+        if buffer:
+            self._write(buffer, segment, parts)
+        self.report('Segment {0} of {1} done, {2} items scanned, {3:.0f} items/s'.format(
+            segment + 1, self.total_segments, self.scanned, self._rate()))
+
+
+    def _write(self, rows, segment, part):
+        """
+        Write buffered rows, one file per partition.
+        """
+        partitions = {}
+        for row in rows:
+            partitions.setdefault(partition(row), []).append(row)
+        for (mode, date), partition_rows in partitions.items():
+            directory = os.path.join(self.out_dir, 'mode={0}'.format(mode), 'date={0}'.format(date))
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, 'part-{0:04d}-{1:05d}.{2}'.format(
+                segment, part, self.file_format))
+            df = pd.DataFrame(partition_rows)
+            if self.file_format == PARQUET:
+                df.to_parquet(path, index=False)
+            else:
+                df.to_csv(path, index=False)
+            with self._lock:
+                self.files.append(path)
@@ -0,0 +1,78 @@
+"""
+Local stand-in for a DynamoDB table, for offline tests of the collector sinks
+and of the exporter.
+
+The stub keeps its items in memory and answers scan() like a boto3 Table:
+with Limit pages, ExclusiveStartKey / LastEvaluatedKey and parallel scan
+segments (Segment, TotalSegments). Numbers are stored as Decimal, as DynamoDB
+returns them.
+
+To use the stub, pass DynamoDBTableStub(items) wherever a boto3 Table is
+expected.
+"""
+import init
+import decimal
+import threading
+import zlib
+
+
+class DynamoDBTableStub(object):
+    def __init__(self, items=None, key='tripID'):
+        """
+        Inputs: items (optional), list of dicts; key (optional), partition key
+        """
+        self.key = key
+        self.items = {}
+        self.scans = 0
+        self._lock = threading.Lock()
+        for item in items or []:
+            self.put_item(Item=item)
+
+
+    def put_item(self, Item):
+        item = {name: decimal.Decimal(str(value)) if isinstance(value, (int, float))
+                and not isinstance(value, bool) else value for name, value in Item.items()}
+        with self._lock:
+            self.items[item[self.key]] = item
+
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return _BatchWriter(self)
+
+
+    def segment(self, key, total_segments):
+        """
+        Output: scan segment of a key, from a hash of the key as in DynamoDB
+        """
+        return zlib.crc32(str(key).encode('utf-8')) % total_segments
+
+
+    def scan(self, Segment=0, TotalSegments=1, ExclusiveStartKey=None, Limit=None):
+        with self._lock:
+            self.scans += 1
+            keys = sorted(key for key in self.items
+                          if self.segment(key, TotalSegments) == Segment)
+            if ExclusiveStartKey is not None:
+                keys = [key for key in keys if key > ExclusiveStartKey[self.key]]
+            page = keys[:Limit] if Limit else keys
+            response = {'Items': [dict(self.items[key]) for key in page],
+                        'Count': len(page), 'ScannedCount': len(page)}
+        if len(page) < len(keys):
+            response['LastEvaluatedKey'] = {self.key: page[-1]}
+        return response
+
+
+class _BatchWriter(object):
+    def __init__(self, table):
+        self.table = table
+        self.items = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        for item in self.items:
+            self.table.put_item(Item=item)
+
+    def put_item(self, Item):
+        self.items.append(Item)
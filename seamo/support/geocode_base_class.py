@@ -13,21 +13,38 @@ class GeocodeBase(object):
         self.pickle_name = None
         self.reference = None
         self.crs = crs
+        # spatial joins run, one per geocoding call
+        self.join_count = 0
 
     def _find_overlap_in_reference(self, gdf, pickle_name, reference):
         """ 
         input_file.csv needs header lat, lon
+        Runs the single spatial join of a geocoding call, with the spatial
+        index of the reference. Points outside every polygon of the
+        reference are kept with missing keys.
         """
         self.pickle_name = pickle_name
+        self.join_count += 1
         try:
-            gpd.sjoin(gdf, reference, how = 'left')
-        except:
+            df = gpd.sjoin(gdf, reference, how='left', predicate='intersects')
+        except Exception:
             raise se.NoOverlapSpatialJoinError('No overlap between gdf and reference.\
                 Check if lat/lon were inputted correctly.')
-        else:
-            df = gpd.sjoin(gdf, reference, how = 'left')
-            df = df.drop(columns = ['index_right', cn.GEOMETRY])
-            return df
+        df = df.drop(columns = ['index_right', cn.GEOMETRY])
+        return df
+
+
+    def _empty_result(self, gdf, columns):
+        """
+        Inputs: geodataframe of points, columns of the geocoded attributes
+        Output: dataframe of the lat/lon (floats) of the points, with missing
+                attributes and the index of gdf
+        """
+        df = pd.DataFrame({cn.LAT: gdf[cn.LAT].astype(float),
+                           cn.LON: gdf[cn.LON].astype(float)}, index=gdf.index)
+        for col in columns:
+            df[col] = pd.Series([None] * len(df), index=df.index, dtype=object)
+        return df
 
 
     def _get_reference(self, pickle_name, geocode_input_instance):
@@ -40,7 +57,7 @@ class GeocodeBase(object):
 
     def geocode_csv(self, input_file, pickle_name):
         data = pd.read_csv(str(input_file))
-        data[cn.GEOMETRY] = data.apply(lambda x: Point((float(x[1]), float(x[0]))), axis=1)
+        data[cn.GEOMETRY] = self._points(data)
         data = gpd.GeoDataFrame(data, geometry=cn.GEOMETRY)
         data.crs = self.crs
         df = self.geocode(data, str(pickle_name))
@@ -58,12 +75,20 @@ class GeocodeBase(object):
 
     def geocode_df(self, df):
         data = df
-        data[cn.GEOMETRY] = data.apply(lambda x: Point((float(x[1]), float(x[0]))), axis=1)
+        data[cn.GEOMETRY] = self._points(data)
         data = gpd.GeoDataFrame(data, geometry=cn.GEOMETRY)
         data.crs = self.crs
         return data
 
 
+    def _points(self, data):
+        """
+        Input: dataframe with lat in its first column and lon in its second
+        Output: array of the (lon, lat) points
+        """
+        return gpd.points_from_xy(data.iloc[:, 1].astype(float), data.iloc[:, 0].astype(float))
+
+
     def _split_coord(self, coord):
         coord = str(coord).split(", ")
         left = coord[0][1:]
@@ -29,8 +29,8 @@ class GeocodeInputBase(object):
 
     def get_reference(self, raw_dir, processed_dir, pickle_name):
         try:
-            daq.open_pickle(processed_dir, pickle_name)
+            reference = daq.open_pickle(processed_dir, pickle_name)
         except:
             return self.make_reference(raw_dir, processed_dir, str(pickle_name))
         else:
-            return daq.open_pickle(processed_dir, pickle_name)
\ No newline at end of file
+            return reference
\ No newline at end of file
@@ -0,0 +1,70 @@
+"""
+Batch haversine distances in miles.
+
+To calculate distances, call:
+- haversine(lat1, lon1, lat2, lon2) for paired arrays of points (element-wise,
+  scalars are broadcast)
+- haversine_matrix(lats1, lons1, lats2, lons2) for the distance from every
+  point of the first set to every point of the second set
+
+Both functions take a dtype (np.float32 halves the memory of the output; the
+distances are still computed in float64) and a chunk size, the maximum number
+of distances computed at once, which bounds the size of the temporary arrays.
+"""
+import init
+import numpy as np
+import constants as cn
+
+
+def haversine(lat1, lon1, lat2, lon2, dtype=np.float64,
+              chunk_size=cn.HAVERSINE_CHUNK_SIZE):
+    """
+    Inputs: latitudes and longitudes of the first and second points, in
+            degrees (arrays of the same length, or scalars)
+            dtype (optional), dtype of the output
+            chunk_size (optional), number of pairs computed at once
+    Output: distance (array, or float when all inputs are scalars)
+            in miles
+    """
+    # computed in float64, dtype only sets the type the distances are stored in
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+        *[np.asarray(value, dtype=np.float64) for value in (lat1, lon1, lat2, lon2)])
+    if lat1.ndim == 0:
+        return float(_haversine(lat1, lon1, lat2, lon2))
+    lat1, lon1, lat2, lon2 = [value.ravel() for value in (lat1, lon1, lat2, lon2)]
+    distance = np.empty(len(lat1), dtype=dtype)
+    for start in range(0, len(lat1), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        distance[chunk] = _haversine(lat1[chunk], lon1[chunk], lat2[chunk], lon2[chunk])
+    return distance
+
+
+def haversine_matrix(lats1, lons1, lats2, lons2, dtype=np.float64,
+                     chunk_size=cn.HAVERSINE_CHUNK_SIZE):
+    """
+    Inputs: latitudes and longitudes of the origins and the destinations, in
+            degrees
+            dtype (optional), dtype of the output
+            chunk_size (optional), number of distances computed at once
+    Output: distance (array, origins x destinations)
+            in miles
+    """
+    # computed in float64, dtype only sets the type the distances are stored in
+    lats1, lons1 = np.asarray(lats1, dtype=np.float64), np.asarray(lons1, dtype=np.float64)
+    lats2, lons2 = np.asarray(lats2, dtype=np.float64), np.asarray(lons2, dtype=np.float64)
+    distance = np.empty((len(lats1), len(lats2)), dtype=dtype)
+    rows = max(1, chunk_size // max(1, len(lats2)))
+    for start in range(0, len(lats1), rows):
+        chunk = slice(start, start + rows)
+        distance[chunk] = _haversine(lats1[chunk, np.newaxis], lons1[chunk, np.newaxis],
+                                     lats2[np.newaxis, :], lons2[np.newaxis, :])
+    return distance
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = np.radians(lat1), np.radians(lon1), np.radians(lat2), np.radians(lon2)
+    # Solve for distance applying inverse Haversine
+    a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    # Convert to miles
+    return cn.EARTH_RADIUS_KM * c * cn.KM_TO_MILES
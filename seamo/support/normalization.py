@@ -0,0 +1,105 @@
+"""
+Score scalers shared by the index calculators.
+
+Each scaler computes its statistics once per column with fit(), then
+transforms whole columns at a time, so scaling is linear in the number of
+blockgroups. Several columns can be fitted and transformed in one call.
+
+To scale columns of a dataframe in place, call:
+- scale_columns(df, columns, scaled_names, method) with method one of
+  cn.MIN_MAX, cn.Z_SCORE or cn.PERCENTILE_RANK
+"""
+import init
+import numpy as np
+import pandas as pd
+import constants as cn
+
+
+class Scaler(object):
+    def __init__(self):
+        self.columns = None
+
+    def fit(self, df, columns):
+        """
+        Compute the statistics of each column.
+        Inputs: dataframe, list of columns
+        """
+        self.columns = list(columns)
+        self._fit(df[self.columns])
+        return self
+
+    def transform(self, df):
+        """
+        Scale the fitted columns of a dataframe.
+        Inputs: dataframe containing the fitted columns
+        Outputs: dataframe of scaled values, same columns and index
+        """
+        return self._transform(df[self.columns])
+
+    def fit_transform(self, df, columns):
+        return self.fit(df, columns).transform(df)
+
+
+class MinMaxScaler(Scaler):
+    """
+    Scales values to the 0-1 range: (x - min) / (max - min)
+    """
+    def _fit(self, values):
+        self.low = values.min()
+        self.high = values.max()
+
+    def _transform(self, values):
+        return (values - self.low) / (self.high - self.low)
+
+
+class ZScoreScaler(Scaler):
+    """
+    Scales values to their number of (population) standard deviations from
+    the mean.
+    """
+    def _fit(self, values):
+        self.mean = values.mean()
+        self.std = values.std(ddof=0)
+
+    def _transform(self, values):
+        return (values - self.mean) / self.std
+
+
+class PercentileRankScaler(Scaler):
+    """
+    Scales values to their percentile rank (0-1] among the fitted values.
+    Ties get the average rank, as in DataFrame.rank(pct=True).
+    """
+    def _fit(self, values):
+        self.sorted_values = {column: np.sort(values[column].dropna().values)
+                              for column in values}
+
+    def _transform(self, values):
+        ranks = {}
+        for column in values:
+            reference = self.sorted_values[column]
+            below = np.searchsorted(reference, values[column].values, side='left')
+            upto = np.searchsorted(reference, values[column].values, side='right')
+            rank = (below + upto + 1) / 2.0 / len(reference)
+            ranks[column] = np.where(values[column].isnull(), np.nan, rank)
+        return pd.DataFrame(ranks, index=values.index, columns=values.columns)
+
+
+SCALERS = {cn.MIN_MAX: MinMaxScaler,
+           cn.Z_SCORE: ZScoreScaler,
+           cn.PERCENTILE_RANK: PercentileRankScaler}
+
+
+def scale_columns(df, columns, scaled_names=None, method=cn.MIN_MAX):
+    """
+    Scale columns of a dataframe and store the results as new columns.
+    Inputs: dataframe, list of columns to scale, list of scaled column names
+            (defaults to overwriting the columns), scaling method
+    Outputs: dataframe with the scaled columns
+    """
+    if scaled_names is None:
+        scaled_names = columns
+    scaled = SCALERS[method]().fit_transform(df, columns)
+    for column, scaled_name in zip(columns, scaled_names):
+        df[scaled_name] = scaled[column]
+    return df
@@ -0,0 +1,144 @@
+"""
+Persistent cache of Google Distance Matrix responses.
+
+Each element is stored in a SQLite file under the hash of its origin,
+destination, mode and departure time bucket, so the same trip requested again
+by the basket calculator, the collector or a notebook is read from disk
+instead of costing an API call. Entries expire after a time to live, and the
+least recently used entries are evicted past the size cap.
+
+Hits, misses and the API requests they saved are counted per run.
+
+To read through the cache, call:
+- get_many(keys) for the cached elements of a list of keys, from key()
+- put_many(elements) to store new elements, keyed by key()
+- report() for the statistics of the run
+"""
+import init
+import hashlib
+import json
+import sqlite3
+import time
+from contextlib import closing
+import constants as cn
+
+
+class ODCache(object):
+    def __init__(self, db_fp=cn.OD_CACHE_DB_FP, ttl=cn.OD_CACHE_TTL,
+                 max_entries=cn.OD_CACHE_MAX_ENTRIES, bucket_seconds=cn.OD_CACHE_BUCKET_SECONDS):
+        """
+        Inputs:
+            db_fp (optional), path of the SQLite file
+            ttl (optional), seconds an entry is kept
+            max_entries (optional), size cap of the cache
+            bucket_seconds (optional), departure times in the same bucket
+                share entries
+        """
+        self.db_fp = db_fp
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.bucket_seconds = bucket_seconds
+        self.reset_stats()
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute("""CREATE TABLE IF NOT EXISTS responses (
+                              key TEXT PRIMARY KEY,
+                              element TEXT NOT NULL,
+                              created REAL NOT NULL,
+                              accessed REAL NOT NULL)""")
+            db.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+
+
+    def _connect(self):
+        # Closing the connection rolls back a transaction left open by an error
+        return closing(sqlite3.connect(self.db_fp, timeout=60))
+
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.saved_requests = 0
+
+
+    def key(self, origin, destination, mode, departure_time=None):
+        """
+        Inputs: origin and destination (strings), mode, departure_time
+                (seconds since the epoch, None or 'now' for the current time)
+        Output: key of the element (string)
+        """
+        if departure_time in (None, 'now'):
+            departure_time = time.time()
+        bucket = int(float(departure_time) // self.bucket_seconds)
+        content = json.dumps([str(origin), str(destination), str(mode), bucket])
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+    def get_many(self, keys, now=None):
+        """
+        Input: keys (list of strings), now (optional), current time
+        Output: dict of the cached element of each key found
+        """
+        now = time.time() if now is None else now
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._connect() as db:
+            # Stay well under the SQLite limit of bound variables
+            for start in range(0, len(keys), cn.OD_CACHE_QUERY_SIZE):
+                chunk = keys[start:start + cn.OD_CACHE_QUERY_SIZE]
+                rows = db.execute("""SELECT key, element FROM responses
+                                     WHERE created > ? AND key IN ({0})""".format(
+                                         ','.join('?' * len(chunk))),
+                                  [now - self.ttl] + chunk).fetchall()
+                found.update((key, json.loads(element)) for key, element in rows)
+            db.executemany('UPDATE responses SET accessed = ? WHERE key = ?',
+                           [(now, key) for key in found])
+            db.commit()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+
+    def get(self, key, now=None):
+        """
+        Input: key (string)
+        Output: cached element, None on a miss
+        """
+        return self.get_many([key], now).get(key)
+
+
+    def put_many(self, elements, now=None):
+        """
+        Input: elements (dict of element by key), now (optional), current time
+        Expired entries, then the least recently used ones past the size
+        cap, are evicted.
+        """
+        now = time.time() if now is None else now
+        with self._connect() as db:
+            db.executemany('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)',
+                           [(key, json.dumps(element), now, now)
+                            for key, element in elements.items()])
+            db.execute('DELETE FROM responses WHERE created <= ?', (now - self.ttl,))
+            db.execute("""DELETE FROM responses WHERE key IN (
+                              SELECT key FROM responses ORDER BY accessed DESC
+                              LIMIT -1 OFFSET ?)""", (self.max_entries,))
+            db.commit()
+
+
+    def put(self, key, element, now=None):
+        self.put_many({key: element}, now)
+
+
+    def __len__(self):
+        with self._connect() as db:
+            return db.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+
+    def report(self):
+        """
+        Output: hit rate and saved API requests of the run (string)
+        """
+        lookups = self.hits + self.misses
+        rate = 100.0 * self.hits / lookups if lookups else 0.0
+        return 'OD cache: {0} hits, {1} misses ({2:.1f}% hit rate), {3} API requests ' \
+               'saved'.format(self.hits, self.misses, rate, self.saved_requests)
+
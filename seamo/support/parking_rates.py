@@ -0,0 +1,92 @@
+"""
+Parking rate lookup shared by every Coordinate and index calculator in a
+process.
+
+The parking rates pickle is loaded once and kept in memory. Its modification
+time is checked on each lookup, so the rates are reloaded when the pickle is
+rebuilt (see generate_parking_data_driver.py).
+
+To look up parking rates, call:
+- get_parking_rates().rate_for(block_group) for a single block group
+- get_parking_rates().rates_for(block_groups) for an array of block groups
+"""
+import init
+import os
+import threading
+import numpy as np
+import pandas as pd
+import constants as cn
+import data_accessor as daq
+
+
+class ParkingRates(object):
+    def __init__(self, processed_dir=cn.PICKLE_DIR, pickle_name=cn.PARKING_RATES_PICKLE):
+        """
+        Inputs: directory of the pickle, pickle filename
+        """
+        self.processed_dir = processed_dir
+        self.pickle_name = pickle_name
+        self.mtime = None
+        self.rates = None
+        self.loads = 0
+        self._lock = threading.Lock()
+
+
+    def get_rates(self):
+        """
+        Output: Series of parking rates indexed by block group, reloaded if
+                the pickle changed since it was last read
+        """
+        mtime = os.stat(os.path.join(self.processed_dir, self.pickle_name)).st_mtime
+        if mtime != self.mtime:
+            with self._lock:
+                if mtime != self.mtime:
+                    self.rates = self._load()
+                    self.mtime = mtime
+                    self.loads += 1
+        return self.rates
+
+
+    def rate_for(self, block_group):
+        """
+        Input: block group ID
+        Output: parking rate of the block group, 0 when it has no parking data
+        """
+        rate = self.get_rates().get(block_group)
+        if rate is None or pd.isnull(rate):
+            return 0
+        return rate
+
+
+    def rates_for(self, block_groups):
+        """
+        Input: array of block group IDs
+        Output: array of parking rates, 0 for block groups without parking data
+        """
+        block_groups = pd.Series(np.asarray(block_groups, dtype=object))
+        return block_groups.map(self.get_rates()).fillna(0).values.astype(float)
+
+
+    def _load(self):
+        parking_dict = daq.open_pickle(self.processed_dir, self.pickle_name)
+        # The pickle is written with to_dict(orient='records'), a list holding
+        # one dict of block group to rate
+        if isinstance(parking_dict, list):
+            records = parking_dict
+            parking_dict = {}
+            for record in records:
+                parking_dict.update(record)
+        return pd.Series(parking_dict, dtype=float)
+
+
+_PARKING_RATES = None
+
+
+def get_parking_rates():
+    """
+    Output: the ParkingRates instance of the process
+    """
+    global _PARKING_RATES
+    if _PARKING_RATES is None:
+        _PARKING_RATES = ParkingRates()
+    return _PARKING_RATES
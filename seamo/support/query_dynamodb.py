@@ -1,72 +1,53 @@
 # coding: utf-8
 
-# In[3]:
-
-
-import json
 import os
 import os.path
-import boto3
-import decimal
-from pandas.io.json import json_normalize
+import shutil
+import tempfile
+import pandas as pd
 import constants as cn
-
-
-# In[4]:
-
-
-# Helper class to convert a DynamoDB item to JSON.
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, decimal.Decimal):
-            if o % 1 > 0:
-                return float(o)
-            else:
-                return int(o)
-        return super(DecimalEncoder, self).default(o)
-    
-# Scan call to DynamoDB
-def scanDynamo(LastEvaluatedKey=None):
-
-    # MODE = 'walking'
-    # MODE = 'transit2'
-    # MODE = 'driving2'
-    MODE = 'bicycling'
-
-    # Get AWS service resource.
-    dynamodb = boto3.resource('dynamodb', region_name='us-east-1',
-    aws_access_key_id = os.environ['aws_access_key_id'], 
-    aws_secret_access_key = os.environ['aws_secret_access_key'])
-
-    table = dynamodb.Table('seamo-' + MODE)
-    
-    if (LastEvaluatedKey is None):
-        response = table.scan()
-    else:
-        response = table.scan(
-            ExclusiveStartKey = LastEvaluatedKey
-        )
-        
-    print (response['ScannedCount'])
-    #print (response)
-    
-    df_response = json_normalize(response,'Items')
-    
-    # save data to file
-     # save data to file
-    if os.path.isfile(os.path.join(cn.DYNAMODB_OUT_DIR, 'dynamo_out_' + MODE + '.csv')):
-        df_response.to_csv(os.path.join(cn.DYNAMODB_OUT_DIR, 'dynamo_out_' + MODE + '.csv'), mode='a', header=False, index=False, encoding="utf-8")
-    else:
-        df_response.to_csv(os.path.join(cn.DYNAMODB_OUT_DIR, 'dynamo_out_' + MODE + '.csv'), mode='w', header=True, index=False, encoding="utf-8")
-    
-    # Call next page if available
-    if 'LastEvaluatedKey' in response:
-        scanDynamo(response['LastEvaluatedKey'])
-    else:
-        return     
-
-
-# In[5]:
-
-
-scanDynamo()
\ No newline at end of file
+from dynamodb_exporter import DynamoDBExporter, export_files, read_part
+from trip_sinks import TRIP_ATTRIBUTES
+
+# MODE = 'walking'
+# MODE = 'transit2'
+# MODE = 'driving2'
+MODE = 'bicycling'
+# Columns of dynamo_out_<mode>.csv
+EXPORT_COLUMNS = ['tripID'] + TRIP_ATTRIBUTES
+
+
+# Parallel scan of the DynamoDB table of a mode, saved to
+# dynamo_out_<mode>.csv in dynamodb_dir, the file read by convert_dynamodb.py.
+# The partitioned export (see dynamodb_exporter.py) is kept in out_dir when
+# one is given, and written to a temporary directory otherwise. The partition
+# files are appended to the csv one at a time, so memory stays bounded by the
+# largest file.
+def scanDynamo(mode=MODE, out_dir=None, dynamodb_dir=cn.DYNAMODB_OUT_DIR, table_factory=None):
+    def boto3_table():
+        import boto3
+        # Get AWS service resource, one per worker thread.
+        session = boto3.session.Session(
+            aws_access_key_id = os.environ['aws_access_key_id'],
+            aws_secret_access_key = os.environ['aws_secret_access_key'])
+        dynamodb = session.resource('dynamodb', region_name=cn.DYNAMODB_REGION)
+        return dynamodb.Table('seamo-' + mode)
+
+    export_dir = out_dir or tempfile.mkdtemp()
+    try:
+        exporter = DynamoDBExporter('seamo-' + mode, export_dir,
+                                    table_factory=table_factory or boto3_table)
+        count = exporter.export()
+        out_fp = os.path.join(dynamodb_dir, 'dynamo_out_' + mode + '.csv')
+        pd.DataFrame(columns=EXPORT_COLUMNS).to_csv(out_fp, index=False, encoding="utf-8")
+        for path in export_files(export_dir, file_format=exporter.file_format):
+            part = read_part(path, exporter.file_format).reindex(columns=EXPORT_COLUMNS)
+            part.to_csv(out_fp, mode='a', header=False, index=False, encoding="utf-8")
+    finally:
+        if out_dir is None:
+            shutil.rmtree(export_dir)
+    return count
+
+
+if __name__ == "__main__":
+    scanDynamo()
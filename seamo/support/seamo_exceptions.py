@@ -2,6 +2,7 @@
 Class for all excpetions used in following scripts
 - geocoder.py
 - geocoder_input.py
+- distance_matrix_client.py
 """
 
 
@@ -30,4 +31,14 @@ class NoUrbanVillageError(Exception):
 
 class NotInSeattleError(Exception):
     def __init__(self, message):
-        self.message = message
\ No newline at end of file
+        self.message = message
+
+
+class UnknownModeError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+class DistanceMatrixError(Exception):
+    def __init__(self, message, retryable=False):
+        self.message = message
+        self.retryable = retryable
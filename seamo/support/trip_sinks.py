@@ -0,0 +1,102 @@
+"""
+Sinks for the trips downloaded by google_time_and_distance_collector.py.
+
+Items are written in batches of up to cn.DYNAMODB_BATCH_SIZE, the largest
+batch write DynamoDB accepts, instead of one request per item. The SQLite sink
+stores the same items locally, to run and test the collector without AWS.
+
+To write items, call:
+- DynamoDBSink(table_name).write(items)
+- SQLiteSink(db_fp).write(items)
+"""
+import init
+import abc
+import decimal
+import sqlite3
+from contextlib import closing
+import constants as cn
+
+# Attributes of a trip item, after tripID
+TRIP_ATTRIBUTES = ['mode', 'departure_time', 'status', 'distance', 'duration',
+                   'duration_in_traffic', 'fare']
+
+
+class Sink(abc.ABC):
+    """
+    Base class of the sinks: write() splits the items in batches and hands
+    each one to _write_batch(), which every sink implements.
+    """
+    def __init__(self, batch_size=cn.DYNAMODB_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.items = 0
+        self.batches = 0
+
+
+    def write(self, items):
+        """
+        Input: items (list of dicts), with a tripID
+        Output: number of items written
+        """
+        items = list(items)
+        for start in range(0, len(items), self.batch_size):
+            self._write_batch(items[start:start + self.batch_size])
+            self.batches += 1
+        self.items += len(items)
+        return len(items)
+
+
+    @abc.abstractmethod
+    def _write_batch(self, items):
+        """
+        Input: items (list of dicts), at most batch_size of them
+        """
+
+
+class DynamoDBSink(Sink):
+    def __init__(self, table_name=cn.DYNAMODB_TABLE, region_name=cn.DYNAMODB_REGION,
+                 table=None, batch_size=cn.DYNAMODB_BATCH_SIZE):
+        """
+        Inputs:
+            table_name, region_name (optional), DynamoDB table
+            table (optional), boto3 Table resource used instead
+            batch_size (optional), items per batch write
+        """
+        Sink.__init__(self, batch_size)
+        if table is None:
+            import boto3
+            table = boto3.resource('dynamodb', region_name=region_name).Table(table_name)
+        self.table = table
+
+
+    def _write_batch(self, items):
+        # The batch writer sends the items in one BatchWriteItem request and
+        # resends the unprocessed ones
+        with self.table.batch_writer(overwrite_by_pkeys=['tripID']) as batch:
+            for item in items:
+                batch.put_item(Item={key: decimal.Decimal(str(value))
+                                     if isinstance(value, float) else value
+                                     for key, value in item.items()})
+
+
+class SQLiteSink(Sink):
+    def __init__(self, db_fp, table_name=cn.DYNAMODB_TABLE,
+                 batch_size=cn.DYNAMODB_BATCH_SIZE):
+        """
+        Inputs: db_fp, path of the SQLite file, table_name (optional)
+                batch_size (optional), items per transaction
+        """
+        Sink.__init__(self, batch_size)
+        self.db_fp = db_fp
+        self.table_name = table_name
+        with closing(sqlite3.connect(db_fp)) as db:
+            db.execute('CREATE TABLE IF NOT EXISTS "{0}" (tripID TEXT PRIMARY KEY, {1})'.format(
+                table_name, ', '.join(TRIP_ATTRIBUTES)))
+
+
+    def _write_batch(self, items):
+        with closing(sqlite3.connect(self.db_fp, timeout=60)) as db:
+            db.executemany('INSERT OR REPLACE INTO "{0}" VALUES ({1})'.format(
+                               self.table_name, ', '.join('?' * (len(TRIP_ATTRIBUTES) + 1))),
+                           [[item['tripID']] + [item.get(attribute) for attribute in TRIP_ATTRIBUTES]
+                            for item in items])
+            db.commit()
@@ -0,0 +1,237 @@
+import init
+import numpy as np
+import pandas as pd
+import constants as cn
+import seamo_exceptions as se
+from collections import defaultdict
+
+"""
+TripTable class.
+
+    A TripTable stores a set of trips as parallel NumPy columns (a struct of arrays)
+    instead of one Trip object per row. The index calculators (mode choice,
+    affordability, personas) work on these columns directly with vectorized
+    operations. Trip objects are only built on demand, through the lazy view
+    methods (trip, iter_trips, trips_per_blockgroup), for callers that still
+    need them.
+
+    Columns (one entry per trip):
+        origin: int32 code of the origin block group, index into origins
+        destination: int32 code of the destination, index into dest_lat/dest_lon
+        mode: int8 code of the mode, index into cn.MODES
+        distance: float, distance in miles
+        duration: float, effective duration in minutes. As in CarTrip, car trips
+            include cn.PARKING_TIME_OFFSET.
+        fare: float, transit fare (0 when missing and for non transit trips)
+        hour: int8, local departure hour (-1 when unknown)
+        departure_time: datetime64, local departure time
+        viable: int8 viability (0 or 1), None until set by a ModeChoiceCalculator
+
+    Lookup arrays (one entry per code):
+        origins: block group ID of each origin code
+        dest_lat, dest_lon: coordinates of each destination code
+        dest_blockgroups: block group ID of each destination code
+"""
+class TripTable(object):
+    def __init__(self, origin, destination, mode, distance, duration, fare, hour,
+                 departure_time, origins, dest_lat, dest_lon, dest_blockgroups):
+        self.origin = origin
+        self.destination = destination
+        self.mode = mode
+        self.distance = distance
+        self.duration = duration
+        self.fare = fare
+        self.hour = hour
+        self.departure_time = departure_time
+        self.origins = origins
+        self.dest_lat = dest_lat
+        self.dest_lon = dest_lon
+        self.dest_blockgroups = dest_blockgroups
+        self.viable = None
+
+
+    @classmethod
+    def from_df(cls, df):
+        """
+        Input:
+            df (DataFrame): one trip per row, with the columns used by
+                ModeChoiceCalculator.trip_from_row
+        Output:
+            table (TripTable)
+
+        Build a TripTable from a DataFrame of trips. Missing destination
+        coordinates default to the city center, missing fares to 0.
+        """
+        origin, origins = pd.factorize(df[cn.BLOCK_GROUP])
+
+        mode = df[cn.MODE].map(cn.MODE_CODES)
+        if mode.isnull().any():
+            unknown = df.loc[mode.isnull(), cn.MODE].unique()
+            raise se.UnknownModeError('Unknown mode(s): {0}'.format(list(unknown)))
+        mode = mode.values.astype(np.int8)
+
+        coords = pd.DataFrame({
+            cn.LAT: df[cn.LAT].values if cn.LAT in df else cn.CITY_CENTER[0],
+            cn.LON: df[cn.LON].values if cn.LON in df else cn.CITY_CENTER[1]},
+            index=df.index)
+        destination = coords.groupby([cn.LAT, cn.LON], sort=False,
+            dropna=False).ngroup().values
+        # first row of each destination code, to fill the lookup arrays
+        _, first = np.unique(destination, return_index=True)
+        if cn.DEST_BLOCK_GROUP in df:
+            dest_blockgroups = df[cn.DEST_BLOCK_GROUP].values[first]
+        else:
+            dest_blockgroups = np.full(len(first), None, dtype=object)
+
+        duration = df[cn.DURATION].values.astype(float)
+        duration = np.where(mode == cn.MODE_CODES[cn.DRIVING_MODE],
+            duration + cn.PARKING_TIME_OFFSET, duration)
+
+        if cn.FARE_VALUE in df:
+            fare = np.nan_to_num(df[cn.FARE_VALUE].values.astype(float))
+            fare = np.where(mode == cn.MODE_CODES[cn.TRANSIT_MODE], fare, 0.0)
+        else:
+            fare = np.zeros(len(df))
+
+        departure_time = df[cn.DEPARTURE_TIME]
+        if not pd.api.types.is_datetime64_any_dtype(departure_time):
+            # Drop the utc offset and fractional seconds to keep the local time
+            departure_time = pd.to_datetime(departure_time.astype(str).str.slice(0, 19),
+                format='%Y-%m-%d %H:%M:%S', errors='coerce')
+        hour = departure_time.dt.hour.fillna(-1).values.astype(np.int8)
+
+        return cls(origin.astype(np.int32), destination.astype(np.int32), mode,
+                   df[cn.DISTANCE].values.astype(float), duration, fare, hour,
+                   departure_time.values, np.asarray(origins, dtype=object),
+                   coords[cn.LAT].values[first], coords[cn.LON].values[first],
+                   dest_blockgroups)
+
+
+    @classmethod
+    def from_trips(cls, blkgrp_dict):
+        """
+        Input:
+            blkgrp_dict (dict)
+                keys: blockgroup IDs
+                values: list of Trips originating from that blockgroup
+        Output:
+            table (TripTable)
+
+        Build a TripTable from the dict of lists format returned by
+        ModeChoiceCalculator.trips_per_blockgroup, keeping the viability of
+        the trips.
+        """
+        trips = [trip for blkgrp_trips in blkgrp_dict.values() for trip in blkgrp_trips]
+        df = pd.DataFrame({
+            cn.BLOCK_GROUP: [trip.origin for trip in trips],
+            cn.MODE: [trip.mode for trip in trips],
+            cn.LAT: [trip.destination.lat for trip in trips],
+            cn.LON: [trip.destination.lon for trip in trips],
+            cn.DISTANCE: [trip.distance for trip in trips],
+            cn.DURATION: [trip.duration for trip in trips],
+            cn.FARE_VALUE: [getattr(trip, 'fare_value', 0) for trip in trips],
+            cn.DEPARTURE_TIME: [trip.departure_time for trip in trips],
+            cn.DEST_BLOCK_GROUP: [trip.dest_blockgroup for trip in trips]})
+        # Car trip durations already include the parking offset
+        df.loc[df[cn.MODE] == cn.DRIVING_MODE, cn.DURATION] -= cn.PARKING_TIME_OFFSET
+        table = cls.from_df(df)
+        if trips and all(trip.viable is not None for trip in trips):
+            table.set_viability([trip.viable for trip in trips])
+        return table
+
+
+    def __len__(self):
+        return len(self.mode)
+
+
+    def subset(self, mask):
+        """
+        Input:
+            mask (boolean array or array of row positions)
+        Output:
+            table (TripTable)
+
+        Return a new TripTable with only the selected trips. Codes and lookup
+        arrays are shared, so origin and destination codes stay comparable.
+        """
+        table = TripTable(self.origin[mask], self.destination[mask], self.mode[mask],
+                          self.distance[mask], self.duration[mask], self.fare[mask],
+                          self.hour[mask], self.departure_time[mask], self.origins,
+                          self.dest_lat, self.dest_lon, self.dest_blockgroups)
+        if self.viable is not None:
+            table.viable = self.viable[mask]
+        return table
+
+
+    def set_viability(self, viable):
+        """
+        Sets the viability column of the table.
+        Input:
+            viable (array of 0s and 1s, one per trip)
+        """
+        self.viable = np.asarray(viable, dtype=np.int8)
+        return self
+
+
+    def trip(self, i):
+        """
+        Input:
+            i (int): row position
+        Output:
+            trip (Trip)
+
+        Instantiate the Trip object for a single row. Only use this when an
+        object is required, the columns are much cheaper to work with.
+        """
+        # Imported here so the columns can be used without the geocoding stack
+        from trip import BikeTrip, CarTrip, TransitTrip, WalkTrip
+        origin = self.origins[self.origin[i]]
+        dest = self.destination[i]
+        dest_lat, dest_lon = self.dest_lat[dest], self.dest_lon[dest]
+        mode = cn.MODES[self.mode[i]]
+        distance = self.distance[i]
+        duration = self.duration[i]
+        departure_time = self.departure_time[i]
+
+        if mode == cn.DRIVING_MODE:
+            trip = CarTrip(origin, dest_lat, dest_lon, distance, duration, None,
+                           departure_time,
+                           duration_in_traffic=duration - cn.PARKING_TIME_OFFSET)
+        elif mode == cn.TRANSIT_MODE:
+            trip = TransitTrip(origin, dest_lat, dest_lon, distance, duration, None,
+                               departure_time, fare_value=self.fare[i])
+        elif mode == cn.BIKING_MODE:
+            trip = BikeTrip(origin, dest_lat, dest_lon, distance, duration, None,
+                            departure_time)
+        else:
+            trip = WalkTrip(origin, dest_lat, dest_lon, distance, duration, None,
+                            departure_time)
+        trip.set_geocoded_attributes(self.dest_blockgroups[dest], None, None, None,
+                                     None, None)
+        if self.viable is not None:
+            trip.set_viability(int(self.viable[i]))
+        return trip
+
+
+    def iter_trips(self):
+        """
+        Lazily yield a Trip object for each row.
+        """
+        for i in range(len(self)):
+            yield self.trip(i)
+
+
+    def trips_per_blockgroup(self):
+        """
+        Output:
+            blkgrp_dict (dict)
+                keys: blockgroup IDs
+                values: list of Trips originating from that blockgroup
+
+        Materialize the table in the dict of lists format returned by
+        ModeChoiceCalculator.trips_per_blockgroup before TripTable existed.
+        """
+        blkgrp_dict = defaultdict(list)
+        for i in range(len(self)):
+            blkgrp_dict[self.origins[self.origin[i]]].append(self.trip(i))
+        return blkgrp_dict
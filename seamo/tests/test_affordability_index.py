@@ -4,7 +4,7 @@ This is a test file for trip.py
 import init
 import unittest
 from affordability_index import AffordabilityIndex
-from trip import CarTrip
+from trip import CarTrip, BikeTrip, TransitTrip
 import pandas as pd
 import constants as cn
 import numpy as np
@@ -30,9 +30,30 @@ class AffordabilityIndexTest(unittest.TestCase):
     def test_create_avg_blockgroup_cost_df(self):
         result_df = self.a_index.create_avg_blockgroup_cost_df()
         test_df = pd.DataFrame({cn.KEY: ['530330094004', '530330094004'], cn.COST: [21.465577, 21.465577]})
-        import pdb; pdb.set_trace()
         self.assertTrue(np.isclose(test_df[cn.COST], result_df[cn.COST], atol=1e-03))
 
+    def test_create_avg_blockgroup_cost_df_matches_trips(self):
+        car = CarTrip(origin1, dest_lat, dest_lon, distance, duration, basket_category,
+                      departure_time, duration_in_traffic)
+        bike = BikeTrip(origin1, dest_lat, dest_lon, distance, duration, basket_category,
+                        departure_time)
+        transit = TransitTrip('530330001001', dest_lat, dest_lon, distance, duration,
+                              basket_category, departure_time, 2.75)
+        trips = {origin1: [car, bike], '530330001001': [transit]}
+        for trip in [car, bike, transit]:
+            trip.set_geocoded_attributes('530330074003', None, None, None, None, None)
+        result_df = AffordabilityIndex(trips).create_avg_blockgroup_cost_df()
+        for i, blkgrp_trips in enumerate(trips.values()):
+            costs = [trip.set_cost().cost for trip in blkgrp_trips]
+            direct_costs = [trip.direct_cost for trip in blkgrp_trips]
+            durations = [trip.duration for trip in blkgrp_trips]
+            self.assertAlmostEqual(np.mean(costs), result_df[cn.COST][i])
+            self.assertAlmostEqual(np.mean(direct_costs), result_df[cn.DIRECT_COST][i])
+            self.assertAlmostEqual(np.mean(durations), result_df[cn.AVG_DURATION][i])
+            # all trips share a destination
+            self.assertAlmostEqual(min(direct_costs), result_df[cn.CHEAPEST][i])
+            self.assertAlmostEqual(min(durations), result_df[cn.FASTEST][i])
+
     def test_calculate_score(self):
         pass
 
@@ -0,0 +1,41 @@
+"""
+This is a test file for basket_branch_and_bound.py
+"""
+import init
+import unittest
+import itertools
+import numpy as np
+import pandas as pd
+import constants as cn
+from basket_feature_cube import BasketFeatureCube, FEATURES
+from basket_branch_and_bound import BasketBranchAndBound
+from test_basket_feature_cube import make_google_input
+
+BASKET_SIZE = 30
+
+
+class BasketBranchAndBoundTest(unittest.TestCase):
+    def setUp(self):
+        self.cube = BasketFeatureCube(make_google_input())
+        self.psrc = self.cube.feature_df([2, 10, 2, 1, 2, 1, 3, 1, 2, 1])
+        # Move the targets away from any basket, so no MSE is zero
+        for feature in FEATURES:
+            self.psrc[feature] *= 1.1
+        combinations = np.array(list(itertools.product(*cn.BASKET_COUNT_RANGES)))
+        self.combinations = combinations[combinations.sum(axis=1) == BASKET_SIZE]
+
+    def test_matches_exhaustive_search(self):
+        mses = self.cube.calculate_mse(self.psrc, self.combinations)
+        for i, feature in enumerate(FEATURES):
+            search = BasketBranchAndBound(self.cube, self.psrc, feature,
+                                          basket_size=BASKET_SIZE)
+            combinations, best = search.search(top_n=3)
+            # Stable sort keeps the order of the sweep for ties
+            expected = pd.Series(mses[:, i]).sort_values(kind='stable').index[:3]
+            self.assertEqual(self.combinations[expected].tolist(), combinations.tolist())
+            self.assertTrue(np.allclose(mses[expected, i], best))
+            self.assertLessEqual(search.evaluations, len(self.combinations))
+
+
+if __name__ == "__main__":
+    unittest.main()
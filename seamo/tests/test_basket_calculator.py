@@ -1,9 +1,14 @@
+import os
+import shutil
+import tempfile
 import unittest
+import numpy as np
 import pandas as pd
 
 import init
 import constants as cn
 from basket_calculator import *
+from basket_builder import BasketBuilder
 
 
 class BasketCalcTest(unittest.TestCase):
@@ -36,6 +41,24 @@ class BasketCalcTest(unittest.TestCase):
         size = len(self.origin_df) * len(self.dest_df)
         self.assertEqual(size, len(dist_df))
 
+    def test_create_dist_df_threshold(self):
+        """
+        Only keep destinations within the threshold, and every citywide
+        destination whatever its distance
+        """
+        dest_df = self.dest_df.copy()
+        dest_df.loc[3] = [47.2528768, -122.4442906, 'citywide', 'tacoma_dome']
+        dist_df = origins_to_destinations(self.origin_df, dest_df,
+                                          'haversine', True)
+        expected = origins_to_destinations(self.origin_df, dest_df,
+                                           'haversine', False)
+        expected = expected[(expected[cn.DISTANCE] <= cn.PROXIMITY_THRESHOLD_MILES)
+                            | (expected[cn.CLASS] == 'citywide')]
+        self.assertEqual(sorted(expected[cn.PAIR]), sorted(dist_df[cn.PAIR]))
+        self.assertEqual(len(self.origin_df),
+                         (dist_df[cn.CLASS] == 'citywide').sum())
+        self.assertTrue((dist_df[cn.DISTANCE] > cn.PROXIMITY_THRESHOLD_MILES).any())
+
     def test_basket_rank(self):
         # Check columns
         # Check ranks are integers
@@ -44,10 +67,81 @@ class BasketCalcTest(unittest.TestCase):
 
 
     def test_create_basket(self):
-        # Check that each blockgroup has a basket of 25 
-        # Check that the count for each category matches basket
-        # Check that every pair is unique
-        pass
+        dist_df = rank_destinations(origins_to_destinations(
+            self.origin_df, self.dest_df, 'haversine', False))
+        combination = [0, 0, 0, 1, 1, 0, 0, 0, 0, 0]
+        basket_df = create_basket(dist_df, combination)
+        # One supermarket and one library per blockgroup
+        self.assertEqual(2 * len(self.origin_df), len(basket_df))
+        self.assertTrue((basket_df[cn.RANK] == 1).all())
+        self.assertFalse(basket_df[cn.PAIR].duplicated().any())
+        counts = basket_df.groupby(cn.BLOCKGROUP)[cn.CLASS].value_counts()
+        self.assertTrue((counts == 1).all())
+
+    def test_basket_builder_ranks(self):
+        dist_df = origins_to_destinations(self.origin_df, self.dest_df,
+                                          'haversine', False)
+        # Tied distances are ranked by order of appearance
+        dist_df[cn.DISTANCE] = dist_df[cn.DISTANCE].round(-1)
+        ranked_df = rank_destinations(dist_df.copy())
+        positions, ranks = BasketBuilder(dist_df).ranks()
+        self.assertEqual(list(ranked_df[cn.RANK].values[positions]), list(ranks))
+
+    def test_basket_builder_nan_distance(self):
+        dist_df = origins_to_destinations(self.origin_df, self.dest_df,
+                                          'haversine', False)
+        # A group with a NaN distance and fewer members than the basket asks for
+        nan_row = dist_df.index[(dist_df[cn.BLOCKGROUP] == 1)
+                                & (dist_df[cn.CLASS] == 'supermarket')][0]
+        dist_df.loc[nan_row, cn.DISTANCE] = np.nan
+        ranked_df = rank_destinations(dist_df.copy())
+        builder = BasketBuilder(dist_df)
+        positions, ranks = builder.ranks()
+        self.assertEqual(list(ranked_df[cn.RANK].values[positions]), list(ranks))
+        basket = builder.basket([0, 0, 0, 2, 1, 0, 0, 0, 0, 0])
+        expected = ranked_df[ranked_df[cn.RANK] <= 2].index
+        self.assertEqual(sorted(expected), sorted(basket))
+        self.assertNotIn(nan_row, basket)
+        self.assertIn(dist_df.index.get_loc(nan_row) + 1, basket)
+
+    def test_write_input_baskets(self):
+        dist_df = rank_destinations(origins_to_destinations(
+            self.origin_df, self.dest_df, 'haversine', False))
+        baskets_df = create_basket(dist_df, [0, 0, 0, 2, 1, 0, 0, 0, 0, 0])
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            output_fp = os.path.join(tmp_dir, 'input_baskets.csv')
+            self.assertEqual(3, write_input_baskets(baskets_df, output_fp))
+            input_baskets = pd.read_csv(output_fp, index_col=0)
+        finally:
+            shutil.rmtree(tmp_dir)
+        self.assertEqual([1, 2, 3], list(input_baskets[cn.BLOCKGROUP]))
+        row = input_baskets.iloc[0]
+        basket = baskets_df[baskets_df[cn.BLOCKGROUP] == 1]
+        self.assertEqual(','.join(basket[cn.PAIR].str[2:]), row[cn.PLACE_IDS])
+        self.assertEqual(sorted(['trader_joes', 'whole_foods', 'cap_library']),
+                         sorted(row[cn.PLACE_IDS].split(',')))
+        self.assertEqual('|'.join(basket[cn.CLASS]), row[cn.CLASS])
+        self.assertEqual('47.72683,-122.28469', row[cn.ORIGIN])
+        self.assertEqual(3, len(row[cn.DESTINATIONS].split('|')))
+
+    def test_write_input_baskets_float_blockgroup(self):
+        # Blockgroups read back as float, and a place ID with a dash
+        dist_df = rank_destinations(origins_to_destinations(
+            self.origin_df, self.dest_df, 'haversine', False))
+        baskets_df = create_basket(dist_df, [0, 0, 0, 2, 1, 0, 0, 0, 0, 0])
+        baskets_df[cn.PAIR] = baskets_df[cn.PAIR].str.replace('cap_library', 'cap-library')
+        baskets_df[cn.BLOCKGROUP] = baskets_df[cn.BLOCKGROUP].astype(float)
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            output_fp = os.path.join(tmp_dir, 'input_baskets.csv')
+            write_input_baskets(baskets_df, output_fp)
+            input_baskets = pd.read_csv(output_fp, index_col=0)
+        finally:
+            shutil.rmtree(tmp_dir)
+        self.assertEqual(sorted(['trader_joes', 'whole_foods', 'cap-library']),
+                         sorted(input_baskets[cn.PLACE_IDS][0].split(',')))
+
 
 if __name__ == "__main__":
     unittest.main()
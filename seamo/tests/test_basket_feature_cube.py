@@ -0,0 +1,64 @@
+"""
+This is a test file for basket_feature_cube.py
+"""
+import init
+import unittest
+import numpy as np
+import pandas as pd
+import constants as cn
+import market_basket_evaluator as mbe
+from basket_feature_cube import BasketFeatureCube, FEATURES
+
+COMBINATIONS = [[1, 8, 1, 1, 1, 1, 1, 1, 1, 1], [4, 13, 3, 3, 3, 3, 3, 3, 3, 3],
+                [2, 10, 3, 1, 2, 1, 3, 1, 2, 1]]
+
+
+def make_google_input():
+    """
+    Google API data for three origins, with tied (fractional) ranks and a
+    class outside cn.BASKET_CATEGORIES
+    """
+    rng = np.random.RandomState(0)
+    rows = []
+    for origin in ['530330001001', '530330001002', '530330001003']:
+        orig_lat, orig_lon = 47.6 + rng.rand() / 10, -122.3 - rng.rand() / 10
+        for dest_class in cn.BASKET_CATEGORIES + ['destination park']:
+            n = 15 if dest_class == cn.CITYWIDE else 4
+            distances = np.sort(rng.rand(n) * 12)
+            ranks = np.arange(1, n + 1, dtype=float)
+            # Tied destinations share the average rank
+            ranks[1:3] = 2.5
+            for distance, rank in zip(distances, ranks):
+                rows.append([origin, orig_lat + rng.rand() / 10 - 0.05, orig_lat,
+                             orig_lon + rng.rand() / 10 - 0.05, orig_lon, rank,
+                             distance, dest_class])
+    return pd.DataFrame(rows, columns=[cn.ORIGIN, 'dest_lat', 'orig_lat',
+        'dest_lon', 'orig_lon', cn.RANK, cn.DISTANCE, cn.CLASS])
+
+
+class BasketFeatureCubeTest(unittest.TestCase):
+    def setUp(self):
+        self.google_input = make_google_input()
+        self.cube = BasketFeatureCube(self.google_input)
+
+    def test_features_match_calculate_features(self):
+        for combination in COMBINATIONS:
+            expected = mbe.calculate_features(self.google_input.copy(), combination)
+            df = self.cube.feature_df(combination)
+            self.assertEqual(list(expected[cn.ORIGIN]), list(df[cn.ORIGIN]))
+            for feature in FEATURES:
+                self.assertTrue(np.allclose(expected[feature], df[feature]))
+
+    def test_calculate_mse(self):
+        psrc = self.cube.feature_df(COMBINATIONS[0])
+        mses = self.cube.calculate_mse(psrc, COMBINATIONS, chunk_size=2)
+        self.assertEqual((len(COMBINATIONS), len(FEATURES)), mses.shape)
+        self.assertTrue(np.allclose(0, mses[0]))
+        expected = self.cube.feature_df(COMBINATIONS[1])
+        for i, feature in enumerate(FEATURES):
+            self.assertAlmostEqual(((expected[feature] - psrc[feature])**2).mean(),
+                                   mses[1, i])
+
+
+if __name__ == "__main__":
+    unittest.main()
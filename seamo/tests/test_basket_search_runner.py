@@ -0,0 +1,60 @@
+"""
+This is a test file for basket_search_runner.py
+"""
+import init
+import os
+import shutil
+import tempfile
+import unittest
+import itertools
+import numpy as np
+import constants as cn
+from basket_feature_cube import BasketFeatureCube
+from basket_search_runner import BasketSearchRunner
+from test_basket_feature_cube import make_google_input
+
+
+class BasketSearchRunnerTest(unittest.TestCase):
+    def setUp(self):
+        self.cube = BasketFeatureCube(make_google_input())
+        self.combinations = np.array(list(itertools.product(
+            *[counts[:2] for counts in cn.BASKET_COUNT_RANGES])))
+        self.psrc = self.cube.feature_df(cn.FINAL_BASKET)
+        self.expected = self.cube.calculate_mse(self.psrc, self.combinations)
+        self.dir = tempfile.mkdtemp()
+        self.messages = []
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def runner(self, n_workers):
+        return BasketSearchRunner(self.cube, self.psrc, self.combinations, self.dir,
+                                  n_workers=n_workers, shard_size=300,
+                                  report=self.messages.append)
+
+    def test_serial(self):
+        mses = self.runner(1).run()
+        self.assertTrue(np.allclose(self.expected, mses, equal_nan=True))
+        self.assertEqual(4, len(os.listdir(self.dir)) - 1)
+
+    def test_pool(self):
+        mses = self.runner(2).run()
+        self.assertTrue(np.allclose(self.expected, mses, equal_nan=True))
+
+    def test_resume(self):
+        self.runner(1).run()
+        os.remove(os.path.join(self.dir, 'shard_00002.npy'))
+        self.messages = []
+        mses = self.runner(1).run()
+        self.assertTrue(np.allclose(self.expected, mses, equal_nan=True))
+        self.assertEqual(2, len(self.messages))
+        self.assertIn('3 of 4 shards already done', self.messages[0])
+
+    def test_different_search(self):
+        self.runner(1).run()
+        self.combinations = self.combinations[:-1]
+        self.assertRaises(ValueError, self.runner(1).run)
+
+
+if __name__ == "__main__":
+    unittest.main()
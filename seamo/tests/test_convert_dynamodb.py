@@ -0,0 +1,172 @@
+"""
+This is a test file for convert_dynamodb.py, run on small exports written to
+a temporary directory
+"""
+import init
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+import constants as cn
+import data_accessor as daq
+from convert_dynamodb import ConvertDynamodb, ConvertDynamodbModes, ConvertDynamodbIncremental, \
+    MODE_COLUMNS, COMBINED_COLUMNS
+
+
+class FakeBlockgroup(object):
+    """
+    Counts the geocoding runs, without the blockgroup reference
+    """
+    geocoded = 0
+
+    def _get_blockgroup(self, df):
+        FakeBlockgroup.geocoded += 1
+        df = df.copy()
+        for column in [cn.DEST_BLOCK_GROUP, cn.NBHD_LONG, cn.NBHD_SHORT,
+                       cn.COUNCIL_DISTRICT, cn.URBAN_VILLAGE, cn.ZIPCODE]:
+            df[column] = 'x'
+        return df
+
+
+class FakeBlockgroupModes(FakeBlockgroup, ConvertDynamodbModes):
+    pass
+
+
+class FakeBlockgroupIncremental(FakeBlockgroup, ConvertDynamodbIncremental):
+    pass
+
+
+class CountingGeocoder(object):
+    """
+    Geocodes a point to its rounded latitude, counting the points geocoded.
+    The rows come back in reverse order with a coarser lat/lon, so only their
+    index matches them to the points.
+    """
+    def __init__(self):
+        self.points = 0
+
+    def geocode_df(self, df):
+        self.points += len(df)
+        df = df.copy()
+        for i in range(6):
+            df['attribute{0}'.format(i)] = df[cn.LAT].round(2).astype(str)
+        df[cn.LAT] = df[cn.LAT].round(1)
+        df[cn.LON] = df[cn.LON].round(1)
+        return df.iloc[::-1]
+
+
+class ConvertDynamodbTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.places = pd.read_csv(cn.DEST_FP).place_id.tolist()[:2]
+        for mode, n in [('bicycling', 3), ('walking', 4)]:
+            rows = [self.make_row(mode, i, '2018-07-2{0}'.format(6 + i % 2)) for i in range(n)]
+            rows.append(dict(rows[0], status='ZERO_RESULTS'))
+            self.write_export(mode, rows)
+        self.exports = {'biking': 'dynamo_out_bicycling.csv',
+                        'walking': 'dynamo_out_walking.csv'}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def make_row(self, mode, i, date):
+        time = date + ' 07:00:00-07:00'
+        return {'departure_time': time, 'distance': i + 0.5, 'duration': 10.0 * i,
+                'mode': mode, 'status': 'OK',
+                'tripID': '5303300{0}++{1}++{2}'.format(i, self.places[i % 2], time)}
+
+    def write_export(self, mode, rows):
+        pd.DataFrame(rows).to_csv(os.path.join(self.tmp_dir, 'dynamo_out_' + mode + '.csv'),
+                                  index=False)
+
+    def test_read_dynamodb_outfile(self):
+        df = ConvertDynamodb()._read_dynamodb_outfile('dynamo_out_walking.csv', self.tmp_dir)
+        self.assertEqual(4, len(df))
+        self.assertNotIn('status', df.columns)
+        self.assertEqual(['53033000', '53033001', '53033002', '53033003'],
+                         df[cn.BLOCK_GROUP].tolist())
+        self.assertEqual(pd.Timestamp('2018-07-27 07:00:00'), df[cn.DEPARTURE_TIME][1])
+
+    def test_parse_departure_times(self):
+        times = pd.Series(['2018-07-26 07:00:03.123456-07:00', '2018-11-05 07:00:00-08:00',
+                           '07/26/2018 07:00'])
+        parsed = ConvertDynamodb()._parse_departure_times(times)
+        self.assertEqual([pd.Timestamp(daq.format_time(time)) for time in times],
+                         parsed.tolist())
+
+    def test_get_blockgroup(self):
+        df = pd.DataFrame({cn.LAT: [47.61, 47.62, 47.61, None, 47.62],
+                           cn.LON: [-122.31, -122.32, -122.31, None, -122.32],
+                           cn.MODE: ['walking'] * 5})
+        geocoder = CountingGeocoder()
+        df = ConvertDynamodb()._get_blockgroup(df, geocoder)
+        self.assertEqual(2, geocoder.points)
+        self.assertEqual(['47.61', '47.62', '47.61', None, '47.62'],
+                         [None if pd.isna(value) else value
+                          for value in df[cn.DEST_BLOCK_GROUP]])
+        self.assertEqual(5, len(df))
+
+    def test_chunker(self):
+        df = pd.DataFrame({'a': range(5)})
+        chunks = list(ConvertDynamodb()._chunker(df, 2))
+        self.assertEqual([2, 2, 1], [len(chunk) for chunk in chunks])
+        # A size below one row used to make range() fail on small frames
+        self.assertEqual([1] * 5, [len(chunk) for chunk in ConvertDynamodb()._chunker(df, 0)])
+
+    def test_convert_modes(self):
+        FakeBlockgroup.geocoded = 0
+        dataframes = FakeBlockgroupModes(self.exports, self.tmp_dir).dataframes
+        self.assertEqual(1, FakeBlockgroup.geocoded)
+        self.assertEqual(['biking', 'walking'], list(dataframes))
+        self.assertEqual(3, len(dataframes['biking']))
+        self.assertEqual(4, len(dataframes['walking']))
+        self.assertTrue((dataframes['walking'][cn.MODE] == 'walking').all())
+        self.assertFalse(dataframes['biking'][cn.DESTINATION].isna().any())
+
+    def test_incremental(self):
+        watermark_fp = os.path.join(self.tmp_dir, 'watermarks.json')
+
+        def run():
+            converter = FakeBlockgroupIncremental(self.exports, self.tmp_dir, watermark_fp)
+            return converter.append_to_csv('out', self.tmp_dir, combined=True)
+
+        self.assertEqual({'biking': 3, 'walking': 4}, run())
+        FakeBlockgroup.geocoded = 0
+        self.assertEqual({'biking': 0, 'walking': 0}, run())
+        self.assertEqual(0, FakeBlockgroup.geocoded)
+        # New departures, and trips of the last departure time collected late,
+        # with a tripID before and after the ones already converted
+        rows = [self.make_row('walking', i, '2018-07-2{0}'.format(6 + i % 2)) for i in range(4)]
+        rows.append(self.make_row('walking', 0, '2018-07-27'))
+        rows.append(self.make_row('walking', 5, '2018-07-27'))
+        rows.append(self.make_row('walking', 9, '2018-07-28'))
+        self.write_export('walking', rows)
+        self.assertEqual({'biking': 0, 'walking': 3}, run())
+        walking = pd.read_csv(os.path.join(self.tmp_dir, 'out_walking.csv'))
+        self.assertEqual(7, len(walking))
+        self.assertEqual(7, len(walking.drop_duplicates()))
+        biking = pd.read_csv(os.path.join(self.tmp_dir, 'out_biking.csv'))
+        self.assertEqual(3, len(biking))
+        # The combined file holds the rows of both modes, appended run by run
+        combined = pd.read_csv(os.path.join(self.tmp_dir, 'out.csv'))
+        self.assertEqual(COMBINED_COLUMNS, list(combined.columns))
+        self.assertEqual(10, len(combined))
+        self.assertEqual(7, (combined[cn.MODE] == 'walking').sum())
+        # The export snapshot of the last run holds nothing new
+        self.assertEqual({'biking': 0, 'walking': 0}, run())
+
+    def test_incremental_empty_mode(self):
+        # A mode without any trip yet still gets its csv file
+        rows = [dict(self.make_row('bicycling', 0, '2018-07-26'), status='ZERO_RESULTS')]
+        self.write_export('bicycling', rows)
+        converter = FakeBlockgroupIncremental(self.exports, self.tmp_dir,
+                                              os.path.join(self.tmp_dir, 'watermarks.json'))
+        self.assertEqual({'biking': 0, 'walking': 4}, converter.append_to_csv('out', self.tmp_dir))
+        biking = pd.read_csv(os.path.join(self.tmp_dir, 'out_biking.csv'))
+        self.assertEqual(0, len(biking))
+        self.assertEqual(MODE_COLUMNS['biking'], list(biking.columns))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+"""
+This is a test file for distance_matrix_client.py, run against the local
+Distance Matrix stub
+"""
+import init
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import constants as cn
+from coordinate import Coordinate
+from haversine import haversine
+from distance_matrix_client import DistanceMatrixClient, TokenBucket, pack_requests
+from distance_matrix_stub import DistanceMatrixStub, METERS_PER_MILE
+
+
+def make_pairs(n_origins, n_destinations):
+    origins = ['{0:.5f},{1:.5f}'.format(47.5 + i * 0.01, -122.4) for i in range(n_origins)]
+    destinations = ['{0:.5f},{1:.5f}'.format(47.6, -122.45 + j * 0.005)
+                    for j in range(n_destinations)]
+    return [(origin, destination) for origin in origins for destination in destinations]
+
+
+class DistanceMatrixClientTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.error_log = os.path.join(self.tmp_dir, 'API_error.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def client(self, stub, **kwargs):
+        kwargs.setdefault('backoff', 0.01)
+        return DistanceMatrixClient('key', url=stub.url, error_log=self.error_log, **kwargs)
+
+    def test_pack_requests(self):
+        pairs = make_pairs(30, 7) + make_pairs(1, 60)
+        requests = pack_requests(pairs)
+        packed = [(origin, destination) for origins, destinations in requests
+                  for origin in origins for destination in destinations]
+        self.assertEqual(sorted(set(pairs)), sorted(packed))
+        for origins, destinations in requests:
+            self.assertTrue(len(origins) <= cn.DIST_MATRIX_MAX_ORIGINS)
+            self.assertTrue(len(destinations) <= cn.DIST_MATRIX_MAX_DESTINATIONS)
+            self.assertTrue(len(origins) * len(destinations) <= cn.DIST_MATRIX_MAX_ELEMENTS)
+        # 30 origins of 7 destinations fit 14 to a request, and 60
+        # destinations take three
+        self.assertEqual(3 + 3, len(requests))
+
+    def test_elements(self):
+        pairs = make_pairs(12, 30)
+        with DistanceMatrixStub() as stub:
+            client = self.client(stub, concurrency=4)
+            elements = client.elements(pairs)
+        self.assertEqual(len(pairs), len(elements))
+        for (origin, destination), element in zip(pairs, elements):
+            start = [float(value) for value in origin.split(',')]
+            end = [float(value) for value in destination.split(',')]
+            miles = haversine(start[0], start[1], end[0], end[1])
+            self.assertEqual(int(round(miles * METERS_PER_MILE)), element['distance']['value'])
+        self.assertEqual(len(pack_requests(pairs)), stub.requests)
+        # Connections are kept alive between requests
+        self.assertTrue(client.connections <= 4)
+        self.assertEqual(client.connections, stub.connections)
+        self.assertFalse(os.path.exists(self.error_log))
+
+    def test_elements_in_event_loop(self):
+        pairs = make_pairs(2, 3)
+        with DistanceMatrixStub() as stub:
+            client = self.client(stub)
+
+            async def run():
+                # elements() would need a second loop, fetch() is awaited
+                with self.assertRaisesRegex(RuntimeError, 'await client.fetch'):
+                    client.elements(pairs)
+                return await client.fetch(pairs)
+
+            elements = asyncio.run(run())
+        self.assertEqual(len(pairs), len(elements))
+        self.assertTrue(all(element['status'] == 'OK' for element in elements))
+
+    def test_retries(self):
+        with DistanceMatrixStub(failures=2) as stub:
+            client = self.client(stub, concurrency=1)
+            elements = client.elements(make_pairs(2, 3))
+        self.assertTrue(all(element['status'] == 'OK' for element in elements))
+        self.assertEqual(2, client.retried)
+        self.assertEqual(3, stub.requests)
+
+    def test_errors_logged_once(self):
+        pairs = make_pairs(1, 2) + [('47.6,-122.3', 'nowhere')]
+        with DistanceMatrixStub(failures=10) as stub:
+            client = self.client(stub, retries=1, concurrency=1)
+            self.assertEqual([None] * 3, client.elements(pairs))
+        with DistanceMatrixStub() as stub:
+            client = self.client(stub)
+            elements = client.elements(pairs)
+        self.assertEqual('NOT_FOUND', elements[2]['status'])
+        with open(self.error_log) as inf:
+            lines = inf.read().splitlines()
+        self.assertEqual(4, len(lines))
+        self.assertTrue(lines[0].endswith('You have exceeded your rate-limit for this API.'))
+        self.assertEqual('47.6,-122.3 nowhere NOT_FOUND', lines[3])
+
+    def test_coordinates(self):
+        origin = Coordinate(47.6, -122.3)
+        destination = Coordinate(47.65, -122.35)
+        with DistanceMatrixStub() as stub:
+            elements = self.client(stub).elements([(origin, destination)])
+        miles = origin.haversine_distance(destination)
+        self.assertEqual(int(round(miles * METERS_PER_MILE)), elements[0]['distance']['value'])
+
+    def test_token_bucket(self):
+        async def take(bucket, times):
+            for _ in range(times):
+                await bucket.acquire(10)
+
+        bucket = TokenBucket(200, 10)
+        start = time.monotonic()
+        asyncio.run(take(bucket, 5))
+        # The first 10 tokens are in the bucket, the other 40 take 0.2 s
+        self.assertTrue(time.monotonic() - start >= 0.19)
+
+
+if __name__ == "__main__":
+    unittest.main()
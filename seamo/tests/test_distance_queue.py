@@ -0,0 +1,116 @@
+"""
+This is a test file for distance_queue.py
+"""
+import init
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import pandas as pd
+import constants as cn
+from distance_queue import DistanceQueue, PENDING, IN_FLIGHT, DONE, FAILED, LEASE
+
+
+def make_dist_df(n):
+    return pd.DataFrame({cn.BLOCKGROUP: [530330001001 + i // 10 for i in range(n)],
+                         cn.PAIR: ['530330001001-place_{0}'.format(i) for i in range(n)],
+                         cn.DISTANCE: [1.0] * n,
+                         cn.CLASS: ['supermarket'] * n,
+                         cn.GOOGLE_START_LAT: [47.6] * n,
+                         cn.GOOGLE_START_LON: [-122.3] * n,
+                         cn.GOOGLE_END_LAT: [47.6 + i / 1000 for i in range(n)],
+                         cn.GOOGLE_END_LON: [-122.35] * n})
+
+
+class DistanceQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.queue = DistanceQueue(os.path.join(self.tmp_dir, 'queue.sqlite'),
+                                   lease_seconds=60, max_attempts=2)
+        self.dist_df = make_dist_df(50)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_enqueue_is_idempotent(self):
+        self.assertEqual(50, self.queue.enqueue(self.dist_df))
+        self.assertEqual(0, self.queue.enqueue(self.dist_df))
+        self.assertEqual(50, self.queue.counts()[PENDING])
+
+    def test_claim_complete(self):
+        self.queue.enqueue(self.dist_df)
+        batch = self.queue.claim(20, now=0)
+        self.assertEqual(list(self.dist_df[cn.PAIR][:20]), list(batch[cn.PAIR]))
+        self.assertEqual({PENDING: 30, IN_FLIGHT: 20, DONE: 0, FAILED: 0},
+                         self.queue.counts())
+        self.assertTrue((batch[LEASE] == 60).all())
+        self.assertEqual(20, self.queue.complete(batch[cn.PAIR], range(20), 60))
+        done_df = self.queue.done_df()
+        self.assertEqual(list(range(20)), list(done_df[cn.DISTANCE]))
+        self.assertEqual(list(self.dist_df[cn.BLOCKGROUP][:20]), list(done_df[cn.BLOCKGROUP]))
+        self.assertEqual(30, len(self.queue.claim(100, now=0)))
+        self.assertTrue(self.queue.claim(100, now=0).empty)
+
+    def test_expired_lease(self):
+        self.queue.enqueue(self.dist_df)
+        batch = self.queue.claim(10, now=0)
+        # Lost by a crashed worker: claimed again once the lease expires
+        self.queue.claim(40, now=0)
+        self.assertTrue(self.queue.claim(10, now=59).empty)
+        self.assertEqual(list(batch[cn.PAIR]), list(self.queue.claim(10, now=60)[cn.PAIR]))
+        # The first batch is out of attempts after its second lease
+        self.assertEqual(40, len(self.queue.claim(100, now=200)))
+        self.assertEqual(10, self.queue.counts()[FAILED])
+
+    def test_stale_lease(self):
+        self.queue.enqueue(self.dist_df[:2])
+        stale = self.queue.claim(2, now=0)
+        current = self.queue.claim(2, now=60)
+        # The worker of the expired lease can neither fail nor complete pairs
+        # claimed again by another worker
+        self.assertEqual(0, self.queue.fail(stale[cn.PAIR], stale[LEASE].iloc[0]))
+        self.assertEqual(0, self.queue.complete(stale[cn.PAIR], [5.0, 5.0],
+                                                stale[LEASE].iloc[0]))
+        self.assertEqual(2, self.queue.counts()[IN_FLIGHT])
+        self.assertEqual(2, self.queue.complete(current[cn.PAIR], [1.0, 2.0],
+                                                current[LEASE].iloc[0]))
+        self.assertEqual([1.0, 2.0], list(self.queue.done_df()[cn.DISTANCE]))
+        # Nor undo them once done
+        self.assertEqual(0, self.queue.fail(stale[cn.PAIR], stale[LEASE].iloc[0]))
+        self.assertEqual(2, self.queue.counts()[DONE])
+
+    def test_fail(self):
+        self.queue.enqueue(self.dist_df[:1])
+        batch = self.queue.claim(1)
+        self.queue.fail(batch[cn.PAIR], batch[LEASE].iloc[0])
+        self.assertEqual(1, self.queue.counts()[PENDING])
+        batch = self.queue.claim(1)
+        self.queue.fail(batch[cn.PAIR], batch[LEASE].iloc[0])
+        self.assertEqual(1, self.queue.counts()[FAILED])
+        self.assertTrue(self.queue.claim(1).empty)
+
+    def test_concurrent_workers(self):
+        self.queue.enqueue(make_dist_df(500))
+        claimed = []
+
+        def work():
+            while True:
+                batch = self.queue.claim(7)
+                if batch.empty:
+                    return
+                claimed.extend(batch[cn.PAIR])
+                self.queue.complete(batch[cn.PAIR], [1.0] * len(batch), batch[LEASE].iloc[0])
+
+        workers = [threading.Thread(target=work) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(500, len(claimed))
+        self.assertEqual(500, len(set(claimed)))
+        self.assertEqual(500, self.queue.counts()[DONE])
+
+
+if __name__ == "__main__":
+    unittest.main()
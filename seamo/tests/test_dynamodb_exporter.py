@@ -0,0 +1,107 @@
+"""
+This is a test file for dynamodb_exporter.py, run against the local DynamoDB
+stand-in
+"""
+import init
+import importlib.util
+import os
+import shutil
+import tempfile
+import unittest
+import constants as cn
+import pandas as pd
+from dynamodb_exporter import DynamoDBExporter, read_export, CSV, PARQUET
+from query_dynamodb import scanDynamo, EXPORT_COLUMNS
+from dynamodb_stub import DynamoDBTableStub
+
+MODES = [cn.BIKING_MODE, cn.WALKING_MODE]
+DATES = ['2018-07-26', '2018-07-27', '2018-07-28']
+
+
+def make_items(n):
+    return [{'tripID': '530330001001++place{0}++{1}'.format(i, DATES[i % 3]),
+             'mode': MODES[i % 2],
+             'departure_time': '{0} 07:00:00-07:00'.format(DATES[i % 3]),
+             'distance': i / 10.0,
+             'duration': float(i),
+             'status': 'OK'} for i in range(n)]
+
+
+class DynamoDBExporterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.items = make_items(1000)
+        self.table = DynamoDBTableStub(self.items)
+        self.reports = []
+        self.factory_calls = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def exporter(self, **kwargs):
+        return DynamoDBExporter('seamo', self.tmp_dir, total_segments=4, page_size=50,
+                                flush_rows=120, table_factory=self.table_factory,
+                                report=self.reports.append, **kwargs)
+
+    def table_factory(self):
+        self.factory_calls += 1
+        return self.table
+
+    def check_export(self, file_format):
+        exporter = self.exporter(file_format=file_format)
+        self.assertEqual(len(self.items), exporter.export())
+        df = read_export(self.tmp_dir, file_format=file_format)
+        self.assertEqual(sorted(item['tripID'] for item in self.items), sorted(df['tripID']))
+        df = df.set_index('tripID')
+        for item in self.items[:10]:
+            self.assertAlmostEqual(item['distance'], df.loc[item['tripID'], 'distance'])
+        biking = read_export(self.tmp_dir, cn.BIKING_MODE, file_format=file_format)
+        self.assertEqual(500, len(biking))
+        self.assertTrue((biking['mode'] == cn.BIKING_MODE).all())
+        return exporter
+
+    def test_export(self):
+        exporter = self.check_export(CSV)
+        # Every segment is paged, and written in several parts
+        self.assertTrue(self.table.scans >= len(self.items) // 50)
+        self.assertTrue(len(exporter.files) > 4 * len(MODES) * len(DATES))
+        for path in exporter.files:
+            mode, date = path.split(os.sep)[-3:-1]
+            self.assertIn(mode[len('mode='):], MODES)
+            self.assertIn(date[len('date='):], DATES)
+        # One table per worker
+        self.assertEqual(4, self.factory_calls)
+        self.assertEqual(5, len(self.reports))
+        self.assertTrue(self.reports[-1].startswith('1000 items scanned in 4 segments'))
+
+    def test_scan_dynamo(self):
+        export_dir = os.path.join(self.tmp_dir, 'export')
+        self.assertEqual(1000, scanDynamo(cn.BIKING_MODE, export_dir, self.tmp_dir,
+                                          table_factory=self.table_factory))
+        df = pd.read_csv(os.path.join(self.tmp_dir, 'dynamo_out_' + cn.BIKING_MODE + '.csv'))
+        self.assertEqual(sorted(item['tripID'] for item in self.items), sorted(df['tripID']))
+        self.assertEqual(EXPORT_COLUMNS, list(df.columns))
+        self.assertTrue(df['fare'].isna().all())
+        self.assertTrue(os.path.isdir(export_dir))
+        # Without an export directory, the partitions are removed
+        self.assertEqual(1000, scanDynamo(cn.BIKING_MODE, dynamodb_dir=self.tmp_dir,
+                                          table_factory=self.table_factory))
+        self.assertEqual(['dynamo_out_' + cn.BIKING_MODE + '.csv', 'export'],
+                         sorted(os.listdir(self.tmp_dir)))
+        # The second scan replaces the csv instead of appending to it
+        df = pd.read_csv(os.path.join(self.tmp_dir, 'dynamo_out_' + cn.BIKING_MODE + '.csv'))
+        self.assertEqual(1000, len(df))
+
+    def test_export_twice(self):
+        self.exporter(file_format=CSV).export()
+        with self.assertRaises(ValueError):
+            self.exporter(file_format=CSV).export()
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow') or
+                         importlib.util.find_spec('fastparquet'), 'no Parquet engine')
+    def test_export_parquet(self):
+        self.check_export(PARQUET)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+This is a test file for the spatial join of geocoder.py, run against a small
+reference of two squares
+"""
+import init
+import unittest
+import geopandas as gpd
+import pandas as pd
+from shapely.geometry import box
+import constants as cn
+from geocoder import Geocoder, GEOCODE_COLUMNS
+
+
+def make_reference(geographies):
+    rows = []
+    for geography in geographies:
+        rows.append({cn.KEY: geography + '_west', cn.GEOGRAPHY: geography,
+                     cn.GEOMETRY: box(-122.40, 47.60, -122.35, 47.65)})
+        rows.append({cn.KEY: geography + '_east', cn.GEOGRAPHY: geography,
+                     cn.GEOMETRY: box(-122.35, 47.60, -122.30, 47.65)})
+    return gpd.GeoDataFrame(rows, geometry=cn.GEOMETRY, crs='EPSG:4326')
+
+
+class GeocoderJoinTest(unittest.TestCase):
+    def setUp(self):
+        self.geocoder = Geocoder(crs='EPSG:4326')
+        self.geocoder.references[(0, cn.REFERENCE_PICKLE)] = make_reference(GEOCODE_COLUMNS)
+        blockgroups = make_reference([cn.BLOCK_GROUP]).drop(columns=[cn.GEOGRAPHY])
+        self.geocoder.references[(1, cn.BLOCKGROUP_PICKLE)] = blockgroups
+
+    def points(self, coords):
+        return pd.DataFrame({cn.LAT: [lat for lat, lon in coords],
+                             cn.LON: [lon for lat, lon in coords]})
+
+    def test_geocode_df(self):
+        df = self.geocoder.geocode_df(self.points([(47.62, -122.38), (47.63, -122.32),
+                                                   (47.70, -122.32)]))
+        self.assertEqual(1, self.geocoder.join_count)
+        self.assertEqual([cn.LAT, cn.LON] + GEOCODE_COLUMNS, list(df.columns))
+        self.assertEqual(3, len(df))
+        self.assertEqual(['block_group_west', 'block_group_east'],
+                         df[cn.BLOCK_GROUP].tolist()[:2])
+        self.assertEqual('zipcode_east', df[cn.ZIPCODE][1])
+        # The point outside both squares gets None, as in test_no_overlap
+        self.assertEqual([None] * len(GEOCODE_COLUMNS), df.loc[2, GEOCODE_COLUMNS].tolist())
+
+    def test_index_kept(self):
+        points = self.points([(47.62, -122.38), (47.70, -122.32), (47.63, -122.32)])
+        points.index = [5, 7, 9]
+        df = self.geocoder.geocode_df(points)
+        self.assertEqual([5, 7, 9], list(df.index))
+        self.assertEqual('block_group_east', df[cn.BLOCK_GROUP][9])
+        df = self.geocoder.geocode_df(points.iloc[1:2].copy())
+        self.assertEqual([7], list(df.index))
+
+    def test_no_overlap(self):
+        df = self.geocoder.geocode_point((47.70, -122.32))
+        self.assertEqual(1, self.geocoder.join_count)
+        self.assertEqual([cn.LAT, cn.LON] + GEOCODE_COLUMNS, list(df.columns))
+        self.assertEqual([47.70], df[cn.LAT].tolist())
+        self.assertEqual(float, df[cn.LAT].dtype)
+        self.assertIsNone(df[cn.BLOCK_GROUP].item())
+
+    def test_geocode_blockgroup(self):
+        df = self.geocoder.get_blockgroup_from_df(self.points([(47.62, -122.38),
+                                                               (47.63, -122.32)]))
+        self.assertEqual(1, self.geocoder.join_count)
+        self.assertEqual(['block_group_west', 'block_group_east'], df[cn.KEY].tolist())
+
+    def test_geocode_blockgroup_no_overlap(self):
+        df = self.geocoder.get_blockgroup_from_df(self.points([(47.70, -122.32),
+                                                               (47.70, -122.38)]))
+        self.assertEqual(1, self.geocoder.join_count)
+        self.assertEqual([cn.LAT, cn.LON, cn.KEY], list(df.columns))
+        self.assertEqual([None, None], df[cn.KEY].tolist())
+        self.assertEqual(float, df[cn.LAT].dtype)
+
+
+if __name__ == "__main__":
+    unittest.main()
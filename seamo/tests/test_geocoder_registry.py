@@ -0,0 +1,53 @@
+"""
+This is a test file for geocoder_registry.py
+"""
+import init
+import unittest
+import pandas as pd
+import constants as cn
+from geocoder_registry import GeocoderRegistry
+
+
+class CountingGeocoder(object):
+    def __init__(self):
+        self.calls = 0
+
+    def geocode_point(self, coord):
+        self.calls += 1
+        return pd.DataFrame({cn.LAT: [coord[0]], cn.LON: [coord[1]],
+                             cn.BLOCK_GROUP: [str(self.calls)]})
+
+
+class GeocoderRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.geocoder = CountingGeocoder()
+        self.registry = GeocoderRegistry(maxsize=2, geocoder=self.geocoder)
+
+    def test_repeated_point_is_cached(self):
+        first = self.registry.geocode_point(47.6145, -122.3210)
+        second = self.registry.geocode_point(47.614500001, -122.321000001)
+        self.assertIs(first, second)
+        self.assertEqual(1, self.geocoder.calls)
+        info = self.registry.cache_info()
+        self.assertEqual((1, 1, 1), (info['hits'], info['misses'], info['size']))
+
+    def test_least_recently_used_is_evicted(self):
+        self.registry.geocode_point(47.61, -122.32)
+        self.registry.geocode_point(47.62, -122.33)
+        self.registry.geocode_point(47.61, -122.32)
+        self.registry.geocode_point(47.63, -122.34)
+        self.assertEqual(2, self.registry.cache_info()['size'])
+        self.registry.geocode_point(47.61, -122.32)
+        self.assertEqual(3, self.geocoder.calls)
+        self.registry.geocode_point(47.62, -122.33)
+        self.assertEqual(4, self.geocoder.calls)
+
+    def test_clear(self):
+        self.registry.geocode_point(47.61, -122.32)
+        self.registry.clear()
+        self.assertEqual({'hits': 0, 'misses': 0, 'size': 0, 'maxsize': 2},
+                         self.registry.cache_info())
+
+
+if __name__ == "__main__":
+    unittest.main()
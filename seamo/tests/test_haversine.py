@@ -0,0 +1,58 @@
+"""
+This is a test file for haversine.py
+"""
+import init
+import unittest
+import numpy as np
+from math import sin, cos, sqrt, atan2, radians
+import constants as cn
+from coordinate import Coordinate
+from haversine import haversine, haversine_matrix
+
+ORIGINS = [(47.72683, -122.28469), (47.51008, -122.38054), (47.68651, -122.30147)]
+DESTS = [(47.6158665, -122.3099133), (47.6183442, -122.3380965)]
+
+
+def scalar_haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = radians(lat1), radians(lon1), radians(lat2), radians(lon2)
+    a = sin((lat2 - lat1) / 2)**2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2)**2
+    return cn.EARTH_RADIUS_KM * 2 * atan2(sqrt(a), sqrt(1 - a)) * cn.KM_TO_MILES
+
+
+class HaversineTest(unittest.TestCase):
+    def setUp(self):
+        self.expected = np.array([[scalar_haversine(*o, *d) for d in DESTS] for o in ORIGINS])
+        self.lats1, self.lons1 = np.array(ORIGINS).T
+        self.lats2, self.lons2 = np.array(DESTS).T
+
+    def test_scalar(self):
+        distance = Coordinate(*ORIGINS[0]).haversine_distance(Coordinate(*DESTS[0]))
+        self.assertIsInstance(distance, float)
+        self.assertAlmostEqual(self.expected[0, 0], distance)
+
+    def test_paired(self):
+        distance = haversine(self.lats1[:2], self.lons1[:2], self.lats2, self.lons2,
+                             chunk_size=1)
+        self.assertTrue(np.allclose(np.diag(self.expected), distance))
+
+    def test_matrix(self):
+        for chunk_size in [1, 4, 100]:
+            distance = haversine_matrix(self.lats1, self.lons1, self.lats2, self.lons2,
+                                        chunk_size=chunk_size)
+            self.assertTrue(np.allclose(self.expected, distance))
+
+    def test_float32(self):
+        distance = haversine_matrix(self.lats1, self.lons1, self.lats2, self.lons2,
+                                    dtype=np.float32)
+        self.assertEqual(np.float32, distance.dtype)
+        self.assertTrue(np.allclose(self.expected, distance, atol=1e-2))
+        # Computed in float64, only stored in float32
+        np.testing.assert_array_equal(self.expected.astype(np.float32), distance)
+        paired = haversine(self.lats1, self.lons1, self.lats2[0], self.lons2[0],
+                           dtype=np.float32)
+        self.assertEqual(np.float32, paired.dtype)
+        np.testing.assert_array_equal(self.expected[:, 0].astype(np.float32), paired)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+"""
+This is a test file for market_basket_evaluator.py
+"""
+import init
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+import constants as cn
+import market_basket_evaluator as mbe
+from basket_feature_cube import FEATURES
+from test_basket_feature_cube import make_google_input
+
+
+class MarketBasketEvaluatorTest(unittest.TestCase):
+    def setUp(self):
+        self.trips = make_google_input()
+        self.trips[cn.DESTINATION] = 'dest'
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_blockgroup_features(self):
+        trips = self.trips.copy()
+        # A blockgroup without trips between 2 and 10 miles is dropped
+        extra = trips.iloc[:2].copy()
+        extra[cn.ORIGIN] = '530330001000'
+        extra[cn.DISTANCE] = 1.0
+        trips = pd.concat([extra, trips], ignore_index=True)
+        expected = mbe.proximity_ratio(trips.copy())
+        expected = mbe.vert_hori_ratio(trips.copy(), expected)
+        expected = mbe.average_distance(trips.copy(), expected)
+        expected = mbe.distance_from_citycenter(trips.copy(), expected)
+        df = mbe.blockgroup_features(trips)
+        self.assertEqual([cn.ORIGIN] + FEATURES, list(df.columns))
+        self.assertEqual(sorted(expected[cn.ORIGIN]), list(df[cn.ORIGIN]))
+        expected = expected.set_index(cn.ORIGIN).loc[df[cn.ORIGIN]]
+        for feature in FEATURES:
+            self.assertTrue(np.allclose(expected[feature], df[feature]))
+
+    def test_load_psrc_is_cached(self):
+        psrc_fp = os.path.join(self.tmp_dir, 'psrc.csv')
+        self.trips.to_csv(psrc_fp, index=False)
+        expected = mbe.prepare_psrc(mbe.read_psrc(psrc_fp))
+        pd.testing.assert_frame_equal(expected, mbe.load_psrc(psrc_fp, self.tmp_dir))
+        pickle_fp = os.path.join(self.tmp_dir, cn.PSRC_FEATURES_PICKLE)
+        self.assertTrue(os.path.exists(pickle_fp))
+
+        # An older csv is read from the pickle, a newer one is prepared again
+        self.trips[cn.DISTANCE] = self.trips[cn.DISTANCE] / 2
+        self.trips.to_csv(psrc_fp, index=False)
+        mtime = os.path.getmtime(pickle_fp)
+        os.utime(psrc_fp, (mtime - 10, mtime - 10))
+        pd.testing.assert_frame_equal(expected, mbe.load_psrc(psrc_fp, self.tmp_dir))
+        os.utime(psrc_fp, (mtime + 10, mtime + 10))
+        df = mbe.load_psrc(psrc_fp, self.tmp_dir)
+        self.assertTrue(np.allclose(expected[cn.AVG_DIST].values,
+                                    2 * df.set_index(cn.ORIGIN).loc[
+                                        expected[cn.ORIGIN], cn.AVG_DIST].values))
+
+
+if __name__ == "__main__":
+    unittest.main()
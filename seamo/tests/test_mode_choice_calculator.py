@@ -0,0 +1,49 @@
+"""
+This is a test file for mode_choice_calculator.py
+"""
+import init
+import unittest
+import numpy as np
+import pandas as pd
+import constants as cn
+from mode_choice_calculator import ModeChoiceCalculator
+
+ORIGINS = ['530330094004'] * 4 + ['530330001001'] * 2
+MODES = [cn.DRIVING_MODE, cn.TRANSIT_MODE, cn.TRANSIT_MODE, cn.WALKING_MODE,
+         cn.BIKING_MODE, cn.BIKING_MODE]
+DURATIONS = [15.0, 40.0, 40.0, 50.0, 30.0, 50.0]
+FARES = [np.nan, 2.75, np.nan, np.nan, np.nan, np.nan]
+
+
+class ModeChoiceCalculatorTest(unittest.TestCase):
+    def setUp(self):
+        self.mc = ModeChoiceCalculator()
+        self.df = pd.DataFrame({cn.BLOCK_GROUP: ORIGINS, cn.MODE: MODES,
+            cn.LAT: 47.6145, cn.LON: -122.3210, cn.DISTANCE: 1.0,
+            cn.DURATION: DURATIONS, cn.FARE_VALUE: FARES,
+            cn.DEPARTURE_TIME: '2018-07-26 07:00:00-07:00',
+            cn.DEST_BLOCK_GROUP: '530330074003'})
+
+    def test_is_viable_batch(self):
+        # Car trips include the parking offset, transit needs a fare
+        EXPECTED = [1, 1, 0, 0, 1, 0]
+        duration = self.df[cn.DURATION] + np.where(self.df[cn.MODE] == cn.DRIVING_MODE,
+            cn.PARKING_TIME_OFFSET, 0)
+        viable = self.mc.is_viable_batch(duration, self.df[cn.MODE], self.df[cn.FARE_VALUE])
+        self.assertEqual(EXPECTED, list(viable))
+
+    def test_create_availability_df(self):
+        df = self.mc.create_availability_df(self.mc.trip_table(self.df))
+        self.assertEqual(['530330094004', '530330001001'], list(df[cn.BLOCK_GROUP]))
+        self.assertEqual([1.0, 0.0, 0.5, 0.0], list(df.loc[0, cn.MODES]))
+        self.assertEqual([0.0, 0.5, 0.0, 0.0], list(df.loc[1, cn.MODES]))
+        self.assertTrue(np.allclose([0.375, 0.125], df[cn.MODE_CHOICE_INDEX]))
+
+    def test_create_availability_df_from_dict(self):
+        from_table = self.mc.create_availability_df(self.mc.trip_table(self.df))
+        from_dict = self.mc.create_availability_df(self.mc.trips_per_blockgroup(self.df))
+        self.assertTrue(from_table.equals(from_dict))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+"""
+This is a test file for normalization.py
+"""
+import init
+import unittest
+import numpy as np
+import pandas as pd
+import constants as cn
+import normalization as norm
+
+VALUES = [3.0, 1.0, 4.0, 1.0, 5.0, np.nan, 9.0]
+
+
+class NormalizationTest(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({cn.COST: VALUES, cn.RATIO: VALUES[::-1]})
+
+    def test_min_max(self):
+        df = norm.scale_columns(self.df.copy(), [cn.COST, cn.RATIO],
+                                [cn.SCALED, cn.RELATIVE_SCALED])
+        for column, scaled in [(cn.COST, cn.SCALED), (cn.RATIO, cn.RELATIVE_SCALED)]:
+            expected = self.df.apply(lambda x: (x[column] - self.df[column].min()) /
+                (self.df[column].max() - self.df[column].min()), axis=1)
+            self.assertTrue(np.allclose(expected, df[scaled], equal_nan=True))
+
+    def test_z_score(self):
+        df = norm.scale_columns(self.df.copy(), [cn.COST], method=cn.Z_SCORE)
+        self.assertAlmostEqual(0, df[cn.COST].mean())
+        self.assertAlmostEqual(1, df[cn.COST].std(ddof=0))
+
+    def test_percentile_rank(self):
+        df = norm.scale_columns(self.df.copy(), [cn.COST], [cn.SCALED],
+                                method=cn.PERCENTILE_RANK)
+        expected = self.df[cn.COST].rank(pct=True)
+        self.assertTrue(np.allclose(expected, df[cn.SCALED], equal_nan=True))
+
+    def test_transform_uses_fitted_statistics(self):
+        scaler = norm.MinMaxScaler().fit(self.df, [cn.COST])
+        scaled = scaler.transform(pd.DataFrame({cn.COST: [1.0, 9.0, 17.0]}))
+        self.assertEqual([0.0, 1.0, 2.0], list(scaled[cn.COST]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+This is a test file for od_cache.py
+"""
+import init
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import constants as cn
+from od_cache import ODCache
+from distance_matrix_client import DistanceMatrixClient
+from distance_matrix_stub import DistanceMatrixStub
+from test_distance_matrix_client import make_pairs
+
+ELEMENT = {'status': 'OK', 'distance': {'value': 1000}, 'duration': {'value': 60}}
+
+
+class ODCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache = ODCache(os.path.join(self.tmp_dir, 'od_cache.sqlite'), ttl=100,
+                             max_entries=3, bucket_seconds=3600)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_key(self):
+        key = self.cache.key('47.6,-122.3', '47.7,-122.3', cn.DRIVING_MODE, 7200)
+        self.assertEqual(key, self.cache.key('47.6,-122.3', '47.7,-122.3', cn.DRIVING_MODE, 10799))
+        self.assertNotEqual(key, self.cache.key('47.6,-122.3', '47.7,-122.3', cn.DRIVING_MODE, 10800))
+        self.assertNotEqual(key, self.cache.key('47.6,-122.3', '47.7,-122.3', cn.WALKING_MODE, 7200))
+        self.assertNotEqual(key, self.cache.key('47.7,-122.3', '47.6,-122.3', cn.DRIVING_MODE, 7200))
+
+    def test_ttl(self):
+        self.cache.put('a', ELEMENT, now=0)
+        self.assertEqual(ELEMENT, self.cache.get('a', now=99))
+        self.assertIsNone(self.cache.get('a', now=100))
+        self.assertEqual(1, self.cache.hits)
+        self.assertEqual(1, self.cache.misses)
+        # Expired entries are evicted on the next write
+        self.cache.put('b', ELEMENT, now=150)
+        self.assertEqual(1, len(self.cache))
+
+    def test_size_cap(self):
+        for now, key in enumerate(['a', 'b', 'c']):
+            self.cache.put(key, ELEMENT, now=now)
+        # 'a' becomes the most recently used, so 'b' is evicted
+        self.cache.get('a', now=3)
+        self.cache.put('d', ELEMENT, now=4)
+        self.assertEqual(3, len(self.cache))
+        self.assertEqual(['a', 'c', 'd'], sorted(self.cache.get_many(['a', 'b', 'c', 'd'], now=5)))
+
+    def test_client_reads_through(self):
+        cache = ODCache(os.path.join(self.tmp_dir, 'client.sqlite'))
+        pairs = make_pairs(5, 30)
+        with DistanceMatrixStub() as stub:
+            client = DistanceMatrixClient('key', url=stub.url, error_log=None, cache=cache)
+            first = client.elements(pairs)
+            requests = stub.requests
+            self.assertEqual(0, cache.hits)
+            second = client.elements(pairs + [('47.6,-122.3', '47.7,-122.3')])
+        self.assertEqual(first, second[:-1])
+        self.assertEqual(requests + 1, stub.requests)
+        self.assertEqual(len(pairs), cache.hits)
+        self.assertEqual(requests, cache.saved_requests)
+        self.assertIn('{0} API requests saved'.format(requests), cache.report())
+
+    def test_calculate_distance_API(self):
+        from basket_calculator import calculate_distance_API
+        cache = ODCache(os.path.join(self.tmp_dir, 'single.sqlite'))
+        calls = []
+
+        def reader():
+            calls.append(1)
+            return json.dumps({'status': 'OK', 'rows': [{'elements': [ELEMENT]}]})
+
+        for _ in range(2):
+            self.assertEqual(1000, calculate_distance_API('47.6,-122.3', '47.7,-122.3',
+                                                          reader=reader, cache=cache))
+        self.assertEqual(1, len(calls))
+        self.assertEqual(1, cache.saved_requests)
+
+
+if __name__ == "__main__":
+    unittest.main()
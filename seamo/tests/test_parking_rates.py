@@ -0,0 +1,49 @@
+"""
+This is a test file for parking_rates.py
+"""
+import init
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import data_accessor as daq
+from parking_rates import ParkingRates
+
+RATES = [{'530330069001': 0.0, '530330081002': 2.5, '530330092001': 4.0}]
+
+
+class ParkingRatesTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp() + os.sep
+        daq.make_pickle(self.dir, RATES, 'parking_rates.pickle')
+        self.rates = ParkingRates(self.dir, 'parking_rates.pickle')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_rate_for(self):
+        self.assertEqual(2.5, self.rates.rate_for('530330081002'))
+        self.assertEqual(0, self.rates.rate_for('not a block group'))
+        self.assertEqual(0, self.rates.rate_for(None))
+
+    def test_rates_for(self):
+        rates = self.rates.rates_for(['530330092001', None, '530330081002', 'other'])
+        self.assertTrue(np.array_equal([4.0, 0.0, 2.5, 0.0], rates))
+
+    def test_loaded_once(self):
+        for _ in range(3):
+            self.rates.rate_for('530330081002')
+        self.assertEqual(1, self.rates.loads)
+
+    def test_reloaded_when_pickle_changes(self):
+        self.rates.rate_for('530330081002')
+        daq.make_pickle(self.dir, {'530330081002': 3.0}, 'parking_rates.pickle')
+        path = os.path.join(self.dir, 'parking_rates.pickle')
+        os.utime(path, (0, os.stat(path).st_mtime + 1))
+        self.assertEqual(3.0, self.rates.rate_for('530330081002'))
+        self.assertEqual(2, self.rates.loads)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+This is a test file for persona_sweep.py, checked against the per-persona
+ModeChoiceCalculator and AffordabilityIndex path
+"""
+import init
+import unittest
+import numpy as np
+import pandas as pd
+import constants as cn
+from affordability_index import AffordabilityIndex
+from mode_choice_calculator import ModeChoiceCalculator
+from persona_sweep import PersonaSweep
+from trip_table import TripTable
+
+ORIGINS = ['530330094004', '530330001001']
+MODES = [cn.DRIVING_MODE, cn.BIKING_MODE, cn.TRANSIT_MODE, cn.WALKING_MODE]
+PERSONAS = {'commuter': {cn.DRIVE_THRESHOLD: 30, cn.BIKE_THRESHOLD: 20,
+                         cn.TRANSIT_THRESHOLD: 45, cn.WALK_THRESHOLD: 15},
+            'walker': {cn.DRIVE_THRESHOLD: 0, cn.BIKE_THRESHOLD: 40,
+                       cn.TRANSIT_THRESHOLD: 60, cn.WALK_THRESHOLD: 35}}
+
+
+def make_trips():
+    rows = []
+    for i, origin in enumerate(ORIGINS):
+        for j, mode in enumerate(MODES):
+            for k in range(3):
+                rows.append({cn.BLOCK_GROUP: origin, cn.MODE: mode,
+                             cn.LAT: 47.61 + 0.01 * k, cn.LON: -122.33,
+                             cn.DISTANCE: 1.0 + i + k, cn.DURATION: 10.0 + 9 * k + 3 * i + j,
+                             # The last transit trip has no fare
+                             cn.FARE_VALUE: (2.75 if k < 2 else np.nan)
+                                            if mode == cn.TRANSIT_MODE else np.nan,
+                             cn.DEPARTURE_TIME: '2018-07-26 07:00:00-07:00',
+                             cn.DEST_BLOCK_GROUP: '530330074003'})
+    return pd.DataFrame(rows)
+
+
+class PersonaSweepTest(unittest.TestCase):
+    def setUp(self):
+        self.df = make_trips()
+        self.sweep = PersonaSweep(TripTable.from_df(self.df), PERSONAS)
+
+    def calculator(self, persona):
+        attrs = PERSONAS[persona]
+        return ModeChoiceCalculator(attrs[cn.DRIVE_THRESHOLD], attrs[cn.BIKE_THRESHOLD],
+                                    attrs[cn.TRANSIT_THRESHOLD], attrs[cn.WALK_THRESHOLD])
+
+    def test_viability(self):
+        viable = self.sweep.viability()
+        self.assertEqual((len(PERSONAS), len(self.df)), viable.shape)
+        for i, persona in enumerate(self.sweep.personas):
+            expected = self.calculator(persona).trip_table(self.df).viable
+            self.assertEqual(list(expected), list(viable[i]))
+        # The transit trips without a fare are never viable
+        no_fare = ((self.df[cn.MODE] == cn.TRANSIT_MODE) & self.df[cn.FARE_VALUE].isna()).values
+        self.assertFalse(viable[:, no_fare].any())
+
+    def test_availability_dfs(self):
+        avail_dfs = self.sweep.availability_dfs()
+        self.assertEqual(list(PERSONAS), list(avail_dfs))
+        for persona, df in avail_dfs.items():
+            mc = self.calculator(persona)
+            expected = mc.create_availability_df(mc.trips_per_blockgroup(self.df))
+            pd.testing.assert_frame_equal(expected.reset_index(drop=True),
+                                          df.reset_index(drop=True), check_dtype=False)
+        # The personas differ, so their scores do too
+        self.assertFalse(avail_dfs['commuter'][cn.MODES].equals(avail_dfs['walker'][cn.MODES]))
+
+    def test_affordability_dfs(self):
+        afford_dfs = self.sweep.affordability_dfs()
+        for persona, df in afford_dfs.items():
+            mc = self.calculator(persona)
+            ac = AffordabilityIndex(mc.trips_per_blockgroup(self.df, viable_only=True))
+            expected = ac.calculate_score().loc[:, cn.AFFORDABILITY_COLUMNS]
+            pd.testing.assert_frame_equal(expected.reset_index(drop=True),
+                                          df.reset_index(drop=True), check_dtype=False)
+
+
+if __name__ == "__main__":
+    unittest.main()
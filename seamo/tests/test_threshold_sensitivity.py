@@ -0,0 +1,47 @@
+"""
+This is a test file for threshold_sensitivity.py
+"""
+import init
+import unittest
+import numpy as np
+import pandas as pd
+import constants as cn
+from mode_choice_calculator import ModeChoiceCalculator
+from threshold_sensitivity import ThresholdSensitivity
+
+ORIGINS = ['530330094004'] * 5 + ['530330001001'] * 3
+MODES = [cn.DRIVING_MODE, cn.TRANSIT_MODE, cn.TRANSIT_MODE, cn.WALKING_MODE,
+         cn.WALKING_MODE, cn.BIKING_MODE, cn.BIKING_MODE, cn.DRIVING_MODE]
+DURATIONS = [15.0, 40.0, 20.0, 50.0, 10.0, 30.0, 50.0, 25.0]
+FARES = [np.nan, 2.75, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan]
+THRESHOLDS = [(30, 45, 60, 45), (20, 30, 45, 10), (35, 60, 20, 60)]
+
+
+class ThresholdSensitivityTest(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({cn.BLOCK_GROUP: ORIGINS, cn.MODE: MODES,
+            cn.DISTANCE: 1.0, cn.DURATION: DURATIONS, cn.FARE_VALUE: FARES,
+            cn.DEPARTURE_TIME: '2018-07-26 07:00:00-07:00'})
+        self.mc = ModeChoiceCalculator()
+        self.ts = ThresholdSensitivity(self.mc.trip_table(self.df))
+
+    def test_matches_mode_choice_calculator(self):
+        for thresholds in THRESHOLDS:
+            mc = ModeChoiceCalculator(*thresholds)
+            expected = mc.create_availability_df(mc.trip_table(self.df))
+            grid = {mode: [threshold] for mode, threshold in zip(cn.MODES, thresholds)}
+            surface = self.ts.surface(grid)
+            for mode in cn.MODES:
+                ratios = surface[surface[cn.MODE] == mode][cn.RATIO]
+                self.assertTrue(np.allclose(expected[mode], ratios))
+            index = self.ts.index_surface(*[[threshold] for threshold in thresholds])
+            self.assertTrue(np.allclose(expected[cn.MODE_CHOICE_INDEX],
+                                        index[cn.MODE_CHOICE_INDEX]))
+
+    def test_index_surface_shape(self):
+        surface = self.ts.index_surface([20, 30], [30, 45, 60])
+        self.assertEqual(2 * 2 * 3, len(surface))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+"""
+This is a test file for google_time_and_distance_collector.py and
+trip_sinks.py, run against the local Distance Matrix stub
+"""
+import init
+import decimal
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import constants as cn
+import google_time_and_distance_collector as collector
+from distance_matrix_client import DistanceMatrixClient
+from distance_matrix_stub import DistanceMatrixStub
+from trip_sinks import DynamoDBSink, SQLiteSink
+
+
+class FakeBatchWriter(object):
+    def __init__(self, table):
+        self.table = table
+        self.items = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.table.batches.append(self.items)
+
+    def put_item(self, Item):
+        self.items.append(Item)
+
+
+class FakeTable(object):
+    def __init__(self):
+        self.batches = []
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return FakeBatchWriter(self)
+
+
+def make_rows(n_origins, n_destinations):
+    return [['trip{0}_{1}'.format(i, j), '', 47.6, -122.45 + j * 0.005, 47.5 + i * 0.01, -122.4]
+            for i in range(n_origins) for j in range(n_destinations)]
+
+
+class CollectorTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.reports = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_collect_to_sqlite(self):
+        rows = make_rows(3, 20)
+        db_fp = os.path.join(self.tmp_dir, 'trips.sqlite')
+        sink = SQLiteSink(db_fp)
+        with DistanceMatrixStub() as stub:
+            client = DistanceMatrixClient('key', url=stub.url, departure_time=None,
+                                          error_log=None)
+            self.assertEqual(60, collector.collect(rows, client, sink,
+                                                   report=self.reports.append))
+        # The rows of the three origins fit in one matrix request
+        self.assertEqual(1, stub.requests)
+        self.assertEqual(3, sink.batches)
+        self.assertTrue(self.reports[0].startswith('60 of 60 trips saved in 1 requests'))
+        self.assertIn('items/s', self.reports[0])
+        db = sqlite3.connect(db_fp)
+        items = db.execute('SELECT tripID, mode, distance, duration FROM "{0}"'.format(
+            cn.DYNAMODB_TABLE)).fetchall()
+        db.close()
+        self.assertEqual(60, len(items))
+        self.assertTrue(items[0][0].startswith('trip0_0++'))
+        self.assertEqual(cn.DRIVING_MODE, items[0][1])
+        self.assertTrue(all(distance > 0 and duration > 0 for _, _, distance, duration in items))
+
+    def test_make_item(self):
+        element = {'status': 'OK', 'distance': {'value': 3218}, 'duration': {'value': 600},
+                   'duration_in_traffic': {'value': 900}}
+        item = collector.make_item('trip', element, cn.DRIVING_MODE, '2018-07-18 10:00:00')
+        self.assertEqual('trip++2018-07-18 10:00:00', item['tripID'])
+        self.assertAlmostEqual(2.0, item['distance'], places=2)
+        self.assertEqual(10.0, item['duration'])
+        self.assertEqual(15.0, item['duration_in_traffic'])
+        self.assertNotIn('fare', item)
+
+    def test_make_cache(self):
+        db_fp = os.environ.pop('OD_CACHE_DB_FP', None)
+        try:
+            self.assertIsNone(collector.make_cache())
+            os.environ['OD_CACHE_DB_FP'] = os.path.join(self.tmp_dir, 'od_cache.sqlite')
+            cache = collector.make_cache()
+            self.assertEqual(os.environ['OD_CACHE_DB_FP'], cache.db_fp)
+        finally:
+            os.environ.pop('OD_CACHE_DB_FP', None)
+            if db_fp is not None:
+                os.environ['OD_CACHE_DB_FP'] = db_fp
+
+    def test_dynamodb_batches(self):
+        table = FakeTable()
+        sink = DynamoDBSink(table=table)
+        items = [{'tripID': str(i), 'distance': 1.5, 'status': 'OK'} for i in range(60)]
+        self.assertEqual(60, sink.write(items))
+        self.assertEqual([25, 25, 10], [len(batch) for batch in table.batches])
+        self.assertEqual(decimal.Decimal('1.5'), table.batches[0][0]['distance'])
+
+
+if __name__ == "__main__":
+    unittest.main()
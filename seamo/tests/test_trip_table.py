@@ -0,0 +1,66 @@
+"""
+This is a test file for trip_table.py
+"""
+import init
+import unittest
+import numpy as np
+import pandas as pd
+import constants as cn
+import seamo_exceptions as se
+from trip_table import TripTable
+
+ORIGINS = ['530330094004', '530330094004', '530330001001', '530330001001']
+MODES = [cn.DRIVING_MODE, cn.TRANSIT_MODE, cn.BIKING_MODE, cn.WALKING_MODE]
+LATS = [47.6145, 47.6145, 47.6062, 47.6145]
+LONS = [-122.3210, -122.3210, -122.3321, -122.3210]
+DISTANCES = [16.040398, 3.2, 2.5, 0.8]
+DURATIONS = [32.183333, 40.0, 12.5, 20.0]
+FARES = [np.nan, 2.75, np.nan, np.nan]
+DEPARTURE_TIMES = ['2018-07-26 07:00:00-07:00', '2018-07-26 13:00:00-07:00',
+                   '2018-06-06 12:41:31.092964', '2018-07-26 19:00:00-07:00']
+
+
+class TripTableTest(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({cn.BLOCK_GROUP: ORIGINS, cn.MODE: MODES, cn.LAT: LATS,
+            cn.LON: LONS, cn.DISTANCE: DISTANCES, cn.DURATION: DURATIONS,
+            cn.FARE_VALUE: FARES, cn.DEPARTURE_TIME: DEPARTURE_TIMES,
+            cn.DEST_BLOCK_GROUP: ['530330074003'] * 4})
+        self.table = TripTable.from_df(self.df)
+
+    def test_codes(self):
+        self.assertEqual(len(self.df), len(self.table))
+        self.assertEqual([0, 0, 1, 1], list(self.table.origin))
+        self.assertEqual(ORIGINS[0], self.table.origins[0])
+        self.assertEqual([0, 0, 1, 0], list(self.table.destination))
+        self.assertEqual([0, 2, 1, 3], list(self.table.mode))
+
+    def test_columns(self):
+        EXPECTED_DURATIONS = [DURATIONS[0] + cn.PARKING_TIME_OFFSET] + DURATIONS[1:]
+        self.assertTrue(np.allclose(EXPECTED_DURATIONS, self.table.duration))
+        self.assertEqual([0, 2.75, 0, 0], list(self.table.fare))
+        self.assertEqual([7, 13, 12, 19], list(self.table.hour))
+
+    def test_unknown_mode(self):
+        self.df.loc[0, cn.MODE] = 'teleporting'
+        with self.assertRaises(se.UnknownModeError):
+            TripTable.from_df(self.df)
+
+    def test_subset(self):
+        self.table.set_viability([1, 0, 1, 0])
+        subset = self.table.subset(self.table.viable == 1)
+        self.assertEqual(2, len(subset))
+        self.assertEqual([1, 1], list(subset.viable))
+        self.assertIs(self.table.origins, subset.origins)
+
+    def test_lazy_trips(self):
+        car = self.table.trip(0)
+        self.assertEqual(cn.DRIVING_MODE, car.mode)
+        self.assertAlmostEqual(self.table.duration[0], car.duration)
+        self.assertEqual(2.75, self.table.trip(1).fare_value)
+        blkgrp_dict = self.table.trips_per_blockgroup()
+        self.assertEqual(2, len(blkgrp_dict[ORIGINS[0]]))
+
+
+if __name__ == "__main__":
+    unittest.main()